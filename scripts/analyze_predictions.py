@@ -4,10 +4,15 @@ Analyze Boltz predictions: extract metrics, compare models, and provide recommen
 """
 
 import json
+import os
+import sys
 import numpy as np
 from pathlib import Path
 import argparse
 
+sys.path.insert(0, os.path.dirname(__file__))
+from prediction_index import load_index, prediction_root
+
 
 def load_confidence(json_file):
     """Load confidence metrics from JSON file."""
@@ -16,26 +21,22 @@ def load_confidence(json_file):
 
 
 def analyze_prediction(prediction_dir):
-    """Analyze a single prediction directory."""
-    pred_dir = Path(prediction_dir)
-
-    # Find all confidence JSON files
-    confidence_files = sorted(pred_dir.glob("confidence_*_model_*.json"))
+    """Analyze a single prediction (boltz_results_<name> or its predictions/<name> directory)."""
+    root = prediction_root(prediction_dir)
+    index = load_index(root)
 
-    if not confidence_files:
+    if index is None:
         print(f"No confidence files found in {prediction_dir}")
         return None
 
     results = []
-    for conf_file in confidence_files:
+    for model in sorted(index['models'], key=lambda m: m['model']):
+        conf_file = root / model['confidence']
         conf = load_confidence(conf_file)
-
-        # Extract model number
-        model_num = conf_file.stem.split('_model_')[-1]
-        structure_file = pred_dir / f"{pred_dir.parent.name}_model_{model_num}.cif"
+        structure_file = root / model['structure'] if model['structure'] else None
 
         results.append({
-            'model': model_num,
+            'model': str(model['model']),
             'confidence_score': conf.get('confidence_score', 0),
             'ptm': conf.get('ptm', 0),
             'iptm': conf.get('iptm', 0),
@@ -5,21 +5,88 @@ Calculate specificity scores and rank candidates.
 
 Specificity Score = Target Confidence / Mean(Off-Target Confidences)
 Higher score = better specificity
+
+Variants re-run with Boltz-2 affinity (run_specificity_screen.py
+--affinity-top-n) also get fold-selectivity from the predicted IC50s:
+min over off-targets of IC50(off-target) / IC50(target), as in
+design_nucleotide_binders.calculate_selectivity_score.
 """
 
 import json
+import os
+import sys
 import pandas as pd
 from pathlib import Path
 import argparse
 import numpy as np
 
+sys.path.insert(0, os.path.dirname(__file__))
+from design_nucleotide_binders import calculate_selectivity_score
+from results_log import load_results_log
+from specificity_tensor import AFFINITY_TIER, NUCLEOTIDES, SpecificityTensor, specificity_frame
+
 
 def load_screening_results(results_file):
-    """Load screening results JSON."""
+    """
+    Load screening results from screening_results.json or the append-only
+    screening_results.jsonl log (compacted on the fly).
+    """
+    if Path(results_file).suffix == ".jsonl":
+        return load_results_log(results_file)
     with open(results_file, 'r') as f:
         return json.load(f)
 
 
+def select_preferred_tier(results):
+    """
+    Keep one screening tier per variant from a tiered screen.
+
+    Variants re-run at production settings are scored from the production
+    tier only; the rest keep their quick-tier results. Untiered results are
+    returned unchanged. Affinity re-runs are not a screening tier (see
+    affinity_selectivity) and are dropped.
+    """
+    results = [r for r in results if r.get('tier') != AFFINITY_TIER]
+    production = {r['variant_id'] for r in results if r.get('tier') == 'production'}
+    return [r for r in results
+            if (r.get('tier') == 'production') == (r['variant_id'] in production)]
+
+
+def affinity_selectivity(results):
+    """
+    Fold-selectivity of the variants re-run with Boltz-2 affinity.
+
+    Boltz-2 predicts log10(IC50 / uM) (affinity_pred_value, lower = tighter),
+    so the binding strength passed to calculate_selectivity_score is
+    10^-affinity_pred_value and its ratios are IC50(off-target) / IC50(target).
+
+    Returns:
+        {variant_id: {'target_log10_ic50', 'target_binder_probability',
+                      'affinity_fold_selectivity', 'affinity_selective'}}
+        for variants with affinity predictions for all four nucleotides
+    """
+    panels = {}
+    for r in results:
+        if r.get('tier') == AFFINITY_TIER and r.get('affinity'):
+            panel = panels.setdefault(r['variant_id'], {'target': r['target_nucleotide'], 'affinity': {}})
+            panel['affinity'][r['test_nucleotide']] = r['affinity']
+
+    metrics = {}
+    for variant_id, panel in panels.items():
+        affinity = panel['affinity']
+        if len(affinity) < 4 or panel['target'] not in affinity:
+            continue
+        selectivity = calculate_selectivity_score(
+            {nuc: 10 ** -a['affinity_pred_value'] for nuc, a in affinity.items()}, panel['target'])
+        metrics[variant_id] = {
+            'target_log10_ic50': affinity[panel['target']]['affinity_pred_value'],
+            'target_binder_probability': affinity[panel['target']]['affinity_probability_binary'],
+            'affinity_fold_selectivity': selectivity['min_selectivity'],
+            'affinity_selective': selectivity['passes_threshold'],
+        }
+    return metrics
+
+
 def calculate_specificity_scores(results_data):
     """
     Calculate specificity scores for each variant.
@@ -28,114 +95,65 @@ def calculate_specificity_scores(results_data):
     - Extract confidence for target nucleotide
     - Extract confidences for 3 off-targets
     - Calculate specificity ratio
-    """
-    results = results_data['results']
 
-    # Group by variant
-    variants_data = {}
-    for r in results:
-        variant_id = r['variant_id']
-        if variant_id not in variants_data:
-            variants_data[variant_id] = {
-                'target_nucleotide': r['target_nucleotide'],
-                'mutations': r['mutations'],
-                'scores': {}
-            }
-
-        test_nuc = r['test_nucleotide']
-        confidence = r['confidence']
-
-        if confidence:
-            variants_data[variant_id]['scores'][test_nuc] = {
-                'confidence_score': confidence['confidence_score'],
-                'ligand_iptm': confidence['ligand_iptm'],
-                'complex_plddt': confidence['complex_plddt'],
-                'is_target': r['is_target']
-            }
-
-    # Calculate specificity for each variant
-    specificity_results = []
-
-    for variant_id, data in variants_data.items():
-        target_nuc = data['target_nucleotide']
-        scores = data['scores']
-
-        # Check if we have all 4 nucleotides
-        if len(scores) != 4:
-            continue
+    Scores are computed for all variants at once on a dense
+    (variants x nucleotides x metrics) tensor (specificity_tensor.py).
 
-        # Target score
-        if target_nuc in scores:
-            target_conf = scores[target_nuc]['confidence_score']
-            target_iptm = scores[target_nuc]['ligand_iptm']
-        else:
-            continue
+    Variants with a target prediction but an incomplete off-target panel
+    (failed, or pruned by target-first scheduling) are kept with
+    panel_complete=False and rank after the complete panels; with no
+    off-targets at all their specificity metrics are NaN. Variants with an
+    affinity re-run get the affinity_selectivity columns.
 
-        # Off-target scores
-        off_target_confs = []
-        off_target_iptms = []
-        for nuc, score_data in scores.items():
-            if nuc != target_nuc:
-                off_target_confs.append(score_data['confidence_score'])
-                off_target_iptms.append(score_data['ligand_iptm'])
+    Returns:
+        DataFrame with one row per variant (in order of first result) and
+        per-nucleotide <nucleotide>_confidence / <nucleotide>_iptm columns
+    """
+    tensor = SpecificityTensor.from_results(results_data['results'])
+    df = specificity_frame(tensor)
+    affinity = affinity_selectivity(tensor.affinity_records)
+    if affinity:
+        metrics = pd.DataFrame.from_dict(affinity, orient='index')
+        df = df.join(metrics, on='variant_id')
+    return df
 
-        if len(off_target_confs) != 3:
-            continue
 
-        mean_off_target_conf = np.mean(off_target_confs)
-        mean_off_target_iptm = np.mean(off_target_iptms)
-        max_off_target_conf = np.max(off_target_confs)
-
-        # Specificity scores
-        # Higher = better specificity
-        specificity_ratio_conf = target_conf / mean_off_target_conf if mean_off_target_conf > 0 else 0
-        specificity_ratio_iptm = target_iptm / mean_off_target_iptm if mean_off_target_iptm > 0 else 0
-
-        # Selectivity (target - max_off_target)
-        selectivity_conf = target_conf - max_off_target_conf
-        selectivity_iptm = target_iptm - max(off_target_iptms)
-
-        # Combined score (high target binding + high specificity)
-        combined_score = target_conf * specificity_ratio_conf
-
-        specificity_results.append({
-            'variant_id': variant_id,
-            'target_nucleotide': target_nuc,
-            'mutations': data['mutations'],
-            'target_confidence': target_conf,
-            'target_iptm': target_iptm,
-            'mean_off_target_conf': mean_off_target_conf,
-            'mean_off_target_iptm': mean_off_target_iptm,
-            'max_off_target_conf': max_off_target_conf,
-            'specificity_ratio_conf': specificity_ratio_conf,
-            'specificity_ratio_iptm': specificity_ratio_iptm,
-            'selectivity_conf': selectivity_conf,
-            'selectivity_iptm': selectivity_iptm,
-            'combined_score': combined_score,
-            'all_scores': scores
-        })
-
-    return specificity_results
+def individual_scores(row):
+    """[(nucleotide, confidence, iPTM)] of the nucleotides a variant was predicted against."""
+    return [(nuc, row[f"{nuc}_confidence"], row[f"{nuc}_iptm"])
+            for nuc in NUCLEOTIDES if pd.notna(row[f"{nuc}_confidence"])]
 
 
 def rank_candidates(specificity_results, metric='combined_score'):
-    """Rank candidates by specificity metric."""
+    """
+    Rank candidates by specificity metric, complete panels first (a partial
+    panel's metrics miss off-targets). Ties keep first-result order, as in
+    streaming_analysis.py.
+    """
     df = pd.DataFrame(specificity_results)
 
-    # Sort by metric
-    df_sorted = df.sort_values(metric, ascending=False).reset_index(drop=True)
+    # Sort by panel completeness, then metric
+    df_sorted = df.sort_values(['panel_complete', metric], ascending=False, kind="stable",
+                               na_position='last').reset_index(drop=True)
 
     return df_sorted
 
 
+def panel_note(row):
+    """' [<status> panel: k/3 off-targets]' for a variant without a complete panel, else ''."""
+    if row['panel_complete']:
+        return ""
+    return f" [{row['status']} panel: {row['n_off_targets']}/{len(NUCLEOTIDES) - 1} off-targets]"
+
+
 def print_top_candidates(df, n=10):
     """Print top N candidates."""
     print(f"\n{'='*80}")
-    print(f"TOP {n} SPECIFIC BINDERS (by combined score)")
+    print(f"TOP {n} SPECIFIC BINDERS (by combined score, complete panels first)")
     print(f"{'='*80}\n")
 
     for i, row in df.head(n).iterrows():
-        print(f"Rank {i+1}: {row['variant_id']}")
+        print(f"Rank {i+1}: {row['variant_id']}{panel_note(row)}")
         print(f"  Target: {row['target_nucleotide']}")
         print(f"  Mutations: {row['mutations']}")
         print(f"  Target confidence: {row['target_confidence']:.4f}")
@@ -143,42 +161,84 @@ def print_top_candidates(df, n=10):
         print(f"  Specificity ratio: {row['specificity_ratio_conf']:.2f}x")
         print(f"  Selectivity: {row['selectivity_conf']:.4f}")
         print(f"  Combined score: {row['combined_score']:.4f}")
+        if pd.notna(row.get('affinity_fold_selectivity', np.nan)):
+            print(f"  Affinity: log10 IC50 {row['target_log10_ic50']:.2f}, "
+                  f"{row['affinity_fold_selectivity']:.1f}-fold selective")
 
         # Show individual scores
         print(f"  Individual scores:")
-        for nuc, score in row['all_scores'].items():
+        for nuc, confidence, iptm in individual_scores(row):
             marker = "★" if nuc == row['target_nucleotide'] else " "
-            print(f"    {marker} {nuc}: {score['confidence_score']:.4f} (iPTM: {score['ligand_iptm']:.4f})")
+            print(f"    {marker} {nuc}: {confidence:.4f} (iPTM: {iptm:.4f})")
         print()
 
 
-def print_summary_by_nucleotide(df):
-    """Print summary statistics by target nucleotide."""
-    print(f"\n{'='*80}")
-    print("SUMMARY BY TARGET NUCLEOTIDE")
-    print(f"{'='*80}\n")
+def summarize_by_nucleotide(df):
+    """
+    Per-target-nucleotide summary of a ranked DataFrame.
 
+    Returns:
+        {nucleotide: {'n_variants', 'best_ratio', 'best_confidence',
+                      'mean_ratio', 'best' (top-ranked scored row or None)}}
+        for the nucleotides with at least one variant
+    """
+    summary = {}
     for nuc in ['dATP', 'dGTP', 'dCTP', 'dTTP']:
         nuc_df = df[df['target_nucleotide'] == nuc]
 
         if len(nuc_df) == 0:
             continue
 
+        scored = nuc_df[nuc_df['combined_score'].notna()]
+        best = scored.iloc[0] if len(scored) else None
+        summary[nuc] = {
+            'n_variants': len(nuc_df),
+            'best_ratio': nuc_df['specificity_ratio_conf'].max(),
+            'best_confidence': nuc_df['target_confidence'].max(),
+            'mean_ratio': nuc_df['specificity_ratio_conf'].mean(),
+            'best': best,
+        }
+    return summary
+
+
+def print_summary_by_nucleotide(df):
+    """Print summary statistics by target nucleotide."""
+    print_nucleotide_summary(summarize_by_nucleotide(df))
+
+
+def print_nucleotide_summary(summary):
+    """Print a summarize_by_nucleotide summary."""
+    print(f"\n{'='*80}")
+    print("SUMMARY BY TARGET NUCLEOTIDE")
+    print(f"{'='*80}\n")
+
+    for nuc, stats in summary.items():
         print(f"{nuc}:")
-        print(f"  Variants tested: {len(nuc_df)}")
-        print(f"  Best specificity ratio: {nuc_df['specificity_ratio_conf'].max():.2f}x")
-        print(f"  Best target confidence: {nuc_df['target_confidence'].max():.4f}")
-        print(f"  Mean specificity ratio: {nuc_df['specificity_ratio_conf'].mean():.2f}x")
+        print(f"  Variants tested: {stats['n_variants']}")
+        print(f"  Best specificity ratio: {stats['best_ratio']:.2f}x")
+        print(f"  Best target confidence: {stats['best_confidence']:.4f}")
+        print(f"  Mean specificity ratio: {stats['mean_ratio']:.2f}x")
 
         # Best variant for this nucleotide
-        best_idx = nuc_df['combined_score'].idxmax()
-        best = df.loc[best_idx]
+        best = stats['best']
+        if best is None:
+            print(f"  No variant with off-target predictions (all pruned)")
+            print()
+            continue
         print(f"  Best variant: {best['variant_id']}")
         print(f"    Mutations: {best['mutations']}")
         print(f"    Combined score: {best['combined_score']:.4f}")
         print()
 
 
+def affinity_table(df):
+    """Variants with affinity fold-selectivity, most selective first (None without affinity re-runs)."""
+    if 'affinity_fold_selectivity' not in df:
+        return None
+    return df[df['affinity_fold_selectivity'].notna()].sort_values(
+        'affinity_fold_selectivity', ascending=False)
+
+
 def save_analysis_results(df, output_dir):
     """Save analysis results to files."""
     output_path = Path(output_dir)
@@ -189,31 +249,48 @@ def save_analysis_results(df, output_dir):
     df.to_csv(csv_file, index=False)
     print(f"✓ Full results saved: {csv_file}")
 
-    # Save top candidates by nucleotide
+    save_top_binders(df, output_path)
+    write_report(df, output_path / "specificity_report.txt", len(df), affinity_table(df))
+
+
+def save_top_binders(df, output_path):
+    """Save the top 5 candidates per target nucleotide of a ranked DataFrame."""
     for nuc in ['dATP', 'dGTP', 'dCTP', 'dTTP']:
         nuc_df = df[df['target_nucleotide'] == nuc].head(5)
         nuc_file = output_path / f"top_binders_{nuc}.csv"
         nuc_df.to_csv(nuc_file, index=False)
         print(f"✓ Top {nuc} binders: {nuc_file}")
 
-    # Save summary report
-    report_file = output_path / "specificity_report.txt"
+
+def write_report(df, report_file, n_variants, affinity_df=None):
+    """
+    Write the summary report.
+
+    Args:
+        df: Ranked DataFrame holding at least the top 10 candidates and the
+            top candidate per nucleotide
+        n_variants: Number of variants analyzed
+        affinity_df: affinity_table of the analyzed variants, if any
+    """
     with open(report_file, 'w') as f:
         f.write("="*80 + "\n")
         f.write("SPECIFICITY SCREENING ANALYSIS REPORT\n")
         f.write("="*80 + "\n\n")
 
-        f.write(f"Total variants analyzed: {len(df)}\n\n")
+        f.write(f"Total variants analyzed: {n_variants}\n\n")
 
         # Top 10 overall
         f.write("TOP 10 SPECIFIC BINDERS (Combined Score)\n")
         f.write("-"*80 + "\n")
         for i, row in df.head(10).iterrows():
-            f.write(f"\n{i+1}. {row['variant_id']} ({row['target_nucleotide']})\n")
+            f.write(f"\n{i+1}. {row['variant_id']} ({row['target_nucleotide']}){panel_note(row)}\n")
             f.write(f"   Mutations: {row['mutations']}\n")
             f.write(f"   Target conf: {row['target_confidence']:.4f}\n")
             f.write(f"   Specificity: {row['specificity_ratio_conf']:.2f}x\n")
             f.write(f"   Combined: {row['combined_score']:.4f}\n")
+            if pd.notna(row.get('affinity_fold_selectivity', np.nan)):
+                f.write(f"   Affinity: log10 IC50 {row['target_log10_ic50']:.2f}, "
+                        f"{row['affinity_fold_selectivity']:.1f}-fold selective\n")
 
         # Best per nucleotide
         f.write("\n\n" + "="*80 + "\n")
@@ -230,11 +307,24 @@ def save_analysis_results(df, output_dir):
                 f.write(f"  Target confidence: {best['target_confidence']:.4f}\n")
                 f.write(f"  Specificity ratio: {best['specificity_ratio_conf']:.2f}x\n")
                 f.write(f"  Individual scores:\n")
-                for test_nuc, score in best['all_scores'].items():
+                for test_nuc, confidence, _ in individual_scores(best):
                     marker = "★" if test_nuc == nuc else " "
-                    f.write(f"    {marker} {test_nuc}: {score['confidence_score']:.4f}\n")
+                    f.write(f"    {marker} {test_nuc}: {confidence:.4f}\n")
                 f.write("\n")
 
+        # Shortlisted variants re-run with affinity prediction
+        if affinity_df is not None:
+            f.write("="*80 + "\n")
+            f.write("AFFINITY FOLD-SELECTIVITY (shortlisted variants)\n")
+            f.write("="*80 + "\n\n")
+            for _, row in affinity_df.iterrows():
+                f.write(f"{row['variant_id']} ({row['target_nucleotide']}): "
+                        f"{row['affinity_fold_selectivity']:.1f}-fold, "
+                        f"log10 IC50 {row['target_log10_ic50']:.2f}, "
+                        f"P(binder) {row['target_binder_probability']:.2f}"
+                        f"{'  [>10-fold]' if row['affinity_selective'] else ''}\n")
+            f.write("\n")
+
     print(f"✓ Analysis report: {report_file}\n")
 
 
@@ -245,7 +335,7 @@ def main():
     parser.add_argument(
         "--results-file",
         default="../specificity_library/screening_results/screening_results.json",
-        help="Screening results JSON file"
+        help="Screening results JSON file or JSONL result log"
     )
     parser.add_argument(
         "--output-dir",
@@ -258,6 +348,18 @@ def main():
         default=10,
         help="Number of top candidates to display (default: 10)"
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Read the results record by record and keep only the top candidates "
+             "(bounded memory; no specificity_analysis.csv, see streaming_analysis.py)"
+    )
+    parser.add_argument(
+        "--buffer-variants",
+        type=int,
+        default=4096,
+        help="Variants held open while their records arrive with --streaming (default: 4096)"
+    )
 
     args = parser.parse_args()
 
@@ -265,32 +367,61 @@ def main():
     print("SPECIFICITY ANALYSIS")
     print("="*80)
 
-    # Load results
-    print(f"\nLoading results from {args.results_file}...")
-    results_data = load_screening_results(args.results_file)
-
-    total = results_data['total_predictions']
-    success = results_data['successful']
-    print(f"Total predictions: {total}")
-    print(f"Successful: {success}")
-
-    # Calculate specificity scores
-    print("\nCalculating specificity scores...")
-    specificity_results = calculate_specificity_scores(results_data)
-    print(f"Variants with complete data: {len(specificity_results)}")
-
-    # Rank candidates
-    df = rank_candidates(specificity_results, metric='combined_score')
+    if args.streaming:
+        from streaming_analysis import analyze_stream, read_header, report_warnings
+
+        print(f"\nStreaming results from {args.results_file}...")
+        header = read_header(args.results_file)
+        if 'total_predictions' in header:
+            print(f"Total predictions: {header['total_predictions']}")
+        if 'successful' in header:
+            print(f"Successful: {header['successful']}")
+
+        print("\nCalculating specificity scores...")
+        analysis = analyze_stream(args.results_file, top_n=args.top_n,
+                                  buffer_variants=args.buffer_variants)
+        n_variants, n_complete, n_pruned = analysis.n_variants, analysis.n_complete, analysis.n_pruned
+        report_warnings(analysis)
+        df = analysis.top_candidates()
+        summary = analysis.nucleotide_summary()
+    else:
+        # Load results
+        print(f"\nLoading results from {args.results_file}...")
+        results_data = load_screening_results(args.results_file)
+
+        total = results_data['total_predictions']
+        success = results_data['successful']
+        print(f"Total predictions: {total}")
+        print(f"Successful: {success}")
+
+        # Calculate specificity scores
+        print("\nCalculating specificity scores...")
+        specificity_results = calculate_specificity_scores(results_data)
+        n_variants = len(specificity_results)
+        n_complete = int(specificity_results['panel_complete'].sum())
+        n_pruned = int((specificity_results['status'] == 'pruned').sum())
+
+        # Rank candidates
+        df = rank_candidates(specificity_results, metric='combined_score')
+        summary = summarize_by_nucleotide(df)
+
+    print(f"Variants with complete data: {n_complete}")
+    if n_complete < n_variants:
+        print(f"Variants with incomplete panels: {n_variants - n_complete} "
+              f"({n_pruned} pruned by target-first screening)")
 
     # Print results
     print_top_candidates(df, n=args.top_n)
-    print_summary_by_nucleotide(df)
+    print_nucleotide_summary(summary)
 
     # Save results
     print(f"\n{'='*80}")
     print("SAVING RESULTS")
     print(f"{'='*80}\n")
-    save_analysis_results(df, args.output_dir)
+    if args.streaming:
+        analysis.save(args.output_dir)
+    else:
+        save_analysis_results(df, args.output_dir)
 
     print(f"\n{'='*80}")
     print("ANALYSIS COMPLETE")
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Retention policy for Boltz prediction outputs.
+
+Every screen job writes, per config, one CIF and pae/plddt(/pde) npz arrays
+per diffusion sample plus a processed/ tree of preprocessed inputs
+(structures, MSAs, mol pickles, constraints). Once a job's result has been
+ingested, a RetentionWorker trims its boltz_results_<stem>/ tree in a
+background thread:
+
+    keep_models      keep CIF/npz files of the top-k models by confidence_score
+                     (the confidence JSONs of all models are kept; they are tiny)
+    pae              "full", "interchain" (only the chain-pair blocks of the
+                     PAE matrix, pae_interchain_<stem>_model_<n>.npz) or "none"
+    compress_cifs    gzip the kept CIFs (<stem>_model_<n>.cif.gz)
+    drop_processed   delete processed/
+
+Files are only ever removed or replaced by new files, never rewritten in
+place, so outputs hard-linked from the prediction cache stay intact.
+
+Usage:
+    python artifact_retention.py ../specificity_library/screening_results --compact
+    python artifact_retention.py RESULTS_DIR --keep-models 2 --pae interchain --dry-run
+"""
+
+import argparse
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import yaml
+
+from cost_model import DEFAULT_CCD_TOKENS, smiles_heavy_atoms
+from prediction_index import ARTIFACT_PATTERNS, load_index, write_index
+
+
+PAE_MODES = ("full", "interchain", "none")
+
+
+@dataclass
+class RetentionPolicy:
+    """What to keep of a finished prediction (defaults keep everything)."""
+    keep_models: Optional[int] = None   # top-k models by confidence_score (None = all)
+    pae: str = "full"                   # "full", "interchain" or "none"
+    compress_cifs: bool = False
+    drop_processed: bool = False
+
+    @property
+    def active(self) -> bool:
+        return self != RetentionPolicy()
+
+
+# Top model only, inter-chain PAE, gzipped CIF, no processed/ tree
+COMPACT_POLICY = RetentionPolicy(keep_models=1, pae="interchain", compress_cifs=True,
+                                 drop_processed=True)
+
+
+def tree_size(path) -> int:
+    """Bytes of the regular files below path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def chain_tokens(config_file) -> List:
+    """
+    [(chain_id, tokens)] of a Boltz YAML config in token order: residues
+    for polymers, heavy atoms for ligands (as in cost_model.config_size).
+    """
+    with open(config_file, 'r') as f:
+        config = yaml.safe_load(f)
+    chains = []
+    for entry in config.get('sequences', []):
+        (kind, spec), = entry.items()
+        ids = spec['id'] if isinstance(spec.get('id'), list) else [spec.get('id')]
+        if kind in ("protein", "dna", "rna"):
+            n = len(spec['sequence'])
+        elif 'smiles' in spec:
+            n = smiles_heavy_atoms(spec['smiles'])
+        else:
+            n = DEFAULT_CCD_TOKENS
+        chains.extend((str(chain_id), n) for chain_id in ids)
+    return chains
+
+
+def extract_interchain_pae(pae_file, chains, out_file) -> bool:
+    """
+    Write the chain-pair blocks of a full PAE matrix to out_file.
+
+    Returns:
+        False (nothing written) if the matrix does not match the chains
+    """
+    with np.load(pae_file) as data:
+        pae = data['pae']
+    sizes = [n for _, n in chains]
+    if len(chains) < 2 or pae.ndim != 2 or pae.shape[0] != sum(sizes):
+        return False
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    blocks = {}
+    for i, (chain_a, _) in enumerate(chains):
+        for j, (chain_b, _) in enumerate(chains):
+            if i != j:
+                blocks[f"{chain_a}_{chain_b}"] = pae[bounds[i]:bounds[i + 1], bounds[j]:bounds[j + 1]]
+    tmp = out_file.with_name(out_file.name + ".tmp.npz")
+    np.savez_compressed(tmp, chains=np.array([c for c, _ in chains]),
+                        chain_tokens=np.array(sizes), **blocks)
+    os.replace(tmp, out_file)
+    return True
+
+
+def gzip_file(path):
+    """Replace path by path.gz."""
+    target = path.with_name(path.name + ".gz")
+    tmp = target.with_name(target.name + ".tmp")
+    with open(path, 'rb') as src, gzip.open(tmp, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, target)
+    path.unlink()
+
+
+def apply_retention(prediction_dir, policy: RetentionPolicy, config_file=None) -> Dict:
+    """
+    Trim one boltz_results_<stem>/ tree according to policy, using its
+    prediction_index.json, which is rewritten afterwards.
+
+    Args:
+        config_file: Job config, needed to locate chains for pae="interchain"
+            (without it, full PAE files are kept)
+
+    Returns:
+        {'bytes_before', 'bytes_after', 'models_removed', 'pae_kept_full'}
+    """
+    prediction_dir = Path(prediction_dir)
+    stats = {"bytes_before": tree_size(prediction_dir), "models_removed": 0, "pae_kept_full": 0}
+    index = load_index(prediction_dir)
+    models = index['models'] if index is not None else []  # best first
+
+    if policy.keep_models is not None:
+        for model in models[policy.keep_models:]:
+            for kind in ARTIFACT_PATTERNS:
+                if kind != "confidence" and model[kind]:
+                    (prediction_dir / model[kind]).unlink(missing_ok=True)
+            stats['models_removed'] += 1
+        models = models[:policy.keep_models]
+
+    if policy.pae != "full":
+        chains = chain_tokens(config_file) if config_file is not None else None
+        for model in models:
+            if not model['pae']:
+                continue
+            pae_file = prediction_dir / model['pae']
+            if policy.pae == "interchain":
+                out_file = pae_file.with_name(f"pae_interchain_{index['stem']}_model_{model['model']}.npz")
+                if chains is None or not extract_interchain_pae(pae_file, chains, out_file):
+                    stats['pae_kept_full'] += 1
+                    continue
+            pae_file.unlink()
+
+    if policy.compress_cifs:
+        for model in models:
+            if model['structure'] and model['structure'].endswith(".cif"):
+                gzip_file(prediction_dir / model['structure'])
+
+    if policy.drop_processed:
+        shutil.rmtree(prediction_dir / "processed", ignore_errors=True)
+
+    if index is not None:
+        write_index(prediction_dir)
+    stats['bytes_after'] = tree_size(prediction_dir)
+    return stats
+
+
+class RetentionWorker:
+    """Applies a RetentionPolicy to finished jobs on a background thread."""
+
+    def __init__(self, policy: RetentionPolicy):
+        self.policy = policy
+        self.jobs = 0
+        self.errors = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="artifact-retention", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, prediction_dir, config_file=None):
+        """Queue an ingested job's prediction directory for trimming."""
+        self._queue.put((prediction_dir, config_file))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            prediction_dir, config_file = item
+            try:
+                stats = apply_retention(prediction_dir, self.policy, config_file)
+            except (OSError, ValueError, KeyError, yaml.YAMLError) as e:
+                self.errors += 1
+                print(f"  WARNING: retention failed for {prediction_dir}: {e}")
+                continue
+            self.jobs += 1
+            self.bytes_before += stats['bytes_before']
+            self.bytes_after += stats['bytes_after']
+
+    def close(self):
+        """Finish the queued jobs and stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def summary(self) -> Dict:
+        return {
+            "jobs": self.jobs,
+            "errors": self.errors,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+def policy_from_args(args) -> RetentionPolicy:
+    """RetentionPolicy from --compact/--keep-models/--pae/--compress-cifs/--drop-processed."""
+    policy = COMPACT_POLICY if getattr(args, 'compact', False) else RetentionPolicy()
+    return RetentionPolicy(
+        keep_models=args.keep_models if args.keep_models is not None else policy.keep_models,
+        pae=args.pae or policy.pae,
+        compress_cifs=args.compress_cifs or policy.compress_cifs,
+        drop_processed=args.drop_processed or policy.drop_processed,
+    )
+
+
+def add_policy_arguments(parser):
+    """The retention options shared with run_specificity_screen.py."""
+    parser.add_argument("--keep-models", type=int,
+                        help="Keep structures/arrays of only the top-k models by confidence")
+    parser.add_argument("--pae", choices=PAE_MODES,
+                        help="PAE to keep: full matrix, inter-chain blocks, or none")
+    parser.add_argument("--compress-cifs", action="store_true", help="Gzip kept CIF files")
+    parser.add_argument("--drop-processed", action="store_true",
+                        help="Delete the processed/ input tree after ingestion")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply a retention policy to finished screening outputs"
+    )
+    parser.add_argument("results_dir", help="Screening results directory")
+    parser.add_argument("--compact", action="store_true",
+                        help="Top model, inter-chain PAE, gzipped CIF, no processed/ "
+                             "(individual options override)")
+    add_policy_arguments(parser)
+    parser.add_argument("--library-dir",
+                        help="Library with configs_with_msas/ (default: parent of results_dir)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report current sizes")
+
+    args = parser.parse_args()
+
+    policy = policy_from_args(args)
+    results_file = Path(args.results_dir) / "screening_results.json"
+    with open(results_file, 'r') as f:
+        records = json.load(f).get('results', [])
+    configs_dir = Path(args.library_dir or Path(args.results_dir).parent) / "configs_with_msas"
+
+    before = after = 0
+    for record in records:
+        if not record.get('prediction_dir') or not Path(record['prediction_dir']).exists():
+            continue
+        if args.dry_run:
+            before += tree_size(record['prediction_dir'])
+            continue
+        stem = Path(record['prediction_dir']).name[len("boltz_results_"):]
+        config_file = configs_dir / f"{stem}.yaml"
+        stats = apply_retention(record['prediction_dir'], policy,
+                                config_file if config_file.is_file() else None)
+        before += stats['bytes_before']
+        after += stats['bytes_after']
+
+    if args.dry_run:
+        print(f"Prediction outputs: {before / 1e6:.1f} MB")
+    else:
+        print(f"Policy: {policy}")
+        print(f"Saved {(before - after) / 1e6:.1f} MB ({before / 1e6:.1f} -> {after / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Asyncio orchestration of Boltz subprocesses with streaming progress events.
+
+One event loop drives all running predictions through
+asyncio.create_subprocess_exec: stdout/stderr are streamed incrementally to
+a per-job log (no buffered capture_output), timeouts cancel and kill the
+job's whole process group, and the number of concurrent jobs is limited
+only by the slot count, not by threads.
+
+Progress events are plain dicts, delivered to in-process subscribers and
+appended to a JSONL file that other tools can follow:
+
+    {"event": "queued",   "time": ..., "job": "var_vs_dATP", "index": 3}
+    {"event": "started",  ..., "device": "0", "attempt": 1}
+    {"event": "retrying", ..., "failure_class": "cuda_oom", "delay": 0.0}
+    {"event": "finished", ..., "elapsed": 181.2}
+    {"event": "failed",   ..., "failure_class": "bad_input", "error": "..."}
+
+Usage:
+    python async_orchestrator.py watch ../specificity_library/screening_results/screen_events.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+EVENTS_LOG_NAME = "screen_events.jsonl"
+EVENT_TYPES = ("queued", "started", "retrying", "finished", "failed")
+
+STREAM_CHUNK = 64 * 1024
+
+
+class ProgressEvents:
+    """Fan-out of structured progress events to callbacks and a JSONL file."""
+
+    def __init__(self, log_file=None):
+        self._subscribers: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+        self._f = None
+        if log_file is not None:
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            self._f = open(log_file, 'a')
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """Call callback(event) for every event emitted from now on."""
+        self._subscribers.append(callback)
+
+    def emit(self, event: str, **fields):
+        entry = {"event": event, "time": time.time()}
+        entry.update({k: v for k, v in fields.items() if v is not None})
+        with self._lock:
+            if self._f is not None:
+                self._f.write(json.dumps(entry) + "\n")
+                self._f.flush()
+        for callback in self._subscribers:
+            callback(entry)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def follow_events(log_file, poll_interval: float = 0.5, stop_after: Optional[float] = None) -> Iterator[Dict]:
+    """
+    Yield events from an events JSONL file as they are appended (tail -f).
+
+    Args:
+        stop_after: Stop once no new event arrived for this many seconds
+    """
+    log_file = Path(log_file)
+    position = 0
+    last_event = time.time()
+    buffer = ""
+    while True:
+        if log_file.exists():
+            with open(log_file, 'r') as f:
+                f.seek(position)
+                buffer += f.read()
+                position = f.tell()
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                last_event = time.time()
+                yield json.loads(line)
+        if stop_after is not None and time.time() - last_event > stop_after:
+            return
+        time.sleep(poll_interval)
+
+
+def _kill_process_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def stream_subprocess(cmd, env=None, timeout: Optional[float] = None, log_file=None,
+                            tail_lines: int = 50) -> Dict:
+    """
+    Run a command, streaming its stdout/stderr into log_file as it runs.
+
+    Output is read in chunks rather than lines, so carriage-return progress
+    bars cannot overflow the reader. On timeout or cancellation the whole
+    process group is killed.
+
+    Returns:
+        {'returncode', 'timed_out', 'stderr' (last tail_lines lines), 'elapsed'}
+    """
+    start_time = time.time()
+    proc = await asyncio.create_subprocess_exec(
+        *[str(c) for c in cmd],
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+        start_new_session=True,
+    )
+
+    tail = deque(maxlen=tail_lines)
+    log = open(log_file, 'a') if log_file is not None else None
+
+    async def pump(stream, name):
+        partial = ""
+        while True:
+            chunk = await stream.read(STREAM_CHUNK)
+            if not chunk:
+                break
+            text = chunk.decode(errors='replace')
+            if log is not None:
+                log.write(text)
+                log.flush()
+            if name == "stderr":
+                *lines, partial = (partial + text).replace("\r", "\n").split("\n")
+                tail.extend(line for line in lines if line.strip())
+        if name == "stderr" and partial.strip():
+            tail.append(partial)
+
+    readers = asyncio.gather(pump(proc.stdout, "stdout"), pump(proc.stderr, "stderr"))
+    timed_out = False
+    try:
+        try:
+            await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            _kill_process_group(proc)
+            await proc.wait()
+        await readers
+    except asyncio.CancelledError:
+        _kill_process_group(proc)
+        readers.cancel()
+        raise
+    finally:
+        if log is not None:
+            log.close()
+
+    return {
+        "returncode": proc.returncode,
+        "timed_out": timed_out,
+        "stderr": "\n".join(tail),
+        "elapsed": time.time() - start_time,
+    }
+
+
+class AsyncOrchestrator:
+    """
+    Keeps up to `slots` coroutine jobs in flight on one event loop.
+
+    Devices are handed out per attempt from a pool of slot entries
+    (slot i -> device_ids[i % len(device_ids)]), like make_device_pool in
+    run_specificity_screen.py.
+    """
+
+    def __init__(self, slots: int, device_ids: Optional[List] = None,
+                 events: Optional[ProgressEvents] = None):
+        self.slots = max(1, slots)
+        self.device_ids = device_ids
+        self.events = events or ProgressEvents()
+        self._devices = None
+        self._loop = None
+        self._main_task = None
+        self._stopping = False
+
+    @asynccontextmanager
+    async def device(self):
+        """Hold a device for the duration of the block (None = no pinning)."""
+        if self._devices is None:
+            yield None
+            return
+        device_id = await self._devices.get()
+        try:
+            yield device_id
+        finally:
+            self._devices.put_nowait(device_id)
+
+    async def run(self, next_item: Callable, execute: Callable, on_outcome: Callable):
+        """
+        Dispatch until next_item() returns None and all jobs finished.
+
+        Args:
+            next_item: Returns the next item to run, or None (called only when
+                a slot is free, so the source can re-prioritize meanwhile)
+            execute: async execute(item) -> outcome
+            on_outcome: Called with each outcome in completion order
+        """
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.current_task()
+        if self.device_ids:
+            self._devices = asyncio.Queue()
+            for slot in range(self.slots):
+                self._devices.put_nowait(self.device_ids[slot % len(self.device_ids)])
+
+        in_flight = set()
+        try:
+            while True:
+                while not self._stopping and len(in_flight) < self.slots:
+                    item = next_item()
+                    if item is None:
+                        break
+                    in_flight.add(asyncio.create_task(execute(item)))
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    on_outcome(task.result())
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+    def stop(self):
+        """Cancel a running orchestrator from another thread (kills its subprocesses)."""
+        self._stopping = True
+        if self._loop is not None and self._main_task is not None and not self._main_task.done():
+            try:
+                self._loop.call_soon_threadsafe(self._main_task.cancel)
+            except RuntimeError:
+                pass  # loop already closed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Follow screen progress events"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    watch = subparsers.add_parser("watch", help="Print events as they are appended")
+    watch.add_argument("events_file", help=EVENTS_LOG_NAME)
+    watch.add_argument("--stop-after", type=float, help="Exit after this many idle seconds")
+
+    args = parser.parse_args()
+
+    counts = {event: 0 for event in EVENT_TYPES}
+    try:
+        for event in follow_events(args.events_file, stop_after=args.stop_after):
+            counts[event['event']] = counts.get(event['event'], 0) + 1
+            details = {k: v for k, v in event.items() if k not in ("event", "time", "job")}
+            stamp = time.strftime("%H:%M:%S", time.localtime(event['time']))
+            print(f"[{stamp}] {event['event']:<8} {event.get('job', '')} {json.dumps(details)}")
+    except KeyboardInterrupt:
+        pass
+    print(", ".join(f"{k}: {v}" for k, v in counts.items()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
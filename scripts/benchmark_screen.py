@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark of the screen runner against mock_boltz.py.
+
+Builds a synthetic library of N jobs (nanobody-sized variants x 4
+nucleotides, with a share of chimera-sized ones), runs
+run_specificity_screen.run_batch_predictions on it with BOLTZ_BIN pointing
+at the mock, and reports:
+
+    orchestration overhead per job   worker-seconds not spent inside boltz
+    scheduler utilization            boltz seconds / (dispatch wall x workers)
+    manifest I/O                     loading library_manifest.yaml
+    config parsing + cost model      job features, estimate, timeouts
+    result ingestion                 per-outcome logging, markers, progress
+    confidence parsing               reading confidence JSONs (worker threads)
+    compaction                       screening_results.json from the log
+
+Usage:
+    python benchmark_screen.py --jobs 1000 10000 --workers 16
+    python benchmark_screen.py --jobs 100000 --workers 64 --work-dir /scratch/bench
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(__file__))
+import run_specificity_screen
+from artifact_retention import COMPACT_POLICY
+
+
+NUCLEOTIDES = {
+    "dATP": "Nc1ncnc2c1ncn2[C@H]3C[C@H](O)[C@@H](COP(O)(=O)OP(O)(=O)OP(O)(O)=O)O3",
+    "dGTP": "Nc1nc2n(cnc2c(=O)[nH]1)[C@H]3C[C@H](O)[C@@H](COP(O)(=O)OP(O)(=O)OP(O)(O)=O)O3",
+    "dCTP": "NC1=NC(=O)N(C=C1)[C@H]2C[C@H](O)[C@@H](COP(O)(=O)OP(O)(=O)OP(O)(O)=O)O2",
+    "dTTP": "CC1=CN([C@H]2C[C@H](O)[C@@H](COP(O)(=O)OP(O)(=O)OP(O)(O)=O)O2)C(=O)NC1=O",
+}
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def build_library(library_dir, n_jobs, chimera_fraction=0.1, seed=0):
+    """Synthetic library with n_jobs configs (rounded up to whole variants)."""
+    rng = random.Random(seed)
+    library_dir = Path(library_dir)
+    configs_dir = library_dir / "configs_with_msas"
+    configs_dir.mkdir(parents=True, exist_ok=True)
+    msa_file = library_dir / "msas" / "shared" / "A.a3m"
+    msa_file.parent.mkdir(parents=True, exist_ok=True)
+
+    n_variants = -(-n_jobs // len(NUCLEOTIDES))
+    query = "".join(rng.choice(AMINO_ACIDS) for _ in range(120))
+    with open(msa_file, 'w') as f:
+        for i in range(256):
+            f.write(f">seq{i}\n{query}\n")
+
+    configs = []
+    for v in range(n_variants):
+        target = list(NUCLEOTIDES)[v % len(NUCLEOTIDES)]
+        variant_id = f"{target}_variant_{v:06d}"
+        length = rng.randint(250, 420) if rng.random() < chimera_fraction else rng.randint(110, 130)
+        sequence = "".join(rng.choice(AMINO_ACIDS) for _ in range(length))
+        for nucleotide, smiles in NUCLEOTIDES.items():
+            name = f"{variant_id}_vs_{nucleotide}.yaml"
+            with open(configs_dir / name, 'w') as f:
+                yaml.dump({"version": 1, "sequences": [
+                    {"protein": {"id": "A", "sequence": sequence, "msa": str(msa_file)}},
+                    {"ligand": {"id": "B", "smiles": smiles}},
+                ]}, f, default_flow_style=False, sort_keys=False)
+            configs.append({
+                "config_file": f"configs/{name}",
+                "variant_id": variant_id,
+                "target_nucleotide": target,
+                "test_nucleotide": nucleotide,
+                "mutations": "synthetic",
+                "is_target": nucleotide == target,
+            })
+
+    with open(library_dir / "library_manifest.yaml", 'w') as f:
+        yaml.dump({"library_size": n_variants, "total_predictions": len(configs),
+                   "nucleotides": list(NUCLEOTIDES), "configs": configs}, f, default_flow_style=False)
+    return len(configs)
+
+
+@contextlib.contextmanager
+def mock_boltz_env(**settings):
+    """
+    Run boltz as mock_boltz.py (BOLTZ_BIN) inside the block, with optional
+    MOCK_BOLTZ_* settings; the previous environment is restored afterwards.
+    """
+    env = {"BOLTZ_BIN": str(Path(__file__).resolve().parent / "mock_boltz.py"), **settings}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def run_benchmark(n_jobs, work_dir, workers=8, time_scale=0.0, sleep=0.0, failures=None,
+                  arrays=None, quick=True, orchestrator="threads", schedule="lpt", accelerator="gpu",
+                  retention=None, adaptive_sampling=False, gpu_memory_gb=None, pack_gpus=None,
+                  memory_scale=1.0, verbose=False):
+    """
+    Run one benchmark point.
+
+    With gpu_memory_gb the mock simulates GPUs of that size (jobs that do
+    not fit next to the running ones fail with CUDA OOM, memory_scale x the
+    runner's estimate each); pack_gpus=N packs the workers onto N GPUs.
+
+    Returns:
+        Dict of throughput and overhead metrics
+    """
+    work_dir = Path(work_dir)
+    library_dir = work_dir / f"library_{n_jobs}"
+    results_dir = work_dir / f"results_{n_jobs}"
+    shutil.rmtree(results_dir, ignore_errors=True)
+    if not (library_dir / "library_manifest.yaml").exists():
+        build_library(library_dir, n_jobs)
+
+    mock_env = mock_boltz_env(
+        MOCK_BOLTZ_TIME_SCALE=str(time_scale),
+        MOCK_BOLTZ_SLEEP=str(sleep),
+        MOCK_BOLTZ_FAILURES=failures or "",
+        # Full PAE arrays for 10^5 jobs would need ~10 GB
+        MOCK_BOLTZ_ARRAYS="1" if (arrays if arrays is not None else n_jobs <= 10000) else "0",
+        MOCK_BOLTZ_GPU_MEMORY_GB=str(gpu_memory_gb or 0),
+        MOCK_BOLTZ_MEMORY_SCALE=str(memory_scale),
+        MOCK_BOLTZ_MEMORY_DIR=str(work_dir / "gpu_ledger"),
+    )
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    start = time.perf_counter()
+    with mock_env, output:
+        final = run_specificity_screen.run_batch_predictions(
+            library_dir, results_dir, quick_mode=quick, limit=n_jobs, workers=workers,
+            gpu_ids=([str(i) for i in range(pack_gpus or workers)] if accelerator == "gpu"
+                     else None),
+            backend=orchestrator, schedule=schedule, accelerator=accelerator,
+            retention=retention, adaptive_sampling=adaptive_sampling,
+            gpu_memory_gb=gpu_memory_gb, pack_gpus=bool(pack_gpus))
+    wall = time.perf_counter() - start
+
+    profile = final['profile']
+
+    def seconds(phase):
+        return profile.get(phase, {}).get('seconds', 0.0)
+
+    n_done = profile.get('dispatch', {}).get('count', 0)
+    dispatch = seconds('dispatch')
+    prediction = seconds('prediction')
+    return {
+        "jobs": n_jobs,
+        "workers": workers,
+        "orchestrator": orchestrator,
+        "successful": final['successful'],
+        "failed": final['failed'],
+        "wall_seconds": wall,
+        "jobs_per_second": n_done / dispatch if dispatch else 0.0,
+        "boltz_seconds": prediction,
+        "overhead_per_job_ms": 1000 * (dispatch * workers - prediction) / max(n_done, 1),
+        "utilization": prediction / (dispatch * workers) if dispatch else 0.0,
+        "manifest_io_seconds": seconds('manifest_io'),
+        "cost_model_seconds": seconds('cost_model'),
+        "ingestion_seconds": seconds('ingestion'),
+        "ingestion_per_job_ms": 1000 * seconds('ingestion') / max(n_done, 1),
+        "confidence_parsing_seconds": seconds('confidence_parsing'),
+        "compaction_seconds": seconds('compaction'),
+        "bytes_saved": final.get('retention', {}).get('bytes_saved', 0),
+        "gpu_ooms": sum(d['ooms'] for d in final.get('gpu_packing', {}).values()),
+        "jobs_per_gpu": max((d['peak_jobs'] for d in final.get('gpu_packing', {}).values()), default=1),
+    }
+
+
+def print_report(rows):
+    print(f"\n{'jobs':>8} {'wkrs':>4} {'ok':>7} {'fail':>5} {'wall s':>8} {'jobs/s':>7} "
+          f"{'ovh ms/job':>10} {'util':>5} {'manifest s':>10} {'features s':>10} "
+          f"{'ingest s':>9} {'conf s':>7} {'compact s':>9}")
+    for r in rows:
+        print(f"{r['jobs']:>8} {r['workers']:>4} {r['successful']:>7} {r['failed']:>5} "
+              f"{r['wall_seconds']:>8.1f} {r['jobs_per_second']:>7.1f} "
+              f"{r['overhead_per_job_ms']:>10.1f} {r['utilization']:>5.0%} "
+              f"{r['manifest_io_seconds']:>10.2f} {r['cost_model_seconds']:>10.2f} "
+              f"{r['ingestion_seconds']:>9.2f} {r['confidence_parsing_seconds']:>7.2f} "
+              f"{r['compaction_seconds']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark screen orchestration throughput against a mock Boltz"
+    )
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1000],
+                        help="Job counts to benchmark (default: 1000)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent jobs (default: 8)")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="Mock runtime = cost-model prior x this (default: 0, overhead only)")
+    parser.add_argument("--sleep", type=float, default=0.0, help="Fixed mock runtime per job (s)")
+    parser.add_argument("--failures", help='Mock failure distribution, e.g. "cuda_oom=0.01,transient_io=0.01"')
+    parser.add_argument("--orchestrator", choices=["threads", "async"], default="threads")
+    parser.add_argument("--schedule", choices=["lpt", "manifest"], default="lpt")
+    parser.add_argument("--accelerator", choices=["gpu", "cpu"], default="gpu")
+    parser.add_argument("--compact", action="store_true",
+                        help="Apply the compact retention policy (reports bytes saved)")
+    parser.add_argument("--adaptive-sampling", action="store_true",
+                        help="Per-variant sampling profiles (see sampling_profiles.py)")
+    parser.add_argument("--gpu-memory", type=float,
+                        help="Simulated GPU memory in GB (mock OOMs; --adaptive-sampling/--pack-gpus budget)")
+    parser.add_argument("--pack-gpus", type=int, help="Pack the workers onto this many GPUs by memory")
+    parser.add_argument("--memory-scale", type=float, default=1.0,
+                        help="Mock peak memory / runner estimate (default: 1.0)")
+    parser.add_argument("--work-dir", help="Where to build libraries and results (default: temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory")
+    parser.add_argument("--json", help="Also write the metrics to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the runner's output")
+
+    args = parser.parse_args()
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="screen_bench_"))
+    rows = []
+    try:
+        for n_jobs in args.jobs:
+            print(f"Benchmarking {n_jobs} jobs on {args.workers} workers ({args.orchestrator})...")
+            rows.append(run_benchmark(n_jobs, work_dir, workers=args.workers,
+                                      time_scale=args.time_scale, sleep=args.sleep,
+                                      failures=args.failures, orchestrator=args.orchestrator,
+                                      schedule=args.schedule, accelerator=args.accelerator,
+                                      retention=COMPACT_POLICY if args.compact else None,
+                                      adaptive_sampling=args.adaptive_sampling,
+                                      gpu_memory_gb=args.gpu_memory, pack_gpus=args.pack_gpus,
+                                      memory_scale=args.memory_scale,
+                                      verbose=args.verbose))
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
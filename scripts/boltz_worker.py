@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+"""
+Persistent Boltz worker daemon with a local spool-directory job queue.
+
+Each worker is pinned to one device, loads the Boltz-2 model once, and then
+serves prediction jobs until it is drained. Jobs are JSON files in a spool
+directory, so the screen runner (or anything else) can submit work without
+a server process:
+
+    <spool>/
+        pending/<job_id>.json          submitted jobs
+        pending/<library>/<job_id>.json
+                                       jobs submitted under a library name
+        running/<worker_id>/<job_id>   claimed by atomic rename
+        done/<job_id>.json             results
+        workers/<worker_id>.json       heartbeats (health check)
+        libraries/, usage/, stats/     fair-share state (fair_share.py)
+        DRAIN                          finish current jobs, then exit
+
+Workers claim from the highest-priority library, then the one furthest
+below its weighted share of device time (fair_share.py), oldest job first
+within a library, so several screens can share one pool of workers.
+
+Usage:
+    python boltz_worker.py serve --spool ../specificity_library/worker_spool --device 0
+    python boltz_worker.py health --spool ../specificity_library/worker_spool
+    python boltz_worker.py drain --spool ../specificity_library/worker_spool
+    python fair_share.py ../specificity_library/worker_spool     # per-library shares and waits
+
+The "warm" backend binds to Boltz-2 internals (boltz.main and friends). If
+the installed Boltz version is incompatible, use --backend subprocess, which
+runs `boltz predict` per job through the same queue. The warm backend loads
+only the structure checkpoint: configs requesting affinity fail on it and
+need --backend subprocess.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+import fair_share
+from prediction_index import prediction_dir_for, write_index
+
+
+HEARTBEAT_INTERVAL = 10.0  # seconds
+
+
+def _atomic_write_json(path, data):
+    """Write JSON via a temporary file and rename so readers never see partial files."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def init_spool(spool_dir) -> Path:
+    """Create the spool directory layout."""
+    spool = Path(spool_dir)
+    for sub in ("pending", "running", "done", "workers"):
+        (spool / sub).mkdir(parents=True, exist_ok=True)
+    return spool
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+def submit_job(spool_dir, config_file, output_dir, sampling: Dict,
+               write_full_pae: bool = True, job_id: Optional[str] = None,
+               timeout: Optional[float] = None, library: Optional[str] = None,
+               cost: Optional[float] = None) -> str:
+    """
+    Submit a prediction job to the worker queue.
+
+    Args:
+        config_file: Boltz YAML config
+        output_dir: Output directory (outputs land in boltz_results_<stem>/)
+        sampling: diffusion_samples / sampling_steps / recycling_steps
+        job_id: Optional job ID (default: random)
+        timeout: Per-job timeout in seconds (default: the backend's)
+        library: Library to queue (and charge) the job under (default: "default")
+        cost: Predicted runtime in seconds, charged to the library on claim
+
+    Returns:
+        Job ID
+    """
+    spool = init_spool(spool_dir)
+    job_id = job_id or uuid.uuid4().hex
+    library = fair_share.library_name(library)
+    job = {
+        "job_id": job_id,
+        "config_file": str(Path(config_file).resolve()),
+        "output_dir": str(Path(output_dir).resolve()),
+        "sampling": sampling,
+        "write_full_pae": write_full_pae,
+        "timeout": timeout,
+        "library": library,
+        "cost": cost,
+        "submitted": time.time(),
+    }
+    # Results from an earlier run with the same ID would be picked up as ours
+    (spool / "done" / f"{job_id}.json").unlink(missing_ok=True)
+    pending_dir = fair_share.pending_dir(spool, library)
+    pending_dir.mkdir(exist_ok=True)
+    fair_share.activate_library(spool, library)
+    _atomic_write_json(pending_dir / f"{job_id}.json", job)
+    return job_id
+
+
+def poll_results(spool_dir, job_ids) -> Dict[str, Dict]:
+    """Return results for any of job_ids that have finished (removing them from done/)."""
+    done_dir = Path(spool_dir) / "done"
+    finished = {}
+    for job_id in job_ids:
+        result_file = done_dir / f"{job_id}.json"
+        if result_file.exists():
+            with open(result_file, 'r') as f:
+                finished[job_id] = json.load(f)
+            result_file.unlink()
+    return finished
+
+
+def reorder_pending(spool_dir, job_ids, library: Optional[str] = None) -> int:
+    """
+    Re-prioritize still-pending jobs of a library: workers claim its oldest
+    file first, so pending files are re-stamped in the order of job_ids.
+
+    Returns:
+        Number of jobs re-stamped (claimed jobs are skipped)
+    """
+    pending_dir = fair_share.pending_dir(spool_dir, library)
+    base = time.time() - len(job_ids)
+    reordered = 0
+    for rank, job_id in enumerate(job_ids):
+        try:
+            os.utime(pending_dir / f"{job_id}.json", (base + rank, base + rank))
+            reordered += 1
+        except FileNotFoundError:
+            continue  # already claimed
+    return reordered
+
+
+def check_health(spool_dir, stale_after: float = 3 * HEARTBEAT_INTERVAL) -> List[Dict]:
+    """
+    Read worker heartbeats.
+
+    Returns:
+        List of heartbeat dicts with an added 'healthy' flag and 'age' (seconds)
+    """
+    workers_dir = Path(spool_dir) / "workers"
+    now = time.time()
+    workers = []
+    for hb_file in sorted(workers_dir.glob("*.json")) if workers_dir.exists() else []:
+        try:
+            with open(hb_file, 'r') as f:
+                hb = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            continue
+        hb['age'] = now - hb.get('heartbeat', 0)
+        hb['healthy'] = hb.get('status') != 'stopped' and hb['age'] < stale_after
+        workers.append(hb)
+    return workers
+
+
+def worker_alive(hb: Dict) -> Optional[bool]:
+    """
+    Whether the process behind a heartbeat still exists: True/False for
+    workers on this host, None when it cannot be checked (another host).
+    """
+    if hb.get('host') != socket.gethostname() or not hb.get('pid'):
+        return None
+    try:
+        os.kill(hb['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def requeue_stale_jobs(spool_dir, stale_after: float = 3 * HEARTBEAT_INTERVAL) -> int:
+    """
+    Move jobs claimed by dead workers back to pending/. A worker is dead when
+    its heartbeat is stale (or it stopped) and, on this host, its process is
+    gone; a local worker whose process still runs keeps its jobs however old
+    its heartbeat, so a slow prediction is never run twice.
+    """
+    spool = Path(spool_dir)
+    heartbeats = {hb['worker_id']: hb for hb in check_health(spool, stale_after)}
+    requeued = 0
+    for worker_dir in (spool / "running").iterdir():
+        if not worker_dir.is_dir():
+            continue
+        hb = heartbeats.get(worker_dir.name)
+        if hb is not None and (hb['healthy'] or worker_alive(hb)):
+            continue
+        for orphan in worker_dir.glob("*.json"):
+            try:
+                with open(orphan, 'r') as f:
+                    library = json.load(f).get('library')
+            except (FileNotFoundError, json.JSONDecodeError):
+                library = None
+            pending_dir = fair_share.pending_dir(spool, library)
+            pending_dir.mkdir(exist_ok=True)
+            try:
+                os.rename(orphan, pending_dir / orphan.name)
+                requeued += 1
+            except FileNotFoundError:
+                pass
+    return requeued
+
+
+def request_drain(spool_dir):
+    """Ask all workers to finish their current job and exit."""
+    spool = init_spool(spool_dir)
+    (spool / "DRAIN").touch()
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class SubprocessBackend:
+    """Runs `boltz predict` per job (no warm model, but same queue semantics)."""
+
+    name = "subprocess"
+
+    def __init__(self, accelerator="gpu", timeout=600):
+        self.accelerator = accelerator
+        self.timeout = timeout
+
+    def predict(self, job: Dict):
+        from screen_jobs import build_boltz_command
+
+        cmd = build_boltz_command(job['config_file'], job['output_dir'], params=job['sampling'])
+        cmd[cmd.index("--accelerator") + 1] = self.accelerator
+        if not job.get('write_full_pae', True):
+            cmd.remove("--write_full_pae")
+
+        result = subprocess.run(cmd, capture_output=True, text=True,
+                                timeout=job.get('timeout') or self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]):
+    """
+    Raise TimeoutError in the calling (main) thread after seconds, via
+    SIGALRM. In-process predictions cannot be killed like a subprocess; the
+    alarm interrupts them at the next Python bytecode (CUDA kernels already
+    launched finish first). No limit outside the main thread or for None.
+    """
+    if not seconds or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expired(signum, frame):
+        raise TimeoutError(f"Timed out after {seconds:.0f}s")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class WarmBoltzBackend:
+    """
+    In-process Boltz-2 predictor: imports torch and loads the checkpoint once,
+    then runs preprocessing + inference per job with per-job sampling args.
+    """
+
+    name = "warm"
+
+    def __init__(self, cache_dir="~/.boltz", accelerator="gpu", use_kernels=True, timeout=600):
+        from boltz import main as boltz_main
+        from boltz.model.models.boltz2 import Boltz2
+
+        self._main = boltz_main
+        self.accelerator = accelerator
+        self.timeout = timeout
+        self.cache = Path(cache_dir).expanduser()
+        self.cache.mkdir(parents=True, exist_ok=True)
+        boltz_main.download_boltz2(self.cache)
+        self.mol_dir = self.cache / "mols"
+
+        self.model = Boltz2.load_from_checkpoint(
+            self.cache / "boltz2_conf.ckpt",
+            strict=True,
+            predict_args={
+                "recycling_steps": 3,
+                "sampling_steps": 200,
+                "diffusion_samples": 1,
+                "max_parallel_samples": 5,
+                "write_confidence_summary": True,
+                "write_full_pae": True,
+                "write_full_pde": False,
+            },
+            map_location="cpu",
+            diffusion_process_args=asdict(boltz_main.Boltz2DiffusionParams()),
+            ema=False,
+            use_kernels=use_kernels,
+            pairformer_args=asdict(boltz_main.PairformerArgsV2()),
+            msa_args=asdict(boltz_main.MSAModuleArgs()),
+            steering_args=asdict(boltz_main.BoltzSteeringParams()),
+        )
+        self.model.eval()
+
+    def predict(self, job: Dict):
+        with time_limit(job.get('timeout') or self.timeout):
+            self._predict(job)
+
+    def _predict(self, job: Dict):
+        from pytorch_lightning import Trainer
+        from boltz.data.module.inferencev2 import Boltz2InferenceDataModule
+        from boltz.data.types import Manifest
+        from boltz.data.write.writer import BoltzWriter
+
+        config_file = Path(job['config_file'])
+        with open(config_file, 'r') as f:
+            if any('affinity' in prop for prop in yaml.safe_load(f).get('properties') or []):
+                # Only boltz2_conf.ckpt is loaded; affinity outputs would be silently missing
+                raise ValueError("Affinity prediction is not supported by the warm backend "
+                                 "(use --backend subprocess)")
+        out_dir = Path(job['output_dir']) / f"boltz_results_{config_file.stem}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        self._main.process_inputs(
+            data=self._main.check_inputs(config_file),
+            out_dir=out_dir,
+            ccd_path=self.cache / "ccd.pkl",
+            mol_dir=self.mol_dir,
+            use_msa_server=False,
+            msa_server_url="https://api.colabfold.com",
+            msa_pairing_strategy="greedy",
+            boltz2=True,
+        )
+
+        processed = out_dir / "processed"
+        manifest = Manifest.load(processed / "manifest.json")
+
+        def optional_dir(name):
+            path = processed / name
+            return path if path.exists() else None
+
+        sampling = job['sampling']
+        self.model.predict_args = {
+            "recycling_steps": sampling['recycling_steps'],
+            "sampling_steps": sampling['sampling_steps'],
+            "diffusion_samples": sampling['diffusion_samples'],
+            "max_parallel_samples": sampling.get('max_parallel_samples', sampling['diffusion_samples']),
+            "write_confidence_summary": True,
+            "write_full_pae": job.get('write_full_pae', True),
+            "write_full_pde": False,
+        }
+
+        writer = BoltzWriter(
+            data_dir=processed / "structures",
+            output_dir=out_dir / "predictions",
+            output_format="mmcif",
+            boltz2=True,
+        )
+        data_module = Boltz2InferenceDataModule(
+            manifest=manifest,
+            target_dir=processed / "structures",
+            msa_dir=processed / "msa",
+            mol_dir=self.mol_dir,
+            num_workers=0,
+            constraints_dir=optional_dir("constraints"),
+            template_dir=optional_dir("templates"),
+            extra_mols_dir=optional_dir("mols"),
+        )
+        trainer = Trainer(
+            default_root_dir=out_dir,
+            callbacks=[writer],
+            accelerator=self.accelerator,
+            devices=1,
+            precision="bf16-mixed",
+            logger=False,
+        )
+        trainer.predict(self.model, datamodule=data_module, return_predictions=False)
+
+
+BACKENDS = {
+    "warm": WarmBoltzBackend,
+    "subprocess": SubprocessBackend,
+}
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+class BoltzWorker:
+    """Single-device worker loop: heartbeat, claim, predict, report."""
+
+    def __init__(self, spool_dir, backend, device_id=None, poll_interval=1.0,
+                 worker_id: Optional[str] = None):
+        self.spool = init_spool(spool_dir)
+        self.backend = backend
+        self.device_id = device_id
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.running_dir = self.spool / "running" / self.worker_id
+        self.running_dir.mkdir(parents=True, exist_ok=True)
+        self.status = "starting"
+        self.current_job = None
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.usage = fair_share.UsageLedger(self.spool, self.worker_id)
+        self.started = time.time()
+        self._last_heartbeat = 0.0
+        self._heartbeat_lock = threading.Lock()
+        self._stop = False
+
+    def request_stop(self, *_):
+        """Signal handler: finish the current job, then exit."""
+        self._stop = True
+
+    @property
+    def draining(self):
+        return self._stop or (self.spool / "DRAIN").exists()
+
+    def heartbeat(self, force=False):
+        with self._heartbeat_lock:
+            now = time.time()
+            if not force and now - self._last_heartbeat < HEARTBEAT_INTERVAL:
+                return
+            self._last_heartbeat = now
+            _atomic_write_json(self.spool / "workers" / f"{self.worker_id}.json", {
+                "worker_id": self.worker_id,
+                "pid": os.getpid(),
+                "host": socket.gethostname(),
+                "device": self.device_id,
+                "backend": self.backend.name,
+                "status": self.status,
+                "current_job": self.current_job,
+                "jobs_done": self.jobs_done,
+                "jobs_failed": self.jobs_failed,
+                "started": self.started,
+                "heartbeat": now,
+            })
+
+    def claim_next(self) -> Optional[Path]:
+        """
+        Claim the next job by renaming it into our running/ directory: the
+        oldest pending job of the library first in fair-share order, which
+        is charged the job's predicted runtime.
+        """
+        def submitted(path):
+            try:
+                return path.stat().st_mtime
+            except FileNotFoundError:
+                return 0.0
+
+        for pending_dir in fair_share.claim_order(self.spool):
+            for job_file in sorted(pending_dir.glob("*.json"), key=submitted):
+                target = self.running_dir / job_file.name
+                try:
+                    os.rename(job_file, target)
+                except FileNotFoundError:
+                    continue  # another worker won the race
+                with open(target, 'r') as f:
+                    job = json.load(f)
+                self.usage.charge(job.get('library'), fair_share.job_cost(job))
+                return target
+        return None
+
+    def _heartbeat_while(self, done: threading.Event):
+        """Keep the heartbeat fresh until done is set (runs beside a prediction)."""
+        while not done.wait(HEARTBEAT_INTERVAL):
+            self.heartbeat()
+
+    def run_job(self, job_file: Path):
+        with open(job_file, 'r') as f:
+            job = json.load(f)
+
+        self.status = "busy"
+        self.current_job = job['job_id']
+        self.heartbeat(force=True)
+
+        # Predictions can outlast the stale-heartbeat threshold many times over
+        done = threading.Event()
+        beat = threading.Thread(target=self._heartbeat_while, args=(done,), daemon=True)
+        beat.start()
+        start_time = time.time()
+        error = None
+        try:
+            self.backend.predict(job)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            done.set()
+            beat.join()
+
+        pred_dir = prediction_dir_for(job['output_dir'], job['config_file'])
+        success = error is None and write_index(pred_dir) is not None
+        if error is None and not success:
+            error = "No confidence outputs written"
+
+        finished = time.time()
+        elapsed = finished - start_time
+        # Replace the provisional charge made on claim by the measured runtime
+        self.usage.charge(job.get('library'), elapsed - fair_share.job_cost(job))
+        fair_share.record_job(self.spool, self.worker_id, {
+            "job_id": job['job_id'],
+            "library": job.get('library'),
+            "submitted": job['submitted'],
+            "claimed": start_time,
+            "finished": finished,
+            "elapsed": elapsed,
+            "success": success,
+        })
+
+        _atomic_write_json(self.spool / "done" / f"{job['job_id']}.json", {
+            "job_id": job['job_id'],
+            "success": success,
+            "prediction_dir": str(pred_dir) if success else None,
+            "elapsed": elapsed,
+            "error": error,
+            "worker_id": self.worker_id,
+            "device": self.device_id,
+            "queue_wait": start_time - job['submitted'],
+        })
+        job_file.unlink(missing_ok=True)
+
+        if success:
+            self.jobs_done += 1
+        else:
+            self.jobs_failed += 1
+        self.current_job = None
+
+    def serve(self):
+        """Serve jobs until drained."""
+        # Re-queue jobs orphaned by crashed workers
+        self.status = "idle"
+        self.heartbeat(force=True)
+        requeued = requeue_stale_jobs(self.spool)
+        if requeued:
+            print(f"Re-queued {requeued} jobs from stale workers")
+
+        print(f"[{datetime.now().isoformat(timespec='seconds')}] Worker {self.worker_id} "
+              f"serving {self.spool} (device {self.device_id}, backend {self.backend.name})")
+
+        while not self.draining:
+            job_file = self.claim_next()
+            if job_file is None:
+                self.status = "idle"
+                self.heartbeat()
+                time.sleep(self.poll_interval)
+                continue
+            self.run_job(job_file)
+
+        self.status = "stopped"
+        self.heartbeat(force=True)
+        print(f"Worker {self.worker_id} drained: {self.jobs_done} done, {self.jobs_failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Persistent Boltz worker daemon with a spool-directory job queue"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run a worker on one device")
+    serve.add_argument("--spool", required=True, help="Spool directory")
+    serve.add_argument("--device", help="GPU to pin this worker to (CUDA_VISIBLE_DEVICES)")
+    serve.add_argument(
+        "--backend",
+        choices=list(BACKENDS.keys()),
+        default="warm",
+        help="warm = load Boltz once in-process; subprocess = boltz predict per job"
+    )
+    serve.add_argument("--accelerator", default="gpu", help="Lightning accelerator (default: gpu)")
+    serve.add_argument("--poll-interval", type=float, default=1.0, help="Queue poll interval (s)")
+    serve.add_argument("--timeout", type=float, default=600,
+                       help="Per-job timeout in seconds for jobs submitted without one (default: 600)")
+
+    health = subparsers.add_parser("health", help="Show worker health")
+    health.add_argument("--spool", required=True, help="Spool directory")
+
+    drain = subparsers.add_parser("drain", help="Gracefully drain all workers")
+    drain.add_argument("--spool", required=True, help="Spool directory")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        # Must happen before torch is imported by the backend
+        if args.device is not None:
+            os.environ["CUDA_VISIBLE_DEVICES"] = str(args.device)
+        (Path(args.spool) / "DRAIN").unlink(missing_ok=True)
+
+        backend = BACKENDS[args.backend](accelerator=args.accelerator, timeout=args.timeout)
+        worker = BoltzWorker(args.spool, backend, device_id=args.device,
+                             poll_interval=args.poll_interval)
+        signal.signal(signal.SIGTERM, worker.request_stop)
+        signal.signal(signal.SIGINT, worker.request_stop)
+        worker.serve()
+
+    elif args.command == "health":
+        workers = check_health(args.spool)
+        if not workers:
+            print("No workers registered")
+            return 1
+        pending = len(list((Path(args.spool) / "pending").rglob("*.json")))
+        print(f"Pending jobs: {pending}")
+        for hb in workers:
+            state = "OK" if hb['healthy'] else ("STOPPED" if hb['status'] == 'stopped' else "STALE")
+            print(f"  [{state}] {hb['worker_id']} device={hb['device']} status={hb['status']} "
+                  f"done={hb['jobs_done']} failed={hb['jobs_failed']} "
+                  f"heartbeat {hb['age']:.0f}s ago")
+        return 0 if any(hb['healthy'] for hb in workers) else 1
+
+    elif args.command == "drain":
+        request_drain(args.spool)
+        print(f"Drain requested: {args.spool}/DRAIN")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
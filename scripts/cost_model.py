@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Runtime cost model for Boltz predictions.
+
+Fits log(elapsed_time) against job features recorded in screening results:
+
+    log t = b0 + b1 log(tokens) + b2 log(msa_depth) + b3 log(diffusion_samples)
+               + b4 log(sampling_steps) + b5 log(recycling_steps + 1)
+
+Tokens are protein/nucleic-acid residues plus ligand heavy atoms (Boltz
+tokenizes ligands per atom). The fit is ridge-regularized towards a prior
+that reproduces the old fixed estimates (~3 min quick / ~8 min production
+for a nanobody + nucleotide), so settings never seen in the history (e.g.
+production after a quick-only screen) still extrapolate sensibly.
+
+Used by run_specificity_screen.py for the pre-launch estimate, the live ETA
+and per-job timeouts (prediction x high residual quantile).
+
+CPU runs (--accelerator cpu) are fitted separately: their records carry
+accelerator/cpu_threads in job_features and only train CPU models, whose
+prior is the GPU prior slowed down by cpu_prior_scale(threads).
+
+Usage:
+    python cost_model.py ../specificity_library/screening_results/screening_results.jsonl
+"""
+
+import argparse
+import json
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import yaml
+
+
+FEATURE_NAMES = ["tokens", "msa_depth", "diffusion_samples", "sampling_steps", "recycling_steps"]
+
+# Boltz subsamples deeper MSAs to this many sequences
+MAX_MSA_SEQS = 8192
+
+# Tokens for a CCD ligand whose atoms are not spelled out in the config
+DEFAULT_CCD_TOKENS = 30
+
+# Prior: exponents for the log features, and the anchor job the intercept
+# is calibrated on (118-aa nanobody + dNTP, ~1000-deep MSA, quick mode, 180 s)
+PRIOR_EXPONENTS = np.array([1.5, 0.1, 0.3, 0.45, 0.5])
+PRIOR_ANCHOR = ({"tokens": 148, "msa_depth": 1000, "diffusion_samples": 1,
+                 "sampling_steps": 50, "recycling_steps": 1}, 180.0)
+
+# CPU prior: runtime on CPU_REFERENCE_THREADS cores relative to one GPU,
+# and how it scales with the threads a job gets
+CPU_SLOWDOWN = 25.0
+CPU_REFERENCE_THREADS = 16
+CPU_THREAD_EXPONENT = 0.7
+
+DEFAULT_TIMEOUT = 600.0
+MIN_FIT_SAMPLES = 8
+
+# libyaml parser when available (config parsing dominates feature extraction)
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_SMILES_ATOM = re.compile(r"\[[^\]]+\]|Cl|Br|[BCNOSPFI]|[bcnops]")
+
+
+def smiles_heavy_atoms(smiles: str) -> int:
+    """Heavy-atom count of a SMILES string (bracket atoms count once, [H] excluded)."""
+    return sum(1 for atom in _SMILES_ATOM.findall(smiles) if atom not in ("[H]", "[2H]", "[3H]"))
+
+
+@lru_cache(maxsize=4096)
+def msa_depth(msa_path: str) -> int:
+    """Number of sequences in an A3M file (capped at MAX_MSA_SEQS)."""
+    try:
+        with open(msa_path, 'r') as f:
+            depth = sum(1 for line in f if line.startswith(">"))
+    except OSError:
+        return 1
+    return max(1, min(depth, MAX_MSA_SEQS))
+
+
+def job_features(config_file, sampling: Dict, accelerator: str = "gpu",
+                 threads: Optional[int] = None) -> Dict:
+    """
+    Cost-model features of a Boltz YAML config under given sampling settings.
+
+    CPU jobs also record accelerator and cpu_threads, which keep them out of
+    GPU training sets (see training_samples).
+    """
+    tokens, depth = config_size(str(config_file))
+    features = {
+        "tokens": tokens,
+        "msa_depth": depth,
+        "diffusion_samples": sampling['diffusion_samples'],
+        "sampling_steps": sampling['sampling_steps'],
+        "recycling_steps": sampling['recycling_steps'],
+    }
+    if accelerator != "gpu":
+        features['accelerator'] = accelerator
+        features['cpu_threads'] = threads
+    return features
+
+
+@lru_cache(maxsize=200000)
+def config_size(config_file: str):
+    """(tokens, MSA depth) of a Boltz YAML config (cached: estimate and run share it)."""
+    config_file = Path(config_file)
+    with open(config_file, 'r') as f:
+        config = yaml.load(f, Loader=_YAML_LOADER)
+
+    tokens = 0
+    depth = 1
+    for entry in config.get('sequences', []):
+        (kind, spec), = entry.items()
+        n_copies = len(spec['id']) if isinstance(spec.get('id'), list) else 1
+        if kind in ("protein", "dna", "rna"):
+            tokens += len(spec['sequence']) * n_copies
+            msa = spec.get('msa')
+            if msa and msa != 'empty':
+                msa_path = Path(msa)
+                if not msa_path.is_absolute():
+                    msa_path = config_file.parent / msa_path
+                depth = max(depth, msa_depth(str(msa_path)))
+        elif kind == "ligand":
+            if 'smiles' in spec:
+                tokens += smiles_heavy_atoms(spec['smiles']) * n_copies
+            else:
+                tokens += DEFAULT_CCD_TOKENS * n_copies
+
+    return tokens, depth
+
+
+def _design_row(features: Dict) -> np.ndarray:
+    return np.array([
+        1.0,
+        math.log(max(features['tokens'], 1)),
+        math.log(max(features['msa_depth'], 1)),
+        math.log(max(features['diffusion_samples'], 1)),
+        math.log(max(features['sampling_steps'], 1)),
+        math.log(features['recycling_steps'] + 1),
+    ])
+
+
+def cpu_prior_scale(threads: int) -> float:
+    """Prior runtime of a CPU job with this many threads relative to one GPU."""
+    return CPU_SLOWDOWN * (CPU_REFERENCE_THREADS / max(threads, 1)) ** CPU_THREAD_EXPONENT
+
+
+def _prior_coefficients(prior_scale: float = 1.0) -> np.ndarray:
+    anchor_features, anchor_seconds = PRIOR_ANCHOR
+    beta = np.concatenate([[0.0], PRIOR_EXPONENTS])
+    beta[0] = np.log(anchor_seconds * prior_scale) - _design_row(anchor_features) @ beta
+    return beta
+
+
+class CostModel:
+    """
+    Log-linear runtime model with a ridge prior and residual quantiles.
+
+    prior_scale multiplies the prior runtimes and the unfitted default
+    timeout (e.g. cpu_prior_scale(threads) for CPU runs).
+    """
+
+    def __init__(self, ridge: float = 1.0, timeout_quantile: float = 0.99,
+                 timeout_factor: float = 1.5, min_timeout: float = 120.0,
+                 max_timeout: float = 4 * 3600.0, refit_every: int = 10,
+                 prior_scale: float = 1.0):
+        self.ridge = ridge
+        self.prior_scale = prior_scale
+        self.timeout_quantile = timeout_quantile
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.refit_every = refit_every
+        self.coefficients = _prior_coefficients(prior_scale)
+        self.residual_quantile = None
+        self.n_samples = 0
+        self.samples = []
+        self._unfitted = 0
+
+    @property
+    def fitted(self) -> bool:
+        return self.n_samples >= MIN_FIT_SAMPLES
+
+    def fit(self, samples: List[Dict]) -> "CostModel":
+        """
+        Fit from samples of {'features': {...}, 'elapsed': seconds}.
+
+        Solves (X'X + ridge I) b = X'y + ridge b_prior, so directions the
+        history does not span stay at the prior.
+        """
+        samples = [s for s in samples if s.get('elapsed') and s['elapsed'] > 0]
+        self.samples = samples
+        self.n_samples = len(samples)
+        self._unfitted = 0
+        if not samples:
+            self.coefficients = _prior_coefficients(self.prior_scale)
+            self.residual_quantile = None
+            return self
+
+        X = np.array([_design_row(s['features']) for s in samples])
+        y = np.log([s['elapsed'] for s in samples])
+        prior = _prior_coefficients(self.prior_scale)
+        penalty = self.ridge * np.eye(X.shape[1])
+        penalty[0, 0] = 1e-6  # intercept is free
+        self.coefficients = np.linalg.solve(X.T @ X + penalty, X.T @ y + penalty @ prior)
+
+        residuals = y - X @ self.coefficients
+        self.residual_quantile = float(np.quantile(residuals, self.timeout_quantile))
+        return self
+
+    def observe(self, features: Dict, elapsed: float) -> bool:
+        """
+        Record a finished job; refits every refit_every observations, or
+        once the unfitted observations reach 10% of the samples (so large
+        screens do not refit thousands of times).
+
+        Returns:
+            True if the model was refitted
+        """
+        self.samples.append({"features": features, "elapsed": elapsed})
+        self._unfitted += 1
+        if self._unfitted < max(self.refit_every, self.n_samples // 10):
+            return False
+        self.fit(self.samples)
+        return True
+
+    @property
+    def default_timeout(self) -> float:
+        return min(DEFAULT_TIMEOUT * self.prior_scale, self.max_timeout)
+
+    def predict(self, features: Dict) -> float:
+        """Predicted runtime in seconds."""
+        return float(np.exp(_design_row(features) @ self.coefficients))
+
+    def predict_many(self, features_list: List[Dict]) -> np.ndarray:
+        """Predicted runtimes of many jobs (vectorized)."""
+        if not features_list:
+            return np.zeros(0)
+        X = np.array([_design_row(f) for f in features_list])
+        return np.exp(X @ self.coefficients)
+
+    def timeout_many(self, features_list: List[Dict]) -> np.ndarray:
+        """Per-job timeouts of many jobs (see timeout)."""
+        if not self.fitted:
+            return np.full(len(features_list), self.default_timeout)
+        seconds = (self.predict_many(features_list) * np.exp(max(self.residual_quantile, 0.0))
+                   * self.timeout_factor)
+        return np.clip(seconds, self.min_timeout, self.max_timeout)
+
+    def timeout(self, features: Dict) -> float:
+        """
+        Per-job timeout: prediction scaled by the high residual quantile.
+
+        Falls back to DEFAULT_TIMEOUT (x prior_scale) until MIN_FIT_SAMPLES
+        jobs are recorded.
+        """
+        if not self.fitted:
+            return self.default_timeout
+        seconds = self.predict(features) * np.exp(max(self.residual_quantile, 0.0)) * self.timeout_factor
+        return float(np.clip(seconds, self.min_timeout, self.max_timeout))
+
+    def summary(self) -> str:
+        terms = ", ".join(f"{name}^{b:.2f}" for name, b in zip(FEATURE_NAMES, self.coefficients[1:]))
+        source = f"fitted on {self.n_samples} jobs" if self.n_samples else "prior only"
+        quantile = (f", p{self.timeout_quantile * 100:.0f} residual x{np.exp(self.residual_quantile):.2f}"
+                    if self.residual_quantile is not None else "")
+        return f"t = {np.exp(self.coefficients[0]):.3g} s * {terms} ({source}{quantile})"
+
+
+def training_samples(records: Iterable[Dict], accelerator: str = "gpu") -> List[Dict]:
+    """
+    Cost-model samples from screening result records run on accelerator.
+
+    Cache hits (no GPU time spent in this run) and pruned records are skipped.
+    """
+    samples = []
+    for record in records:
+        if record.get('cache_hit') or record.get('status') == 'pruned':
+            continue
+        features = record.get('job_features')
+        if features and features.get('accelerator', "gpu") != accelerator:
+            continue
+        if features and record.get('elapsed_time'):
+            samples.append({"features": record['job_features'], "elapsed": record['elapsed_time']})
+    return samples
+
+
+def load_training_samples(results_files, accelerator: str = "gpu") -> List[Dict]:
+    """Samples from screening_results.json / .jsonl files that exist."""
+    from results_log import load_results_log
+
+    samples = []
+    for results_file in results_files:
+        results_file = Path(results_file)
+        if not results_file.exists():
+            continue
+        if results_file.suffix == ".jsonl":
+            records = load_results_log(results_file, all_runs=True)['results']
+        else:
+            with open(results_file, 'r') as f:
+                records = json.load(f).get('results', [])
+        samples.extend(training_samples(records, accelerator))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit the Boltz runtime cost model from screening results"
+    )
+    parser.add_argument("results_files", nargs="+", help="screening_results.json/.jsonl files")
+    parser.add_argument("--accelerator", choices=["gpu", "cpu"], default="gpu",
+                        help="Fit on GPU or CPU runs (default: gpu)")
+    parser.add_argument("--cpu-threads", type=int, default=CPU_REFERENCE_THREADS,
+                        help="Threads per CPU job for the CPU prior")
+
+    args = parser.parse_args()
+
+    samples = load_training_samples(args.results_files, args.accelerator)
+    prior_scale = cpu_prior_scale(args.cpu_threads) if args.accelerator == "cpu" else 1.0
+    model = CostModel(prior_scale=prior_scale).fit(samples)
+    print(model.summary())
+    if samples:
+        errors = [model.predict(s['features']) / s['elapsed'] for s in samples]
+        print(f"Prediction/observed ratio: median {np.median(errors):.2f}, "
+              f"p10 {np.quantile(errors, 0.1):.2f}, p90 {np.quantile(errors, 0.9):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Disk-space guard for long screens.
+
+A screen writes a few MB per job (CIFs, PAE arrays, processed inputs), and
+once the results volume fills up every job launched afterwards fails. The
+runner asks DiskWatchdog.wait_for_space() before launching each job:
+
+    - a job is admitted while free space stays above min_free_gb plus the
+      mean output size of the jobs ingested so far
+    - below that, admission pauses; outputs already ingested are trimmed
+      with the cleanup policy (artifact_retention.COMPACT_POLICY unless
+      given; None when a RetentionWorker already trims every ingested job)
+      and admission resumes once free space is back above
+      resume_free_gb (default 1.25 x min_free_gb)
+
+Pauses, cleanups and resumes are reported through the log callback
+(run_specificity_screen.py writes them to the results log as
+{"type": "event", "event": "disk_paused" | "disk_cleanup" | "disk_resumed", ...}).
+
+Usage:
+    python run_specificity_screen.py --min-free-gb 50
+    python disk_watchdog.py ../specificity_library/screening_results --min-free-gb 50
+"""
+
+import argparse
+import asyncio
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from artifact_retention import COMPACT_POLICY, RetentionPolicy, apply_retention, tree_size
+
+
+GB = 1e9
+
+
+class DiskWatchdog:
+    """Pauses job admission when the results volume runs low, trimming ingested outputs."""
+
+    def __init__(self, path, min_free_gb: float, resume_free_gb: Optional[float] = None,
+                 cleanup_policy: Optional[RetentionPolicy] = COMPACT_POLICY, poll_interval: float = 10.0,
+                 log: Optional[Callable] = None, free_space: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            log: log(event, **fields) for pause/cleanup/resume events
+            free_space: Free bytes of the results volume (default: statvfs of
+                path; override for quota-managed filesystems)
+        """
+        self.path = Path(path)
+        self.min_free = min_free_gb * GB
+        self.resume_free = (resume_free_gb if resume_free_gb is not None else 1.25 * min_free_gb) * GB
+        self.cleanup_policy = cleanup_policy
+        self.poll_interval = poll_interval
+        self.log = log
+        self.free_space = free_space or (lambda: shutil.disk_usage(self.path).free)
+        self.jobs_measured = 0
+        self.job_bytes_total = 0
+        self.job_bytes_max = 0
+        self.pauses = 0
+        self.paused_seconds = 0.0
+        self.bytes_cleaned = 0
+        self._to_clean = []
+        self._paused_since = None
+        self._lock = threading.Lock()
+
+    @property
+    def mean_job_bytes(self) -> float:
+        return self.job_bytes_total / self.jobs_measured if self.jobs_measured else 0.0
+
+    def ingested(self, prediction_dir, config_file=None):
+        """Record an ingested job's output size; its outputs may be trimmed when space runs low."""
+        size = tree_size(prediction_dir)
+        with self._lock:
+            self.jobs_measured += 1
+            self.job_bytes_total += size
+            self.job_bytes_max = max(self.job_bytes_max, size)
+            if self.cleanup_policy is not None:
+                self._to_clean.append((prediction_dir, config_file))
+
+    def _emit(self, event, **fields):
+        print(f"  DISK: {event} " + ", ".join(f"{k}={v}" for k, v in fields.items()))
+        if self.log is not None:
+            self.log(event, **fields)
+
+    def _cleanup(self):
+        """Trim the outputs ingested since the last cleanup (caller holds the lock)."""
+        to_clean, self._to_clean = self._to_clean, []
+        freed = 0
+        for prediction_dir, config_file in to_clean:
+            try:
+                stats = apply_retention(prediction_dir, self.cleanup_policy, config_file)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"  WARNING: disk cleanup failed for {prediction_dir}: {e}")
+                continue
+            freed += stats['bytes_before'] - stats['bytes_after']
+        self.bytes_cleaned += freed
+        self._emit("disk_cleanup", jobs=len(to_clean), freed_mb=round(freed / 1e6, 1),
+                   free_gb=round(self.free_space() / GB, 3))
+
+    def _admit(self) -> bool:
+        """One admission check: True to launch a job now."""
+        with self._lock:
+            threshold = self.resume_free if self._paused_since is not None else self.min_free
+            free = self.free_space()
+            if free >= threshold + self.mean_job_bytes:
+                if self._paused_since is not None:
+                    paused = time.time() - self._paused_since
+                    self.paused_seconds += paused
+                    self._paused_since = None
+                    self._emit("disk_resumed", free_gb=round(free / GB, 3),
+                               paused_seconds=round(paused, 1))
+                return True
+            if self._paused_since is None:
+                self._paused_since = time.time()
+                self.pauses += 1
+                self._emit("disk_paused", free_gb=round(free / GB, 3),
+                           threshold_gb=round(threshold / GB, 3),
+                           mean_job_mb=round(self.mean_job_bytes / 1e6, 2))
+            if self._to_clean:
+                self._cleanup()
+            return False
+
+    def wait_for_space(self):
+        """Block until a job may be launched."""
+        while not self._admit():
+            time.sleep(self.poll_interval)
+
+    async def wait_for_space_async(self):
+        """wait_for_space for the asyncio orchestrator."""
+        while not self._admit():
+            await asyncio.sleep(self.poll_interval)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "free_gb": round(self.free_space() / GB, 3),
+                "jobs_measured": self.jobs_measured,
+                "mean_job_mb": round(self.mean_job_bytes / 1e6, 2),
+                "max_job_mb": round(self.job_bytes_max / 1e6, 2),
+                "pauses": self.pauses,
+                "paused_seconds": round(self.paused_seconds, 1),
+                "cleaned_mb": round(self.bytes_cleaned / 1e6, 1),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check whether a results volume would admit screen jobs"
+    )
+    parser.add_argument("results_dir", help="Screening results directory")
+    parser.add_argument("--min-free-gb", type=float, required=True,
+                        help="Free space below which the screen pauses job admission")
+
+    args = parser.parse_args()
+
+    free = shutil.disk_usage(args.results_dir).free
+    print(f"Free: {free / GB:.1f} GB (threshold {args.min_free_gb:.1f} GB): "
+          f"{'jobs admitted' if free >= args.min_free_gb * GB else 'admission would pause'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Classification of failed Boltz predictions and per-class retry policies.
+
+Failure classes (from exit status and stderr):
+    cuda_oom      CUDA out of memory       retry with less memory (serial samples, then fewer samples)
+    host_oom      SIGKILL (-9 / exit 137)  retry once with serial samples
+    timeout       killed by our timeout    retry once with twice the timeout
+    bad_input     invalid YAML/SMILES/...  never retried
+    missing_msa   MSA file missing         never retried (regenerate MSAs)
+    transient_io  NFS/disk/network hiccup  retry with exponential backoff
+    device_error  flaky GPU / driver       retry with backoff (on whichever device is free)
+    unknown       anything else            retry once
+
+Usage:
+    python failure_policy.py boltz_stderr.log
+"""
+
+import argparse
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+FAILURE_CLASSES = ["cuda_oom", "host_oom", "timeout", "bad_input", "missing_msa", "transient_io",
+                   "device_error", "unknown"]
+
+# Exit statuses that identify the failure regardless of stderr (often empty
+# after a kill): SIGKILL from the kernel OOM killer (-9 from subprocess,
+# 128 + 9 through a shell) and coreutils timeout(1)
+RETURNCODE_CLASSES = {
+    -9: "host_oom",
+    137: "host_oom",
+    124: "timeout",
+}
+
+# Checked in order; the first class with a matching pattern wins. transient_io
+# precedes missing_msa so NFS errors while reading an .a3m are retried.
+FAILURE_PATTERNS = [
+    ("cuda_oom", [r"cuda out of memory", r"outofmemoryerror", r"cuda error: out of memory",
+                  r"cublas_status_alloc_failed", r"cudnn_status_alloc_failed"]),
+    ("timeout", [r"timeoutexpired", r"timed out after"]),
+    ("transient_io", [r"input/output error", r"stale file handle", r"connection (reset|refused|aborted)",
+                      r"resource temporarily unavailable", r"broken pipe", r"errno 5\b", r"errno 116\b"]),
+    ("missing_msa", [r"missing msa", r"(filenotfounderror|no such file).*\.a3m",
+                     r"msa .*(not found|no such file)"]),
+    ("device_error", [r"cuda error", r"nccl", r"cuda driver", r"no cuda gpus are available",
+                      r"busy or unavailable", r"illegal memory access", r"ecc error",
+                      r"invalid device ordinal"]),
+    ("bad_input", [r"yaml\.[\w.]*error", r"(scanner|parser|composer|constructor)error:",
+                   r"invalid (smiles|sequence|residue|ligand|chain|input|schema|ccd)",
+                   r"smiles parse error", r"could not parse", r"parse error", r"unknown ccd",
+                   r"keyerror: '(sequences|protein|ligand|smiles|ccd|id|msa|version)'",
+                   r"valueerror: .*(smiles|sequence|residue|chain|ligand|ccd|schema|yaml)",
+                   r"rdkit.*(error|fail)", r"sanitization (error|fail)"]),
+]
+
+
+@dataclass
+class RetryPolicy:
+    """How to retry one failure class."""
+    max_retries: int = 0
+    backoff: float = 0.0          # seconds before the first retry, doubled per retry
+    reduce_memory: bool = False   # serialize diffusion samples, then halve them
+    timeout_factor: float = 1.0   # timeout multiplier per retry
+
+
+RETRY_POLICIES = {
+    "cuda_oom": RetryPolicy(max_retries=2, reduce_memory=True),
+    "host_oom": RetryPolicy(max_retries=1, reduce_memory=True),
+    "timeout": RetryPolicy(max_retries=1, timeout_factor=2.0),
+    "bad_input": RetryPolicy(),
+    "missing_msa": RetryPolicy(),
+    "transient_io": RetryPolicy(max_retries=3, backoff=10.0),
+    "device_error": RetryPolicy(max_retries=2, backoff=30.0),
+    "unknown": RetryPolicy(max_retries=1, backoff=5.0),
+}
+
+
+def classify_failure(returncode: Optional[int] = None, stderr: str = "", timed_out: bool = False) -> str:
+    """Failure class of a prediction from its exit code, stderr and timeout status."""
+    if timed_out:
+        return "timeout"
+    if returncode in RETURNCODE_CLASSES:
+        return RETURNCODE_CLASSES[returncode]
+    text = (stderr or "").lower()
+    for failure_class, patterns in FAILURE_PATTERNS:
+        if any(re.search(pattern, text) for pattern in patterns):
+            return failure_class
+    return "unknown"
+
+
+def error_summary(stderr: str, limit: int = 300) -> str:
+    """Last non-empty stderr line (where Python puts the exception), truncated."""
+    lines = [line.strip() for line in (stderr or "").splitlines() if line.strip()]
+    return lines[-1][:limit] if lines else ""
+
+
+def reduced_memory_sampling(sampling: Dict, retry: int) -> Dict:
+    """
+    Sampling parameters for the retry-th OOM retry: first run the diffusion
+    samples one at a time (same output), then also halve their number.
+    """
+    reduced = dict(sampling)
+    reduced['max_parallel_samples'] = 1
+    if retry >= 2:
+        reduced['diffusion_samples'] = max(1, sampling['diffusion_samples'] // 2)
+    return reduced
+
+
+def plan_retry(failure_class: str, attempt: int, sampling: Dict, timeout: float,
+               policies: Optional[Dict[str, RetryPolicy]] = None) -> Optional[Dict]:
+    """
+    Next attempt for a failed prediction.
+
+    Args:
+        attempt: Attempts made so far (1 after the first failure)
+
+    Returns:
+        {'delay', 'sampling', 'timeout'} for the next attempt, or None to give up
+    """
+    policy = (policies or RETRY_POLICIES).get(failure_class, RETRY_POLICIES["unknown"])
+    if attempt > policy.max_retries:
+        return None
+
+    return {
+        "delay": policy.backoff * 2 ** (attempt - 1),
+        "sampling": reduced_memory_sampling(sampling, attempt) if policy.reduce_memory else dict(sampling),
+        "timeout": timeout * policy.timeout_factor,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Classify a failed Boltz prediction from its stderr"
+    )
+    parser.add_argument("stderr_file", help="File with the captured stderr")
+    parser.add_argument("--returncode", type=int, help="Exit code of boltz predict")
+
+    args = parser.parse_args()
+
+    with open(args.stderr_file, 'r', errors='replace') as f:
+        stderr = f.read()
+
+    failure_class = classify_failure(args.returncode, stderr)
+    policy = RETRY_POLICIES[failure_class]
+    print(f"Failure class: {failure_class}")
+    print(f"Error: {error_summary(stderr)}")
+    print(f"Policy: {policy.max_retries} retries, backoff {policy.backoff:.0f}s"
+          f"{', reduce memory' if policy.reduce_memory else ''}"
+          f"{f', timeout x{policy.timeout_factor:g}' if policy.timeout_factor != 1 else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Weighted fair sharing of a boltz_worker spool between libraries.
+
+Several screens (the CDR library, chimera predictions, de novo selectivity
+checks) can submit to the same persistent workers. Without a policy the
+workers serve the spool oldest-first, so whichever screen submits first
+holds the whole GPU pool until its queue is empty. With fair sharing each
+screen submits under a library name, and a worker claims its next job from
+
+    1. the highest-priority library with pending jobs (strict priority), and
+    2. among those, the library with the lowest virtual time
+       offset + device_seconds / weight (weighted fair queuing),
+
+oldest job first within the library. A library is charged the job's
+predicted runtime when a worker claims it (DEFAULT_JOB_SECONDS without a
+prediction) and the difference to the measured runtime when it finishes,
+so concurrently running libraries converge to device-time shares
+proportional to their weights. A library that starts submitting (or
+returns from idle) starts at the lowest virtual time of the libraries
+already queued, so it shares the pool from now on instead of monopolizing
+it until it has caught up with their past service.
+
+Spool additions (see boltz_worker.py):
+
+    pending/<library>/<job_id>.json    jobs of a library (pending/ itself = "default")
+    libraries/<library>.json           weight, priority, virtual-time offset
+    usage/<worker_id>.json             device seconds charged per library
+    stats/<worker_id>.jsonl            one line per finished job (queue wait, runtime)
+
+Usage:
+    python run_specificity_screen.py --worker-spool SPOOL --library-name cdr --share-weight 3
+    python run_specificity_screen.py --worker-spool SPOOL --library-name denovo --priority 1
+    python fair_share.py SPOOL
+    python fair_share.py SPOOL --set-weight chimera=2
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+DEFAULT_LIBRARY = "default"
+DEFAULT_WEIGHT = 1.0
+DEFAULT_PRIORITY = 0
+# Provisional charge of a claimed job without a runtime prediction
+DEFAULT_JOB_SECONDS = 300.0
+
+
+def _write_json(path, data):
+    """Write JSON via a temporary file and rename so readers never see partial files."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path) -> Optional[Dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def library_name(name: Optional[str]) -> str:
+    """Spool-safe library name (None = the default library)."""
+    if not name:
+        return DEFAULT_LIBRARY
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(name)).strip(".") or DEFAULT_LIBRARY
+
+
+def pending_dir(spool_dir, library: Optional[str] = None) -> Path:
+    """Directory holding a library's pending jobs."""
+    library = library_name(library)
+    pending = Path(spool_dir) / "pending"
+    return pending if library == DEFAULT_LIBRARY else pending / library
+
+
+def _has_jobs(directory: Path) -> bool:
+    try:
+        with os.scandir(directory) as entries:
+            return any(e.name.endswith(".json") and e.is_file() for e in entries)
+    except FileNotFoundError:
+        return False
+
+
+def pending_libraries(spool_dir) -> Dict[str, Path]:
+    """{library: pending directory} of the libraries with pending jobs."""
+    pending = Path(spool_dir) / "pending"
+    libraries = {}
+    if _has_jobs(pending):
+        libraries[DEFAULT_LIBRARY] = pending
+    if pending.exists():
+        for sub in pending.iterdir():
+            if sub.is_dir() and _has_jobs(sub):
+                libraries[sub.name] = sub
+    return libraries
+
+
+def load_libraries(spool_dir) -> Dict[str, Dict]:
+    """Registered libraries: {name: {'weight', 'priority', 'offset', ...}}."""
+    libraries = {}
+    lib_dir = Path(spool_dir) / "libraries"
+    for path in sorted(lib_dir.glob("*.json")) if lib_dir.exists() else []:
+        entry = _read_json(path)
+        if entry is not None:
+            libraries[path.stem] = entry
+    return libraries
+
+
+def _settings(libraries: Dict, name: str) -> Dict:
+    return libraries.get(name) or {"weight": DEFAULT_WEIGHT, "priority": DEFAULT_PRIORITY, "offset": 0.0}
+
+
+def load_usage(spool_dir) -> Dict[str, float]:
+    """Device seconds charged per library, summed over all workers."""
+    usage = {}
+    usage_dir = Path(spool_dir) / "usage"
+    for path in usage_dir.glob("*.json") if usage_dir.exists() else []:
+        for library, seconds in (_read_json(path) or {}).items():
+            usage[library] = usage.get(library, 0.0) + seconds
+    return usage
+
+
+def virtual_time(settings: Dict, used_seconds: float) -> float:
+    return settings.get('offset', 0.0) + used_seconds / settings['weight']
+
+
+def virtual_times(spool_dir, names) -> Dict[str, float]:
+    libraries = load_libraries(spool_dir)
+    usage = load_usage(spool_dir)
+    return {name: virtual_time(_settings(libraries, name), usage.get(name, 0.0)) for name in names}
+
+
+def register_library(spool_dir, name: Optional[str], weight: Optional[float] = None,
+                     priority: Optional[int] = None) -> Dict:
+    """
+    Register (or update) a library and bring its virtual time up to the
+    lowest virtual time of the other queued libraries, so that it competes
+    from now on rather than for service it did not ask for while away.
+
+    Args:
+        weight: Share weight (default: keep the registered one, else 1)
+        priority: Strict priority, higher first (default: keep, else 0)
+
+    Returns:
+        The library's registry entry
+    """
+    name = library_name(name)
+    path = Path(spool_dir) / "libraries" / f"{name}.json"
+    entry = _read_json(path) or {"name": name, "weight": DEFAULT_WEIGHT,
+                                 "priority": DEFAULT_PRIORITY, "offset": 0.0,
+                                 "registered": time.time()}
+    if weight is not None:
+        if weight <= 0:
+            raise ValueError(f"library weight must be positive, got {weight}")
+        entry['weight'] = float(weight)
+    if priority is not None:
+        entry['priority'] = int(priority)
+
+    used = load_usage(spool_dir).get(name, 0.0)
+    others = [lib for lib in pending_libraries(spool_dir) if lib != name]
+    own = virtual_time(entry, used)
+    if others:
+        floor = min(virtual_times(spool_dir, others).values())
+        if own < floor:
+            entry['offset'] = floor - used / entry['weight']
+    entry['activated'] = time.time()
+    _write_json(path, entry)
+    return entry
+
+
+def activate_library(spool_dir, name: Optional[str]):
+    """Called on submission: (re-)register a library whose queue was empty."""
+    if not _has_jobs(pending_dir(spool_dir, name)):
+        register_library(spool_dir, name)
+
+
+def claim_order(spool_dir) -> List[Path]:
+    """
+    Pending directories in the order a worker should try them: highest
+    priority first, then lowest virtual time (ties by name).
+    """
+    queued = pending_libraries(spool_dir)
+    if not queued:
+        return []
+    libraries = load_libraries(spool_dir)
+    usage = load_usage(spool_dir)
+
+    def rank(name):
+        settings = _settings(libraries, name)
+        return (-settings['priority'], virtual_time(settings, usage.get(name, 0.0)), name)
+
+    return [queued[name] for name in sorted(queued, key=rank)]
+
+
+class UsageLedger:
+    """One worker's device seconds per library (usage/<worker_id>.json, single writer)."""
+
+    def __init__(self, spool_dir, worker_id: str):
+        self.path = Path(spool_dir) / "usage" / f"{worker_id}.json"
+        self.seconds = _read_json(self.path) or {}
+
+    def charge(self, library: Optional[str], seconds: float):
+        library = library_name(library)
+        self.seconds[library] = self.seconds.get(library, 0.0) + seconds
+        _write_json(self.path, self.seconds)
+
+
+def job_cost(job: Dict) -> float:
+    """Provisional charge of a claimed job: its predicted runtime."""
+    return job.get('cost') or DEFAULT_JOB_SECONDS
+
+
+def record_job(spool_dir, worker_id: str, entry: Dict):
+    """Append one finished job to the worker's stats log."""
+    path = Path(spool_dir) / "stats" / f"{worker_id}.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_job_stats(spool_dir, since: Optional[float] = None) -> List[Dict]:
+    """Finished-job entries of all workers (submitted at or after `since`)."""
+    entries = []
+    stats_dir = Path(spool_dir) / "stats"
+    for path in stats_dir.glob("*.jsonl") if stats_dir.exists() else []:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line of a crashed worker
+                if since is None or entry['submitted'] >= since:
+                    entries.append(entry)
+    return entries
+
+
+def library_stats(spool_dir, since: Optional[float] = None) -> Dict[str, Dict]:
+    """
+    Per-library throughput and queue waits of the finished jobs.
+
+    Returns:
+        {library: {'jobs', 'failed', 'device_hours', 'device_share',
+                   'weight_share', 'priority', 'jobs_per_hour',
+                   'mean_wait_s', 'p95_wait_s', 'max_wait_s'}}
+        device_share is the library's fraction of the device time of the
+        listed libraries, weight_share its fraction of their weights; the
+        two match for libraries that were queued concurrently at the same
+        priority. jobs_per_hour is over the library's first submission
+        to its last finished job.
+    """
+    by_library = {}
+    for entry in load_job_stats(spool_dir, since):
+        by_library.setdefault(library_name(entry.get('library')), []).append(entry)
+    libraries = load_libraries(spool_dir)
+    total_seconds = sum(e['elapsed'] for entries in by_library.values() for e in entries)
+    total_weight = sum(_settings(libraries, name)['weight'] for name in by_library)
+
+    stats = {}
+    for name, entries in sorted(by_library.items()):
+        settings = _settings(libraries, name)
+        waits = sorted(e['claimed'] - e['submitted'] for e in entries)
+        seconds = sum(e['elapsed'] for e in entries)
+        span = max(e['finished'] for e in entries) - min(e['submitted'] for e in entries)
+        stats[name] = {
+            "jobs": len(entries),
+            "failed": sum(1 for e in entries if not e['success']),
+            "device_hours": round(seconds / 3600, 4),
+            "device_share": round(seconds / total_seconds, 3) if total_seconds else 0.0,
+            "weight_share": round(settings['weight'] / total_weight, 3),
+            "priority": settings['priority'],
+            "jobs_per_hour": round(len(entries) / (span / 3600), 1) if span > 0 else None,
+            "mean_wait_s": round(statistics.mean(waits), 1),
+            "p95_wait_s": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 1),
+            "max_wait_s": round(waits[-1], 1),
+        }
+    return stats
+
+
+def format_stats(stats: Dict[str, Dict]) -> List[str]:
+    """Table lines for library_stats()."""
+    lines = [f"  {'library':<20} {'prio':>4} {'weight':>7} {'device':>7} {'jobs':>6} "
+             f"{'failed':>6} {'jobs/h':>7} {'wait mean':>9} {'p95':>7}"]
+    for name, s in stats.items():
+        rate = f"{s['jobs_per_hour']:.1f}" if s['jobs_per_hour'] is not None else "-"
+        lines.append(f"  {name:<20} {s['priority']:>4} {s['weight_share']:>7.1%} "
+                     f"{s['device_share']:>7.1%} {s['jobs']:>6} {s['failed']:>6} {rate:>7} "
+                     f"{s['mean_wait_s']:>8.0f}s {s['p95_wait_s']:>6.0f}s")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show or change the fair-share state of a boltz_worker spool"
+    )
+    parser.add_argument("spool", help="Worker spool directory")
+    parser.add_argument("--since-hours", type=float,
+                        help="Only report jobs submitted in the last N hours")
+    parser.add_argument("--set-weight", metavar="LIBRARY=WEIGHT", action="append", default=[],
+                        help="Change a library's share weight (repeatable)")
+    parser.add_argument("--set-priority", metavar="LIBRARY=PRIORITY", action="append", default=[],
+                        help="Change a library's priority (repeatable)")
+
+    args = parser.parse_args()
+
+    for spec in args.set_weight:
+        name, _, value = spec.partition("=")
+        register_library(args.spool, name, weight=float(value))
+    for spec in args.set_priority:
+        name, _, value = spec.partition("=")
+        register_library(args.spool, name, priority=int(value))
+
+    queued = pending_libraries(args.spool)
+    vtimes = virtual_times(args.spool, queued)
+    libraries = load_libraries(args.spool)
+    print("Libraries:")
+    for name in sorted(set(libraries) | set(queued)):
+        settings = _settings(libraries, name)
+        waiting = len(list(queued[name].glob("*.json"))) if name in queued else 0
+        vt = f", virtual time {vtimes[name]:.0f}" if name in vtimes else ""
+        print(f"  {name:<20} weight {settings['weight']:g}, priority {settings['priority']}, "
+              f"{waiting} pending{vt}")
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    stats = library_stats(args.spool, since)
+    if stats:
+        print("\nFinished jobs:")
+        print("\n".join(format_stats(stats)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,9 @@ Strategy:
 """
 
 import argparse
+import os
 import random
+import sys
 from pathlib import Path
 from typing import List, Dict
 import yaml
@@ -284,6 +286,25 @@ def main():
         type=int,
         help="Random seed for reproducibility"
     )
+    parser.add_argument(
+        "--scaffold-msa",
+        help="Scaffold MSA (A3M) for PSSM plausibility filtering of mutations"
+    )
+    parser.add_argument(
+        "--min-framework-score",
+        type=float,
+        default=-2.0,
+        help="Drop variants with a framework mutation below this PSSM score in bits (default: -2.0)"
+    )
+    parser.add_argument(
+        "--min-cdr-score",
+        type=float,
+        help="Also drop variants with a CDR mutation below this PSSM score in bits"
+    )
+    parser.add_argument(
+        "--profile-cache-dir",
+        help="Cache directory for scaffold PSSM profiles"
+    )
 
     args = parser.parse_args()
 
@@ -307,6 +328,18 @@ def main():
         "dTTP": "Cc1cn([C@H]2C[C@H](O)[C@@H](COP(O)(=O)OP(O)(=O)OP(O)(O)=O)O2)c(=O)[nH]c1=O"
     }
 
+    # Optional evolutionary plausibility filter
+    profile = None
+    if args.scaffold_msa:
+        sys.path.insert(0, os.path.dirname(__file__))
+        from msa_profile import load_profile
+
+        profile = load_profile(args.scaffold_msa, scaffold="BASE_NANOBODY",
+                               cache_dir=args.profile_cache_dir)
+        if profile.query != BASE_NANOBODY:
+            raise ValueError(f"Scaffold MSA query does not match BASE_NANOBODY: {args.scaffold_msa}")
+        print(f"Loaded scaffold profile: {profile.num_sequences} sequences (Neff = {profile.neff:.1f})\n")
+
     # Generate variants for each nucleotide
     all_variants = []
     for nuc in ["dATP", "dGTP", "dCTP", "dTTP"]:
@@ -314,9 +347,20 @@ def main():
         print(f"  Strategy: {DESIGN_STRATEGIES[nuc]['rationale']}")
 
         variants = generate_variants(BASE_NANOBODY, nuc, args.variants_per_target)
-        all_variants.extend(variants)
         print(f"  ✓ Generated {len(variants)} variants")
 
+        if profile is not None:
+            from msa_profile import filter_variants
+
+            variants, dropped = filter_variants(
+                variants, profile, CDR_REGIONS,
+                framework_threshold=args.min_framework_score,
+                cdr_threshold=args.min_cdr_score
+            )
+            print(f"  ✓ PSSM filter kept {len(variants)}, dropped {len(dropped)} implausible variants")
+
+        all_variants.extend(variants)
+
     print(f"\n{'='*80}")
     print(f"Total variants: {len(all_variants)}")
     print(f"{'='*80}\n")
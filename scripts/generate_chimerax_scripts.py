@@ -6,6 +6,11 @@ ChimeraX is free and has excellent rendering capabilities.
 
 from pathlib import Path
 import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from prediction_index import artifact_path
 
 def create_chimerax_script(variant_id, target_nucleotide, cif_file, output_dir):
     """
@@ -159,13 +164,13 @@ def create_master_chimerax_script(output_dir):
     cif_files = []
     for variant_id, target in variants:
         search_pattern = f"{variant_id}_vs_{target}"
-        search_dir = base_dir / search_pattern / f"boltz_results_{search_pattern}" / "predictions" / search_pattern
-        cif_path = search_dir / f"{search_pattern}_model_0.cif"
+        prediction_dir = base_dir / search_pattern / f"boltz_results_{search_pattern}"
+        cif_path = artifact_path(prediction_dir, "structure")
 
-        if cif_path.exists():
+        if cif_path is not None:
             cif_files.append((variant_id, target, cif_path))
         else:
-            print(f"⚠ Warning: CIF file not found: {cif_path}")
+            print(f"⚠ Warning: CIF file not found in {prediction_dir}")
 
     # Create master script
     master_script = """# ChimeraX Master Script
@@ -257,11 +262,11 @@ def main():
 
         # Find CIF file
         search_pattern = f"{variant_id}_vs_{target}"
-        search_dir = base_dir / search_pattern / f"boltz_results_{search_pattern}" / "predictions" / search_pattern
-        cif_path = search_dir / f"{search_pattern}_model_0.cif"
+        prediction_dir = base_dir / search_pattern / f"boltz_results_{search_pattern}"
+        cif_path = artifact_path(prediction_dir, "structure")
 
-        if not cif_path.exists():
-            print(f"⚠ Warning: CIF file not found: {cif_path}")
+        if cif_path is None:
+            print(f"⚠ Warning: CIF file not found in {prediction_dir}")
             continue
 
         print(f"\nGenerating scripts for {variant_id}:")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+GPU-memory-aware co-scheduling of screen jobs.
+
+A nanobody + dNTP job (~150 tokens) peaks at a few GB, so one job per GPU
+leaves most of a 24 GB card idle. GpuMemoryPacker replaces the fixed
+device pool: a job is admitted to the device with the most free budget
+where its estimated peak memory (sampling_profiles.estimate_peak_gb, from
+its token count and batched samples) fits next to the jobs already running
+there. An idle device always admits one job, however large.
+
+The estimates are rough, so the packer backs off on a device that reports
+CUDA OOM: its budget shrinks by OOM_BACKOFF (down to MIN_BUDGET_FRACTION of
+the card) for the rest of the run, and the failed job is retried by the
+failure policy with serial samples (a smaller estimate).
+
+Usage:
+    python run_specificity_screen.py --workers 12 --gpu-ids 0,1 --pack-gpus --gpu-memory 24
+"""
+
+import threading
+from typing import Dict, List
+
+from cost_model import config_size
+from sampling_profiles import MEMORY_HEADROOM, estimate_peak_gb
+
+
+OOM_BACKOFF = 0.8
+MIN_BUDGET_FRACTION = 0.25
+
+
+def job_memory_gb(config_file, sampling: Dict) -> float:
+    """Estimated peak GPU memory of a config run with these sampling settings."""
+    tokens, _ = config_size(str(config_file))
+    parallel = sampling.get('max_parallel_samples') or sampling['diffusion_samples']
+    return estimate_peak_gb(tokens, min(parallel, sampling['diffusion_samples']))
+
+
+class GpuMemoryPacker:
+    """Thread-safe pool of GPUs shared by jobs while their summed estimates fit each budget."""
+
+    def __init__(self, device_ids: List, memory_gb: float, headroom: float = MEMORY_HEADROOM):
+        self.device_ids = [str(d) for d in device_ids]
+        self.memory_gb = memory_gb
+        self.budget = {d: memory_gb * headroom for d in self.device_ids}
+        self.used = {d: 0.0 for d in self.device_ids}
+        self.running = {d: 0 for d in self.device_ids}
+        self.peak_running = {d: 0 for d in self.device_ids}
+        self.ooms = {d: 0 for d in self.device_ids}
+        self._cond = threading.Condition()
+
+    def _fits(self, device_id, demand_gb):
+        return self.running[device_id] == 0 or self.used[device_id] + demand_gb <= self.budget[device_id]
+
+    def acquire(self, demand_gb: float):
+        """Block until a device has room for demand_gb; returns its ID."""
+        with self._cond:
+            while True:
+                candidates = [d for d in self.device_ids if self._fits(d, demand_gb)]
+                if candidates:
+                    device_id = max(candidates, key=lambda d: self.budget[d] - self.used[d])
+                    self.used[device_id] += demand_gb
+                    self.running[device_id] += 1
+                    self.peak_running[device_id] = max(self.peak_running[device_id],
+                                                       self.running[device_id])
+                    return device_id
+                self._cond.wait()
+
+    def release(self, device_id, demand_gb: float, oom: bool = False):
+        """Return a job's share of a device; oom=True lowers that device's budget."""
+        with self._cond:
+            self.used[device_id] = max(0.0, self.used[device_id] - demand_gb)
+            self.running[device_id] -= 1
+            if oom:
+                self.ooms[device_id] += 1
+                floor = self.memory_gb * MIN_BUDGET_FRACTION
+                self.budget[device_id] = max(floor, self.budget[device_id] * OOM_BACKOFF)
+                print(f"  GPU {device_id}: CUDA OOM with {self.running[device_id] + 1} job(s) running; "
+                      f"packing budget lowered to {self.budget[device_id]:.1f} GB")
+            self._cond.notify_all()
+
+    def summary(self) -> Dict:
+        with self._cond:
+            return {d: {"budget_gb": round(self.budget[d], 2), "peak_jobs": self.peak_running[d],
+                        "ooms": self.ooms[d]} for d in self.device_ids}
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Longest-processing-time-first (LPT) scheduling of prediction jobs.
+
+Jobs are dispatched to whichever worker frees up next, always taking the
+pending item with the largest predicted runtime (cost_model.py). Big
+chimera jobs therefore start early and small VHH jobs fill the gaps at the
+end, instead of one device running a 400-aa chimera while the others idle.
+When the cost model is refitted, the pending queue is re-prioritized so the
+order follows the observed runtimes.
+
+Items are lists of jobs (a single job, or a shard run in one Boltz call);
+an item's cost is the sum of its jobs' predicted runtimes.
+"""
+
+import heapq
+import itertools
+import threading
+from typing import Callable, List, Optional, Sequence
+
+
+def simulate_makespan(costs: Sequence[float], workers: int) -> float:
+    """Makespan of greedy list scheduling of costs (in the given order) on identical workers."""
+    loads = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
+
+
+def lpt_order(items: Sequence, cost_fn: Callable) -> List:
+    """Items sorted by decreasing cost (stable for ties)."""
+    return sorted(items, key=cost_fn, reverse=True)
+
+
+class JobQueue:
+    """
+    Pending work items, popped longest-predicted-first.
+
+    Without a cost_fn items are popped in insertion (manifest) order.
+    Thread-safe, so an event-loop thread can pop while the collecting
+    thread re-prioritizes.
+    """
+
+    def __init__(self, items: Sequence, cost_fn: Optional[Callable] = None):
+        self.cost_fn = cost_fn
+        self._counter = itertools.count()
+        self._heap = []
+        self._lock = threading.RLock()
+        for item in items:
+            self.push(item)
+
+    def _priority(self, item):
+        return -self.cost_fn(item) if self.cost_fn is not None else 0.0
+
+    def push(self, item):
+        with self._lock:
+            heapq.heappush(self._heap, (self._priority(item), next(self._counter), item))
+
+    def pop(self):
+        """Next item to dispatch, or None when empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def reprioritize(self):
+        """Recompute priorities (after the cost model behind cost_fn changed)."""
+        if self.cost_fn is None:
+            return
+        with self._lock:
+            self._heap = [(self._priority(item), seq, item) for _, seq, item in self._heap]
+            heapq.heapify(self._heap)
+
+    def items(self) -> List:
+        """Pending items in dispatch order."""
+        with self._lock:
+            return [item for _, _, item in sorted(self._heap)]
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the `boltz` executable, for benchmarking and testing the screen
+runner without a GPU.
+
+Accepts `boltz predict <config.yaml | dir> --out_dir DIR [options]` like the
+real CLI and writes outputs in the real layout:
+
+    <out_dir>/boltz_results_<input stem>/
+        predictions/<stem>/
+            confidence_<stem>_model_<n>.json
+            <stem>_model_<n>.cif
+            plddt_<stem>_model_<n>.npz
+            pae_<stem>_model_<n>.npz          (with --write_full_pae)
+            affinity_<stem>.json              (configs with an affinity property)
+        processed/{structures,msa,records}/..., manifest.json
+
+Behaviour is controlled through the environment:
+
+    MOCK_BOLTZ_TIME_SCALE  Sleep for the cost-model prior runtime of the job
+                           times this factor (e.g. 0.001: 3 min -> 0.18 s)
+    MOCK_BOLTZ_SLEEP       Additional fixed sleep per invocation (seconds)
+    MOCK_BOLTZ_JITTER      Log-normal sigma of the runtime (default 0.1)
+    MOCK_BOLTZ_FAILURES    Failure distribution, e.g.
+                           "cuda_oom=0.02,bad_input=0.005,transient_io=0.01,hang=0.001"
+                           bad_input is deterministic per config; cuda_oom is
+                           cured by --max_parallel_samples 1; hang sleeps
+                           until killed (exercises timeouts)
+    MOCK_BOLTZ_ARRAYS      0 = skip the npz arrays (saves disk at 10^5 jobs)
+    MOCK_BOLTZ_GPU_MEMORY_GB
+                           Simulate GPUs of this size: each invocation holds
+                           its peak memory (the sampling_profiles.py estimate
+                           for its largest config and batched samples) on
+                           device $CUDA_VISIBLE_DEVICES while it runs, and
+                           fails with CUDA OOM if that exceeds what the
+                           other running invocations left free
+    MOCK_BOLTZ_MEMORY_SCALE
+                           Actual / estimated peak memory (default 1.0; >1
+                           makes the estimates optimistic)
+    MOCK_BOLTZ_MEMORY_DIR  Ledger of simulated allocations shared by the
+                           mock processes (default: <tmp>/mock_boltz_gpus)
+    MOCK_BOLTZ_SEED        Seed for scores and failures (default 0)
+
+Confidence scores and affinities are deterministic per (config stem, seed);
+adding an affinity property does not change a config's confidence scores.
+
+Usage:
+    BOLTZ_BIN=scripts/mock_boltz.py python run_specificity_screen.py --quick
+"""
+
+import atexit
+import fcntl
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import yaml
+
+
+# Cost-model prior (cost_model.py), duplicated to keep start-up numpy-free
+PRIOR_SECONDS = 180.0
+PRIOR_TOKENS = 148
+
+# Peak memory model (sampling_profiles.estimate_peak_gb), duplicated likewise
+BASE_MEMORY_GB = 3.0
+TRUNK_GB_PER_TOKEN2 = 3.5e-5
+SAMPLE_GB_PER_TOKEN2 = 1.0e-5
+SAMPLE_GB_PER_TOKEN = 2.0e-3
+
+FAILURE_MESSAGES = {
+    "cuda_oom": "torch.OutOfMemoryError: CUDA out of memory. Tried to allocate 2.00 GiB "
+                "(GPU 0; 79.15 GiB total capacity)",
+    "bad_input": "ValueError: Invalid SMILES string for ligand B",
+    "transient_io": "OSError: [Errno 5] Input/output error: '/nfs/boltz_cache/ccd.pkl'",
+    "device_error": "RuntimeError: CUDA error: an illegal memory access was encountered",
+}
+
+_SMILES_ATOM = re.compile(r"\[[^\]]+\]|Cl|Br|[BCNOSPFI]|[bcnops]")
+
+
+def parse_args(argv):
+    if not argv or argv[0] != "predict":
+        sys.exit("usage: boltz predict INPUT --out_dir DIR [options]")
+    options = {"input": Path(argv[1]), "write_full_pae": False}
+    rest = argv[2:]
+    i = 0
+    while i < len(rest):
+        key = rest[i].lstrip("-")
+        if key in ("write_full_pae", "write_full_pde", "use_msa_server", "override",
+                   "no_kernels", "use_potentials"):
+            options[key] = True
+            i += 1
+        else:
+            options[key] = rest[i + 1]
+            i += 2
+    return options
+
+
+def config_tokens(config):
+    """Residues plus ligand heavy atoms (Boltz tokenizes ligands per atom)."""
+    tokens = 0
+    chains = []
+    for entry in config.get('sequences', []):
+        (kind, spec), = entry.items()
+        ids = spec['id'] if isinstance(spec.get('id'), list) else [spec.get('id')]
+        if kind in ("protein", "dna", "rna"):
+            n = len(spec['sequence'])
+        elif 'smiles' in spec:
+            n = sum(1 for atom in _SMILES_ATOM.findall(spec['smiles']) if atom != "[H]")
+        else:
+            n = 30
+        for chain_id in ids:
+            chains.append((chain_id, kind, n))
+            tokens += n
+    return tokens, chains
+
+
+def predicted_seconds(tokens, samples, steps, recycling):
+    return (PRIOR_SECONDS * (tokens / PRIOR_TOKENS) ** 1.5 * samples ** 0.3
+            * (steps / 50) ** 0.45 * ((recycling + 1) / 2) ** 0.5)
+
+
+def peak_memory_gb(tokens, parallel_samples):
+    per_sample = SAMPLE_GB_PER_TOKEN2 * tokens ** 2 + SAMPLE_GB_PER_TOKEN * tokens
+    return BASE_MEMORY_GB + TRUNK_GB_PER_TOKEN2 * tokens ** 2 + per_sample * parallel_samples
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def allocate_gpu_memory(ledger_dir, device, capacity_gb, peak_gb):
+    """
+    Hold peak_gb on a simulated device for this process.
+
+    Returns:
+        The ledger entry to remove when done, or None if the device lacks
+        the memory (simulated OOM)
+    """
+    device_dir = Path(ledger_dir) / f"gpu{device}"
+    device_dir.mkdir(parents=True, exist_ok=True)
+    with open(device_dir / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        in_use = 0.0
+        for entry in device_dir.glob("*.gb"):
+            if _alive(int(entry.stem)):
+                in_use += float(entry.read_text() or 0)
+            else:
+                entry.unlink(missing_ok=True)
+        if in_use + peak_gb > capacity_gb:
+            return None
+        entry = device_dir / f"{os.getpid()}.gb"
+        entry.write_text(f"{peak_gb:.3f}")
+    return entry
+
+
+def parse_failures(spec):
+    failures = []
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, probability = item.split("=")
+            failures.append((name.strip(), float(probability)))
+    return failures
+
+
+def _npy_bytes(shape, values):
+    """A float32 .npy file (format 1.0) without importing numpy."""
+    header = f"{{'descr': '<f4', 'fortran_order': False, 'shape': {tuple(shape)}, }}"
+    header += " " * (-(len(header) + 11) % 64) + "\n"
+    return (b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+            + struct.pack(f"<{len(values)}f", *values))
+
+
+def write_npz(path, arrays):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, (shape, values) in arrays.items():
+            zf.writestr(f"{name}.npy", _npy_bytes(shape, values))
+
+
+def write_cif(path, stem, chains, rng):
+    """Minimal mmCIF: one CA per residue on a helix, ligand atoms as HETATM."""
+    out = io.StringIO()
+    out.write(f"data_{stem}\n#\nloop_\n_atom_site.group_PDB\n_atom_site.id\n_atom_site.type_symbol\n"
+              "_atom_site.label_atom_id\n_atom_site.label_comp_id\n_atom_site.label_asym_id\n"
+              "_atom_site.label_seq_id\n_atom_site.Cartn_x\n_atom_site.Cartn_y\n_atom_site.Cartn_z\n"
+              "_atom_site.B_iso_or_equiv\n")
+    atom_id = 1
+    for chain_id, kind, n in chains:
+        group, atom, comp = ("ATOM", "CA", "ALA") if kind != "ligand" else ("HETATM", "C", "LIG")
+        for i in range(n):
+            angle = i * 100 * math.pi / 180
+            x, y, z = 2.3 * math.cos(angle), 2.3 * math.sin(angle), 1.5 * i
+            out.write(f"{group} {atom_id} C {atom} {comp} {chain_id} {i + 1} "
+                      f"{x:.3f} {y:.3f} {z:.3f} {rng.uniform(40, 95):.2f}\n")
+            atom_id += 1
+    out.write("#\n")
+    path.write_text(out.getvalue())
+
+
+def confidence_summary(chains, rng):
+    ptm = rng.uniform(0.5, 0.95)
+    iptm = rng.uniform(0.2, 0.95)
+    ligand_iptm = min(1.0, max(0.0, iptm + rng.gauss(0, 0.05)))
+    plddt = rng.uniform(0.6, 0.95)
+    chain_ids = [str(i) for i in range(len(chains))]
+    return {
+        "confidence_score": round(0.8 * plddt + 0.2 * iptm, 6),
+        "ptm": round(ptm, 6),
+        "iptm": round(iptm, 6),
+        "ligand_iptm": round(ligand_iptm, 6),
+        "protein_iptm": 0.0,
+        "complex_plddt": round(plddt, 6),
+        "complex_iplddt": round(min(1.0, plddt * rng.uniform(0.9, 1.1)), 6),
+        "complex_pde": round(rng.uniform(0.3, 1.5), 6),
+        "complex_ipde": round(rng.uniform(0.8, 4.0), 6),
+        "chains_ptm": {c: round(rng.uniform(0.5, 0.95), 6) for c in chain_ids},
+        "pair_chains_iptm": {a: {b: round(ptm if a == b else iptm, 6) for b in chain_ids}
+                             for a in chain_ids},
+    }
+
+
+def affinity_summary(rng):
+    """affinity_<stem>.json as Boltz-2 writes it (log10 IC50 in uM; ensemble members 1/2)."""
+    values = [rng.uniform(-2.0, 2.5) for _ in range(2)]
+    probabilities = [rng.uniform(0.05, 0.95) for _ in range(2)]
+    return {
+        "affinity_pred_value": round(sum(values) / 2, 6),
+        "affinity_probability_binary": round(sum(probabilities) / 2, 6),
+        "affinity_pred_value1": round(values[0], 6),
+        "affinity_probability_binary1": round(probabilities[0], 6),
+        "affinity_pred_value2": round(values[1], 6),
+        "affinity_probability_binary2": round(probabilities[1], 6),
+    }
+
+
+def predict_config(config_file, results_dir, options, seed, write_arrays):
+    stem = config_file.stem
+    with open(config_file, 'r') as f:
+        config = yaml.safe_load(f)
+    tokens, chains = config_tokens(config)
+
+    pred_dir = results_dir / "predictions" / stem
+    pred_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(f"{seed}:{stem}")
+    models = [confidence_summary(chains, rng) for _ in range(int(options.get('diffusion_samples', 1)))]
+    models.sort(key=lambda m: m['confidence_score'], reverse=True)
+    for n, summary in enumerate(models):
+        with open(pred_dir / f"confidence_{stem}_model_{n}.json", 'w') as f:
+            json.dump(summary, f, indent=4)
+        write_cif(pred_dir / f"{stem}_model_{n}.cif", stem, chains, rng)
+        if write_arrays:
+            write_npz(pred_dir / f"plddt_{stem}_model_{n}.npz",
+                      {"plddt": ((tokens,), [rng.uniform(0.4, 0.95) for _ in range(tokens)])})
+            if options.get('write_full_pae'):
+                write_npz(pred_dir / f"pae_{stem}_model_{n}.npz",
+                          {"pae": ((tokens, tokens), [rng.uniform(0.5, 25.0)
+                                                      for _ in range(tokens * tokens)])})
+    if any('affinity' in prop for prop in config.get('properties') or []):
+        with open(pred_dir / f"affinity_{stem}.json", 'w') as f:
+            json.dump(affinity_summary(random.Random(f"{seed}:{stem}:affinity")), f, indent=4)
+
+    processed = results_dir / "processed"
+    for sub in ("structures", "msa", "records"):
+        (processed / sub).mkdir(parents=True, exist_ok=True)
+    if write_arrays:
+        write_npz(processed / "structures" / f"{stem}.npz", {"coords": ((tokens, 3), [0.0] * tokens * 3)})
+        write_npz(processed / "msa" / f"{stem}_0.npz", {"deletion_value": ((1,), [0.0])})
+    record = {"id": stem, "structure": {"num_chains": len(chains)},
+              "chains": [{"chain_name": c, "mol_type": kind, "num_residues": n} for c, kind, n in chains]}
+    with open(processed / "records" / f"{stem}.json", 'w') as f:
+        json.dump(record, f)
+    return tokens, record
+
+
+def hold_simulated_memory(configs, options):
+    """
+    Take this invocation's simulated GPU memory (MOCK_BOLTZ_GPU_MEMORY_GB)
+    until exit (entries of killed processes are dropped by the next
+    allocation); exits with a CUDA OOM error if the device is full.
+    """
+    capacity_gb = float(os.environ.get("MOCK_BOLTZ_GPU_MEMORY_GB", "0"))
+    if not capacity_gb or not configs:
+        return
+    largest = 0
+    for config_file in configs:
+        with open(config_file, 'r') as f:
+            largest = max(largest, config_tokens(yaml.safe_load(f))[0])
+    samples = int(options.get('diffusion_samples', 1))
+    parallel = min(samples, int(options.get('max_parallel_samples', samples)))
+    peak_gb = peak_memory_gb(largest, parallel) * float(os.environ.get("MOCK_BOLTZ_MEMORY_SCALE", "1.0"))
+    ledger = os.environ.get("MOCK_BOLTZ_MEMORY_DIR",
+                            os.path.join(tempfile.gettempdir(), "mock_boltz_gpus"))
+    device = os.environ.get("CUDA_VISIBLE_DEVICES") or "0"
+    allocation = allocate_gpu_memory(ledger, device, capacity_gb, peak_gb)
+    if allocation is None:
+        print("Traceback (most recent call last):\n  File \"boltz/main.py\", line 1, in predict\n"
+              + FAILURE_MESSAGES["cuda_oom"], file=sys.stderr)
+        sys.exit(1)
+    atexit.register(allocation.unlink, missing_ok=True)
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+    start = time.time()
+    seed = os.environ.get("MOCK_BOLTZ_SEED", "0")
+    inputs = options['input']
+    configs = sorted(inputs.glob("*.yaml")) if inputs.is_dir() else [inputs]
+    results_dir = Path(options['out_dir']) / f"boltz_results_{inputs.stem}"
+
+    samples = int(options.get('diffusion_samples', 1))
+    steps = int(options.get('sampling_steps', 200))
+    recycling = int(options.get('recycling_steps', 3))
+    time_scale = float(os.environ.get("MOCK_BOLTZ_TIME_SCALE", "0"))
+    jitter = float(os.environ.get("MOCK_BOLTZ_JITTER", "0.1"))
+    failures = parse_failures(os.environ.get("MOCK_BOLTZ_FAILURES"))
+    write_arrays = os.environ.get("MOCK_BOLTZ_ARRAYS", "1") != "0"
+    rng = random.Random()
+
+    print(f"Checking input data.\nRunning predictions for {len(configs)} structures")
+    hold_simulated_memory(configs, options)
+    manifest = []
+    runtime = float(os.environ.get("MOCK_BOLTZ_SLEEP", "0"))
+    for config_file in configs:
+        stem = config_file.stem
+        for name, probability in failures:
+            if name == "bad_input":
+                # Deterministic: the same config always fails
+                digest = int(hashlib.sha256(f"{seed}:{stem}".encode()).hexdigest()[:8], 16)
+                hit = digest / 0xFFFFFFFF < probability
+            elif name == "cuda_oom" and options.get('max_parallel_samples') == "1":
+                hit = False
+            else:
+                hit = rng.random() < probability
+            if not hit:
+                continue
+            if name == "hang":
+                time.sleep(86400)
+            print("Traceback (most recent call last):\n  File \"boltz/main.py\", line 1, in predict\n"
+                  + FAILURE_MESSAGES[name], file=sys.stderr)
+            sys.exit(1)
+
+        tokens, record = predict_config(config_file, results_dir, options, seed, write_arrays)
+        manifest.append(record)
+        if time_scale:
+            runtime += (predicted_seconds(tokens, samples, steps, recycling)
+                        * time_scale * math.exp(rng.gauss(0, jitter)))
+
+    with open(results_dir / "processed" / "manifest.json", 'w') as f:
+        json.dump({"records": manifest}, f)
+
+    remaining = runtime - (time.time() - start)
+    if remaining > 0:
+        time.sleep(remaining)
+    print(f"Predicting DataLoader 0: 100%|| {len(configs)}/{len(configs)}")
+    print("Number of failed examples: 0")
+
+
+if __name__ == "__main__":
+    main()
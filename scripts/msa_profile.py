@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Position-specific scoring matrices (PSSMs) and conservation profiles from MSAs.
+
+The alignment is encoded once into an integer matrix, sequences are reweighted
+by 80% identity clustering, and all downstream math (frequencies, log-odds,
+conservation, mutation scoring) runs as NumPy array operations. Profiles are
+cached per scaffold, in memory and optionally on disk, keyed by the MSA content.
+
+Usage:
+    python msa_profile.py ../specificity_library/msas/dATP_variant_000_WT/A.a3m
+    python msa_profile.py A.a3m --score Y96F,K97R --cache-dir ../.profile_cache
+"""
+
+import argparse
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+GAP = "-"
+ALPHABET = AMINO_ACIDS + GAP
+GAP_INDEX = len(AMINO_ACIDS)
+
+# Robinson & Robinson background frequencies (BLOSUM62 background), AMINO_ACIDS order
+BACKGROUND_FREQUENCIES = np.array([
+    0.07805, 0.01925, 0.05364, 0.06295, 0.03856,  # A C D E F
+    0.07377, 0.02199, 0.05142, 0.05744, 0.09019,  # G H I K L
+    0.02243, 0.04487, 0.05203, 0.04264, 0.05129,  # M N P Q R
+    0.07120, 0.05841, 0.06441, 0.01330, 0.03216,  # S T V W Y
+])
+BACKGROUND_FREQUENCIES = BACKGROUND_FREQUENCIES / BACKGROUND_FREQUENCIES.sum()
+
+# Byte -> alphabet index lookup; anything non-standard (X, B, Z, '.') maps to gap
+_ENCODING_TABLE = np.full(256, GAP_INDEX, dtype=np.uint8)
+for _i, _aa in enumerate(AMINO_ACIDS):
+    _ENCODING_TABLE[ord(_aa)] = _i
+
+# In-memory profile cache: (scaffold, msa digest, parameters) -> ScaffoldProfile
+_PROFILE_CACHE: Dict[Tuple, "ScaffoldProfile"] = {}
+
+
+def read_a3m(a3m_file) -> List[str]:
+    """
+    Read aligned sequences from an A3M file.
+
+    Lowercase insertion states are removed so every row is aligned to the
+    query (the first sequence).
+    """
+    sequences = []
+    current = []
+    with open(a3m_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('>'):
+                if current:
+                    sequences.append("".join(current))
+                current = []
+            else:
+                current.append("".join(c for c in line if not c.islower()))
+    if current:
+        sequences.append("".join(current))
+
+    if not sequences:
+        raise ValueError(f"No sequences found in {a3m_file}")
+
+    length = len(sequences[0])
+    for i, seq in enumerate(sequences):
+        if len(seq) != length:
+            raise ValueError(
+                f"Sequence {i} in {a3m_file} has aligned length {len(seq)}, expected {length}"
+            )
+
+    return sequences
+
+
+def encode_alignment(sequences: List[str]) -> np.ndarray:
+    """Encode aligned sequences into an (N, L) uint8 matrix of alphabet indices."""
+    raw = np.frombuffer("".join(sequences).upper().encode('ascii'), dtype=np.uint8)
+    return _ENCODING_TABLE[raw].reshape(len(sequences), -1)
+
+
+def sequence_weights(msa: np.ndarray, identity_threshold: float = 0.8,
+                     chunk_elements: int = 2 ** 24) -> np.ndarray:
+    """
+    Cluster-based sequence weights: 1 / (number of sequences >= threshold identity).
+
+    Identity is computed in row chunks to bound memory at roughly
+    chunk_elements booleans per step.
+    """
+    n_seqs, length = msa.shape
+    if n_seqs == 1:
+        return np.ones(1)
+
+    neighbours = np.zeros(n_seqs)
+    chunk = max(1, chunk_elements // max(1, n_seqs * length))
+    for start in range(0, n_seqs, chunk):
+        block = msa[start:start + chunk]
+        identity = (block[:, None, :] == msa[None, :, :]).mean(axis=2)
+        neighbours[start:start + chunk] = (identity >= identity_threshold).sum(axis=1)
+
+    return 1.0 / neighbours
+
+
+def weighted_frequencies(msa: np.ndarray, weights: np.ndarray,
+                         pseudocount: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted amino acid frequencies per column with background pseudocounts.
+
+    Returns:
+        (frequencies (L, 20), effective observations per column (L,))
+    """
+    n_seqs, length = msa.shape
+    flat_index = (np.arange(length) * len(ALPHABET) + msa).ravel()
+    counts = np.bincount(
+        flat_index,
+        weights=np.repeat(weights, length),
+        minlength=length * len(ALPHABET)
+    ).reshape(length, len(ALPHABET))
+
+    residue_counts = counts[:, :GAP_INDEX]
+    observed = residue_counts.sum(axis=1)
+    frequencies = (residue_counts + pseudocount * BACKGROUND_FREQUENCIES) / (observed + pseudocount)[:, None]
+
+    return frequencies, observed
+
+
+class ScaffoldProfile:
+    """PSSM and conservation profile for one scaffold alignment."""
+
+    def __init__(self, query: str, frequencies: np.ndarray, observed: np.ndarray,
+                 neff: float, num_sequences: int, digest: str = ""):
+        self.query = query
+        self.frequencies = frequencies
+        self.observed = observed
+        self.neff = neff
+        self.num_sequences = num_sequences
+        self.digest = digest
+
+        # Log-odds in bits against the background
+        self.pssm = np.log2(frequencies / BACKGROUND_FREQUENCIES)
+
+        # Conservation = relative entropy (bits) of the column vs background
+        self.conservation = (frequencies * self.pssm).sum(axis=1)
+
+        self.query_indices = encode_alignment([query])[0]
+        positions = np.arange(len(query))
+        wt_scores = np.where(
+            self.query_indices < GAP_INDEX,
+            self.pssm[positions, np.minimum(self.query_indices, GAP_INDEX - 1)],
+            0.0
+        )
+        # Score of each substitution relative to the scaffold residue
+        self.delta = self.pssm - wt_scores[:, None]
+
+    def __len__(self):
+        return len(self.query)
+
+    def score_mutations(self, positions, amino_acids) -> np.ndarray:
+        """
+        Vectorized substitution scores (bits, relative to wild type).
+
+        Args:
+            positions: Array-like of 0-indexed positions
+            amino_acids: Array-like of one-letter codes or alphabet indices
+
+        Returns:
+            Array of log-odds deltas, one per mutation
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        aa = np.asarray(amino_acids)
+        if aa.dtype.kind in ('U', 'S', 'O'):
+            aa = encode_alignment(["".join(aa.ravel().tolist())])[0].reshape(aa.shape)
+        if np.any(aa >= GAP_INDEX):
+            raise ValueError("Mutations must be to one of the 20 standard amino acids")
+        return self.delta[positions, aa]
+
+    def score_sequences(self, sequences: List[str]) -> np.ndarray:
+        """Sum of substitution scores for aligned, equal-length variant sequences."""
+        encoded = encode_alignment(sequences)
+        if encoded.shape[1] != len(self):
+            raise ValueError(f"Sequences must have length {len(self)}")
+        mutated = (encoded != self.query_indices) & (encoded < GAP_INDEX)
+        positions = np.broadcast_to(np.arange(len(self)), encoded.shape)
+        scores = np.where(mutated, self.delta[positions, np.minimum(encoded, GAP_INDEX - 1)], 0.0)
+        return scores.sum(axis=1)
+
+    def score_mutation_string(self, mutations: str) -> np.ndarray:
+        """Score a manifest mutation string such as 'Y96F,K97R' (1-indexed)."""
+        positions, amino_acids = parse_mutations(mutations, self.query)
+        return self.score_mutations(positions, amino_acids)
+
+    def save(self, cache_file):
+        """Save the profile to an .npz file."""
+        np.savez_compressed(
+            cache_file,
+            query=np.array(self.query),
+            frequencies=self.frequencies,
+            observed=self.observed,
+            neff=np.array(self.neff),
+            num_sequences=np.array(self.num_sequences),
+            digest=np.array(self.digest),
+        )
+
+    @classmethod
+    def load(cls, cache_file) -> "ScaffoldProfile":
+        """Load a profile saved with save()."""
+        with np.load(cache_file) as data:
+            return cls(
+                query=str(data['query']),
+                frequencies=data['frequencies'],
+                observed=data['observed'],
+                neff=float(data['neff']),
+                num_sequences=int(data['num_sequences']),
+                digest=str(data['digest']),
+            )
+
+
+def parse_mutations(mutations: str, reference: Optional[str] = None) -> Tuple[np.ndarray, List[str]]:
+    """
+    Parse 'A96Y,K97R'-style mutation strings into 0-indexed positions and targets.
+
+    'WT' or an empty string parses to no mutations. If a reference sequence is
+    given, the wild-type residue of each mutation is checked against it.
+    """
+    if not mutations or mutations == 'WT':
+        return np.zeros(0, dtype=np.intp), []
+
+    positions = []
+    amino_acids = []
+    for token in mutations.split(','):
+        token = token.strip()
+        wt, pos, new = token[0], int(token[1:-1]) - 1, token[-1]
+        if reference is not None and reference[pos] != wt:
+            raise ValueError(f"Mutation {token}: reference has {reference[pos]} at position {pos + 1}")
+        positions.append(pos)
+        amino_acids.append(new)
+
+    return np.array(positions, dtype=np.intp), amino_acids
+
+
+def build_profile(sequences: List[str], identity_threshold: float = 0.8,
+                  pseudocount: float = 1.0, digest: str = "") -> ScaffoldProfile:
+    """Build a ScaffoldProfile from aligned sequences (query first)."""
+    msa = encode_alignment(sequences)
+    weights = sequence_weights(msa, identity_threshold)
+    frequencies, observed = weighted_frequencies(msa, weights, pseudocount)
+    return ScaffoldProfile(
+        query=sequences[0].upper(),
+        frequencies=frequencies,
+        observed=observed,
+        neff=float(weights.sum()),
+        num_sequences=len(sequences),
+        digest=digest,
+    )
+
+
+def load_profile(a3m_file, scaffold: Optional[str] = None, cache_dir=None,
+                 identity_threshold: float = 0.8, pseudocount: float = 1.0) -> ScaffoldProfile:
+    """
+    Load (or build and cache) the profile for a scaffold MSA.
+
+    Profiles are keyed by the MSA content hash plus parameters, so an updated
+    alignment is never served from a stale cache entry.
+
+    Args:
+        a3m_file: Scaffold MSA in A3M format
+        scaffold: Scaffold name used in the cache file name (default: MSA stem)
+        cache_dir: Optional directory for persistent .npz profiles
+        identity_threshold: Identity for sequence reweighting
+        pseudocount: Background pseudocount weight
+    """
+    a3m_path = Path(a3m_file)
+    scaffold = scaffold or a3m_path.stem
+    digest = hashlib.sha256(a3m_path.read_bytes()).hexdigest()
+    key = (scaffold, digest, identity_threshold, pseudocount)
+
+    if key in _PROFILE_CACHE:
+        return _PROFILE_CACHE[key]
+
+    cache_file = None
+    if cache_dir is not None:
+        params = f"{identity_threshold:g}_{pseudocount:g}"
+        cache_file = Path(cache_dir) / f"{scaffold}_{digest[:16]}_{params}.npz"
+        if cache_file.exists():
+            profile = ScaffoldProfile.load(cache_file)
+            _PROFILE_CACHE[key] = profile
+            return profile
+
+    profile = build_profile(read_a3m(a3m_path), identity_threshold, pseudocount, digest)
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        profile.save(cache_file)
+
+    _PROFILE_CACHE[key] = profile
+    return profile
+
+
+def filter_variants(variants: List[Dict], profile: ScaffoldProfile,
+                    cdr_regions: Dict[str, Tuple[int, int]],
+                    framework_threshold: float = -2.0,
+                    cdr_threshold: Optional[float] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Drop variants carrying evolutionarily implausible mutations.
+
+    Every variant gets a 'pssm_score' (sum of substitution scores in bits).
+    A variant is dropped if any framework mutation scores below
+    framework_threshold, or (if cdr_threshold is set) any CDR mutation
+    scores below cdr_threshold.
+
+    Returns:
+        (kept variants, dropped variants)
+    """
+    in_cdr = np.zeros(len(profile), dtype=bool)
+    for start, end in cdr_regions.values():
+        in_cdr[start:end] = True
+
+    kept, dropped = [], []
+    for variant in variants:
+        positions, amino_acids = parse_mutations(variant['mutations'])
+        scores = profile.score_mutations(positions, amino_acids) if len(positions) else np.zeros(0)
+        variant['pssm_score'] = float(scores.sum())
+
+        cdr_mask = in_cdr[positions]
+        implausible = np.any(scores[~cdr_mask] < framework_threshold)
+        if cdr_threshold is not None:
+            implausible = implausible or np.any(scores[cdr_mask] < cdr_threshold)
+
+        (dropped if implausible else kept).append(variant)
+
+    return kept, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build a PSSM / conservation profile from a scaffold MSA"
+    )
+    parser.add_argument("a3m", help="Scaffold MSA (A3M format, query first)")
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for cached profiles"
+    )
+    parser.add_argument(
+        "--identity",
+        type=float,
+        default=0.8,
+        help="Identity threshold for sequence weighting (default: 0.8)"
+    )
+    parser.add_argument(
+        "--score",
+        help="Comma-separated mutations to score, e.g. Y96F,K97R (1-indexed)"
+    )
+
+    args = parser.parse_args()
+
+    profile = load_profile(args.a3m, cache_dir=args.cache_dir, identity_threshold=args.identity)
+
+    print(f"Scaffold length: {len(profile)}")
+    print(f"Sequences: {profile.num_sequences} (Neff = {profile.neff:.1f})")
+    print(f"Mean conservation: {profile.conservation.mean():.2f} bits")
+
+    top = np.argsort(profile.conservation)[::-1][:10]
+    print("\nMost conserved positions:")
+    for pos in top:
+        print(f"  {profile.query[pos]}{pos + 1}: {profile.conservation[pos]:.2f} bits")
+
+    if args.score:
+        print("\nMutation scores (bits vs wild type):")
+        tokens = [t.strip() for t in args.score.split(',')]
+        for token, score in zip(tokens, profile.score_mutation_string(args.score)):
+            print(f"  {token}: {score:+.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of Boltz prediction outputs.
+
+A job is identified by a canonical hash of everything that determines its
+prediction: chain IDs and protein sequences, ligand SMILES/CCD codes, the
+content hash of each MSA, properties/constraints, and the sampling
+parameters. The config file name does not matter, so the same complex
+appearing in a new library, a re-run, or the de novo selectivity configs
+from design_nucleotide_binders.py is predicted once.
+
+Layout:
+    <cache_dir>/
+        index.jsonl                 append-only key -> entry index
+        objects/<ab>/<key>/         cached boltz_results_<stem>/ tree
+
+The index is loaded into a dict once, so lookups are O(1).
+
+Usage:
+    python prediction_cache.py --cache-dir ../prediction_cache stats
+    python prediction_cache.py --cache-dir ../prediction_cache key config.yaml --quick
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import yaml
+
+
+CACHE_VERSION = 1
+
+
+def file_digest(path) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def canonical_inputs(config_file, sampling: Dict) -> Dict:
+    """
+    Canonical, path-independent description of a prediction job.
+
+    MSA paths are replaced by the hash of the MSA contents; "empty" MSAs and
+    missing MSAs are kept literally since Boltz treats them differently.
+    """
+    config_file = Path(config_file)
+    with open(config_file, 'r') as f:
+        config = yaml.safe_load(f)
+
+    sequences = []
+    for entry in config.get('sequences', []):
+        (kind, spec), = entry.items()
+        spec = dict(spec)
+        msa = spec.get('msa')
+        if msa and msa != 'empty':
+            msa_path = Path(msa)
+            if not msa_path.is_absolute():
+                msa_path = config_file.parent / msa_path
+            spec['msa'] = f"sha256:{file_digest(msa_path)}"
+        sequences.append({kind: spec})
+
+    return {
+        "version": CACHE_VERSION,
+        "config_version": config.get('version'),
+        "sequences": sequences,
+        "properties": config.get('properties'),
+        "constraints": config.get('constraints'),
+        "templates": config.get('templates'),
+        "sampling": {k: sampling[k] for k in sorted(sampling)},
+    }
+
+
+def cache_key(config_file, sampling: Dict) -> str:
+    """Canonical hash of a job's prediction inputs."""
+    canonical = json.dumps(canonical_inputs(config_file, sampling), sort_keys=True,
+                           separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _renamed(name: str, old_stem: str, new_stem: str) -> str:
+    return name.replace(old_stem, new_stem) if old_stem != new_stem else name
+
+
+class PredictionCache:
+    """Content-addressed store of boltz_results trees with an O(1) index."""
+
+    def __init__(self, cache_dir):
+        self.root = Path(cache_dir)
+        self.objects = self.root / "objects"
+        self.index_file = self.root / "index.jsonl"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        index = {}
+        if self.index_file.exists():
+            with open(self.index_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # truncated line from an interrupted append
+                    index[entry['key']] = entry
+        return index
+
+    def __len__(self):
+        return len(self._index)
+
+    def _object_dir(self, key: str) -> Path:
+        return self.objects / key[:2] / key
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Index entry for key, or None (also None if the object was removed)."""
+        entry = self._index.get(key)
+        if entry is not None and not self._object_dir(key).exists():
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def store(self, key: str, prediction_dir, stem: str, elapsed: Optional[float] = None):
+        """Copy a finished boltz_results_<stem> tree into the cache."""
+        target = self._object_dir(key)
+        if key in self._index and target.exists():
+            return
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.copytree(prediction_dir, staging)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another writer stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+
+        entry = {"key": key, "stem": stem, "elapsed": elapsed, "created": time.time()}
+        with self._lock:
+            with open(self.index_file, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._index[key] = entry
+
+    def materialize(self, entry: Dict, output_dir, stem: str, link: bool = True) -> Path:
+        """
+        Recreate the cached outputs as <output_dir>/boltz_results_<stem>/.
+
+        File and directory names are rewritten from the cached config stem to
+        this job's stem. Files are hard-linked when possible (cache and
+        results on one filesystem), otherwise copied.
+        """
+        source = self._object_dir(entry['key'])
+        pred_dir = Path(output_dir) / f"boltz_results_{stem}"
+        if pred_dir.exists():
+            shutil.rmtree(pred_dir)
+
+        for src in source.rglob("*"):
+            rel = Path(*[_renamed(part, entry['stem'], stem) for part in src.relative_to(source).parts])
+            dst = pred_dir / rel
+            if src.is_dir():
+                dst.mkdir(parents=True, exist_ok=True)
+                continue
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if link:
+                try:
+                    os.link(src, dst)
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(src, dst)
+
+        return pred_dir
+
+    def fetch(self, config_file, output_dir, sampling: Dict) -> Optional[Dict]:
+        """
+        Materialize a cached prediction for a job if there is one.
+
+        Returns:
+            {'prediction_dir', 'elapsed', 'key'} on a hit, None on a miss
+        """
+        key = cache_key(config_file, sampling)
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        pred_dir = self.materialize(entry, output_dir, Path(config_file).stem)
+        return {"prediction_dir": pred_dir, "elapsed": entry.get('elapsed'), "key": key}
+
+    def put(self, config_file, sampling: Dict, prediction_dir, elapsed: Optional[float] = None) -> str:
+        """Store a finished prediction for a job; returns its key."""
+        key = cache_key(config_file, sampling)
+        self.store(key, prediction_dir, Path(config_file).stem, elapsed)
+        return key
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect the content-addressed Boltz prediction cache"
+    )
+    parser.add_argument("--cache-dir", required=True, help="Cache directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="Show cache size")
+
+    key = subparsers.add_parser("key", help="Print the cache key of a config")
+    key.add_argument("config", help="Boltz YAML config")
+    key.add_argument("--quick", action="store_true", help="Quick-mode sampling parameters")
+
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        cache = PredictionCache(args.cache_dir)
+        size = sum(p.stat().st_size for p in cache.objects.rglob("*") if p.is_file())
+        print(f"Entries: {len(cache)}")
+        print(f"Size: {size / 1e6:.1f} MB")
+    elif args.command == "key":
+        from screen_jobs import get_sampling_params
+
+        key_value = cache_key(args.config, get_sampling_params(args.quick))
+        cache = PredictionCache(args.cache_dir)
+        print(f"{key_value} ({'cached' if cache.lookup(key_value) else 'not cached'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Index of the artifacts of one Boltz prediction.
+
+When a job finishes, the runner writes boltz_results_<stem>/prediction_index.json
+with the exact path (relative to boltz_results_<stem>/) of every artifact
+per model, so readers never walk the tree:
+
+    {
+      "version": 1,
+      "stem": "dATP_variant_001_vs_dATP",
+      "best_model": 0,
+      "models": [
+        {"model": 0, "confidence_score": 0.91,
+         "confidence": "predictions/<stem>/confidence_<stem>_model_0.json",
+         "structure": "predictions/<stem>/<stem>_model_0.cif",   (or .cif.gz)
+         "pae": ..., "pae_interchain": ..., "pde": ..., "plddt": ...},
+        ...
+      ],
+      "affinity": "predictions/<stem>/affinity_<stem>.json",   (null without affinity)
+      "processed": "processed"
+    }
+
+Models are ordered by confidence_score (best first, as Boltz ranks them);
+artifacts a model does not have are null. Outputs written before the index
+existed (or renamed by the prediction cache, or trimmed by
+artifact_retention.py) are indexed on first read.
+
+Usage:
+    python prediction_index.py show RESULTS/var_vs_dATP/boltz_results_var_vs_dATP
+    python prediction_index.py build ../specificity_library/screening_results
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+
+INDEX_NAME = "prediction_index.json"
+INDEX_VERSION = 1
+
+# Artifact kind -> (file name prefix, suffixes) inside predictions/<stem>/
+ARTIFACT_PATTERNS = {
+    "confidence": ("confidence_", (".json",)),
+    "structure": ("", (".cif", ".cif.gz", ".pdb", ".pdb.gz")),
+    "pae": ("pae_", (".npz",)),
+    "pae_interchain": ("pae_interchain_", (".npz",)),
+    "pde": ("pde_", (".npz",)),
+    "plddt": ("plddt_", (".npz",)),
+}
+
+
+def prediction_dir_for(output_dir, config_file) -> Path:
+    """The boltz_results_<stem>/ directory `boltz predict config_file` writes into output_dir."""
+    return Path(output_dir) / f"boltz_results_{Path(config_file).stem}"
+
+
+def prediction_root(path) -> Path:
+    """boltz_results_<stem>/ of a path to it or to its predictions/<stem>/ directory."""
+    path = Path(path)
+    if path.parent.name == "predictions":
+        return path.parent.parent
+    return path
+
+
+def _classify(name: str, stem: str):
+    """(kind, model number) of an artifact file name, or None."""
+    for kind, (prefix, suffixes) in ARTIFACT_PATTERNS.items():
+        head = f"{prefix}{stem}_model_"
+        if not name.startswith(head):
+            continue
+        for suffix in suffixes:
+            number = name[len(head):-len(suffix)]
+            if name.endswith(suffix) and number.isdigit():
+                return kind, int(number)
+    return None
+
+
+def build_index(prediction_dir) -> Optional[Dict]:
+    """
+    Index a boltz_results_<stem>/ tree with one directory listing.
+
+    Returns:
+        The index, or None if there are no confidence outputs
+    """
+    prediction_dir = Path(prediction_dir)
+    stem = prediction_dir.name[len("boltz_results_"):]
+    model_dir = prediction_dir / "predictions" / stem
+    if not model_dir.is_dir():
+        return None
+
+    models = {}
+    with os.scandir(model_dir) as entries:
+        for entry in entries:
+            found = _classify(entry.name, stem)
+            if found is None:
+                continue
+            kind, number = found
+            model = models.setdefault(number, {"model": number, **{k: None for k in ARTIFACT_PATTERNS}})
+            model[kind] = f"predictions/{stem}/{entry.name}"
+
+    models = [m for m in models.values() if m['confidence'] is not None]
+    if not models:
+        return None
+    for model in models:
+        with open(prediction_dir / model['confidence'], 'r') as f:
+            model['confidence_score'] = json.load(f).get('confidence_score')
+    models.sort(key=lambda m: (-(m['confidence_score'] or 0.0), m['model']))
+
+    return {
+        "version": INDEX_VERSION,
+        "stem": stem,
+        "best_model": models[0]['model'],
+        "models": models,
+        "affinity": (f"predictions/{stem}/affinity_{stem}.json"
+                     if (model_dir / f"affinity_{stem}.json").is_file() else None),
+        "processed": "processed" if (prediction_dir / "processed").is_dir() else None,
+    }
+
+
+def write_index(prediction_dir) -> Optional[Dict]:
+    """(Re)build and atomically write the index of a finished prediction."""
+    prediction_dir = Path(prediction_dir)
+    index = build_index(prediction_dir)
+    if index is None:
+        return None
+    index_file = prediction_dir / INDEX_NAME
+    tmp = index_file.with_name(f".{INDEX_NAME}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, index_file)
+    return index
+
+
+def load_index(prediction_dir) -> Optional[Dict]:
+    """
+    Index of a prediction, rebuilt if missing, from an older version, or
+    stale (another stem after a cache copy, or its best model's files gone).
+    """
+    prediction_dir = prediction_root(prediction_dir)
+    try:
+        with open(prediction_dir / INDEX_NAME, 'r') as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        index = None
+    if (index is not None and index.get('version') == INDEX_VERSION
+            and index.get('stem') == prediction_dir.name[len("boltz_results_"):]):
+        best = index['models'][0]
+        if all((prediction_dir / best[kind]).exists() for kind in ARTIFACT_PATTERNS if best[kind]):
+            return index
+    try:
+        return write_index(prediction_dir)
+    except OSError:
+        # Read-only outputs: use the index without saving it
+        return build_index(prediction_dir)
+
+
+def artifact_path(prediction_dir, kind: str, model: Optional[int] = None) -> Optional[Path]:
+    """
+    Absolute path of an artifact ("confidence", "structure", "pae",
+    "pae_interchain", "pde", "plddt") of a model (default: the best), or None.
+    """
+    prediction_dir = prediction_root(prediction_dir)
+    index = load_index(prediction_dir)
+    if index is None:
+        return None
+    number = index['best_model'] if model is None else model
+    for entry in index['models']:
+        if entry['model'] == number:
+            return prediction_dir / entry[kind] if entry.get(kind) else None
+    return None
+
+
+def affinity_path(prediction_dir) -> Optional[Path]:
+    """Absolute path of the affinity JSON of a prediction run with an affinity property, or None."""
+    prediction_dir = prediction_root(prediction_dir)
+    index = load_index(prediction_dir)
+    if index is None or not index.get('affinity'):
+        return None
+    return prediction_dir / index['affinity']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show or build Boltz prediction output indexes"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show", help="Print the index of one prediction")
+    show.add_argument("prediction_dir", help="boltz_results_<stem> directory")
+
+    build = subparsers.add_parser("build", help="Index every prediction of a results directory")
+    build.add_argument("results_dir", help="Screening results directory")
+
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print(json.dumps(load_index(args.prediction_dir), indent=2))
+    elif args.command == "build":
+        # <results>/<job>/boltz_results_<stem> (and <results>/<tier>/<job>/... for tiered screens)
+        indexed = 0
+        for pattern in ("*/boltz_results_*", "*/*/boltz_results_*"):
+            for prediction_dir in Path(args.results_dir).glob(pattern):
+                if prediction_dir.is_dir() and write_index(prediction_dir) is not None:
+                    indexed += 1
+        print(f"Indexed {indexed} predictions")
+
+
+if __name__ == "__main__":
+    main()
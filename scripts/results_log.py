@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL log of screening results.
+
+Every completed prediction is appended as one line and fsync'd, so a crash
+loses at most the record being written. screening_results.json is derived
+from the log by compaction (latest entry per job wins, manifest order).
+
+The log is kept across runs. Compaction reads the last run only, plus the
+runs before it while the run being read is a --resume ("resume": true),
+whose completed jobs carry forward. A multi-node screen reads the runs of
+its screen_id (shared_queue.py) instead.
+
+Log lines:
+    {"type": "run", "timestamp": ..., "mode": ..., "total_predictions": N,
+     "resume": bool, "screen_id": ... (multi-node screens)}
+    {"type": "result", "index": i, "record": {...screening result...}}
+        (records with "status": "pruned" were skipped by target-first scheduling)
+    {"type": "failure", "index": i, "variant_id": ..., "test_nucleotide": ...}
+    {"type": "event", "event": "disk_paused", "timestamp": ..., ...}
+        (runner events such as disk_watchdog.py pauses; ignored by compaction)
+
+Multi-node screens write one log per node (screening_results.<node>.jsonl),
+merged into screening_results.json at the end.
+
+Usage:
+    python results_log.py ../specificity_library/screening_results/screening_results.jsonl
+    python results_log.py ../specificity_library/screening_results/screening_results.*.jsonl
+"""
+
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+RESULTS_LOG_NAME = "screening_results.jsonl"
+
+
+def record_key(entry: Dict):
+    """Identity of a job across runs: variant, test nucleotide and tier."""
+    return (entry['variant_id'], entry['test_nucleotide'], entry.get('tier'))
+
+
+class ResultsLog:
+    """Append-only, fsync-per-record JSONL writer."""
+
+    def __init__(self, log_file):
+        self.path = Path(log_file)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, 'a')
+        self._lock = threading.Lock()
+        if self._f.tell() and not self._ends_with_newline():
+            # Line cut off by a crash: end it so the next entry starts a line of its own
+            self._f.write("\n")
+            self._f.flush()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _append(self, entry: Dict):
+        with self._lock:
+            self._f.write(json.dumps(entry) + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def start_run(self, mode: str, total_predictions: int, resume: bool = False,
+                  screen_id: Optional[str] = None):
+        entry = {
+            "type": "run",
+            "timestamp": datetime.now().isoformat(),
+            "mode": mode,
+            "total_predictions": total_predictions,
+            "resume": resume,
+        }
+        if screen_id is not None:
+            entry["screen_id"] = screen_id
+        self._append(entry)
+
+    def append_result(self, index: int, record: Dict):
+        self._append({"type": "result", "index": index, "record": record})
+
+    def append_failure(self, index: int, config_info: Dict, **details):
+        entry = {
+            "type": "failure",
+            "index": index,
+            "variant_id": config_info['variant_id'],
+            "test_nucleotide": config_info['test_nucleotide'],
+        }
+        entry.update({k: v for k, v in details.items() if v is not None})
+        self._append(entry)
+
+    def append_event(self, event: str, **fields):
+        """Runner event (e.g. disk watchdog pause), safe to call from worker threads."""
+        entry = {"type": "event", "event": event, "timestamp": datetime.now().isoformat()}
+        entry.update(fields)
+        self._append(entry)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_log(log_file, start: int = 0) -> Iterator[Dict]:
+    """
+    Iterate log entries from byte offset start (see run_offsets), skipping a
+    truncated trailing line from a crash.
+    """
+    with open(log_file, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def run_offsets(log_file) -> List[int]:
+    """Byte offsets of the run header lines of a log, in order."""
+    offsets = []
+    position = 0
+    with open(log_file, 'rb') as f:
+        for line in f:
+            if line.startswith(b'{"type": "run"'):
+                offsets.append(position)
+            position += len(line)
+    return offsets
+
+
+def node_log_path(results_dir, node_id) -> Path:
+    """Per-node results log of a multi-node screen (see shared_queue.py)."""
+    return Path(results_dir) / f"screening_results.{node_id}.jsonl"
+
+
+def node_log_paths(results_dir):
+    """All per-node results logs in a results directory, sorted by node."""
+    return sorted(Path(results_dir).glob("screening_results.*.jsonl"))
+
+
+def _latest_entries(log_file, screen_id: Optional[str] = None, all_runs: bool = False):
+    """
+    Latest entry per job in the current runs of one log, plus their last and
+    first run headers.
+
+    The current runs are those of screen_id if given; otherwise the last run
+    and, while a run is a resume, the runs before it (a run header without
+    "resume" starts over). all_runs reads every run.
+    """
+    latest = {}
+    last_run = {}
+    first_timestamp = None
+    current = True
+    for entry in iter_log(log_file):
+        kind = entry.get('type')
+        if kind == 'run':
+            if screen_id is not None:
+                current = entry.get('screen_id') == screen_id
+            elif not entry.get('resume') and not all_runs:
+                latest = {}
+                first_timestamp = None
+            if current:
+                last_run = entry
+                first_timestamp = first_timestamp or entry['timestamp']
+        elif not current:
+            continue
+        elif kind == 'result':
+            latest[record_key(entry['record'])] = entry
+        elif kind == 'failure':
+            latest[record_key(entry)] = entry
+    return latest, last_run, first_timestamp
+
+
+def latest_screen_id(log_files) -> Optional[str]:
+    """screen_id of the most recent multi-node run in the logs (None if there is none)."""
+    latest = (None, "")
+    for log_file in log_files:
+        for entry in iter_log(log_file):
+            if entry.get('type') == 'run' and entry.get('screen_id') and entry['timestamp'] > latest[1]:
+                latest = (entry['screen_id'], entry['timestamp'])
+    return latest[0]
+
+
+def load_results_log(log_file, all_runs: bool = False) -> Dict:
+    """
+    Compact a results log into the screening_results.json structure.
+
+    The latest entry per job wins, so a prediction that failed and later
+    succeeded (or was re-run on resume) is counted once. Runs before the
+    last one are read only through --resume runs (see _latest_entries),
+    unless all_runs is set (e.g. for the runtime history of the cost model).
+    """
+    return _summarize(*_latest_entries(log_file, all_runs=all_runs))
+
+
+def merge_results_logs(log_files, screen_id: Optional[str] = None) -> Dict:
+    """
+    Compact several results logs (e.g. one per node) into one structure.
+
+    Within a log the latest entry per job wins; across logs a result beats
+    a failure, and between two results the first log (in the given order)
+    wins, so the merge is deterministic. With screen_id only the runs of
+    that multi-node screen are read, so logs of earlier screens in the same
+    directory are ignored.
+    """
+    latest = {}
+    last_run = {}
+    first_timestamp = None
+    for log_file in log_files:
+        log_latest, log_run, log_first = _latest_entries(log_file, screen_id)
+        for key, entry in log_latest.items():
+            if key not in latest or (latest[key]['type'] == 'failure' and entry['type'] == 'result'):
+                latest[key] = entry
+        if log_run.get('timestamp', '') > last_run.get('timestamp', ''):
+            last_run = log_run
+        if log_first and (first_timestamp is None or log_first < first_timestamp):
+            first_timestamp = log_first
+    return _summarize(latest, last_run, first_timestamp)
+
+
+def _summarize(latest: Dict, last_run: Dict, first_timestamp) -> Dict:
+    entries = sorted(latest.values(), key=lambda e: e['index'])
+    results = [e['record'] for e in entries if e['type'] == 'result']
+    failed = sum(1 for e in entries if e['type'] == 'failure')
+    pruned = sum(1 for r in results if r.get('status') == 'pruned')
+
+    data = {
+        "timestamp": last_run.get('timestamp', first_timestamp),
+        "total_predictions": last_run.get('total_predictions', len(entries)),
+        "successful": len(results) - pruned,
+        "failed": failed,
+        "mode": last_run.get('mode'),
+        "results": results,
+    }
+    if pruned:
+        data["pruned"] = pruned
+    return data
+
+
+def compact_results_log(log_file, output_file, screen_id: Optional[str] = None, **summary) -> Dict:
+    """
+    Write screening_results.json derived from the log.
+
+    Args:
+        log_file: A results log, or a list of per-node logs to merge
+        screen_id: Multi-node screen whose runs the per-node logs are read for
+        summary: Fields overriding the derived header (e.g. total_time_seconds)
+    """
+    if isinstance(log_file, (list, tuple)):
+        derived = merge_results_logs(log_file, screen_id)
+    else:
+        derived = load_results_log(log_file)
+    derived.update({k: v for k, v in summary.items() if v is not None})
+
+    # Same key order as the original screening_results.json
+    header = ["timestamp", "total_predictions", "successful", "failed", "pruned",
+              "total_time_seconds", "mode"]
+    data = {k: derived[k] for k in header if k in derived}
+    data.update({k: v for k, v in derived.items() if k not in data and k != 'results'})
+    data['results'] = derived['results']
+
+    output_file = Path(output_file)
+    tmp = output_file.with_name(output_file.name + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, output_file)
+
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compact a screening results log into screening_results.json"
+    )
+    parser.add_argument("log_file", nargs="+",
+                        help="screening_results.jsonl (or several per-node logs to merge)")
+    parser.add_argument(
+        "--output",
+        help="Output JSON (default: screening_results.json next to the log)"
+    )
+    parser.add_argument(
+        "--screen-id",
+        help="Multi-node screen to merge the per-node logs for (default: the most recent one)"
+    )
+
+    args = parser.parse_args()
+
+    log_files = args.log_file if len(args.log_file) > 1 else args.log_file[0]
+    screen_id = args.screen_id
+    if len(args.log_file) > 1 and screen_id is None:
+        screen_id = latest_screen_id(args.log_file)
+    if args.output:
+        output = Path(args.output)
+    elif len(args.log_file) > 1:
+        output = Path(args.log_file[0]).parent / "screening_results.json"
+    else:
+        output = Path(args.log_file[0]).with_suffix(".json")
+    data = compact_results_log(log_files, output, screen_id=screen_id)
+    print(f"✓ {data['successful']} results, {data['failed']} failures -> {output}")
+
+
+if __name__ == "__main__":
+    main()
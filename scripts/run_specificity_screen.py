@@ -4,14 +4,35 @@ Run batch Boltz predictions for specificity screening.
 Tests each variant against all 4 nucleotides to assess specificity.
 """
 
-import subprocess
 import yaml
 import json
+import os
+import queue
+import shutil
+from collections import Counter
 from pathlib import Path
 import argparse
+import sys
 import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(__file__))
+from artifact_retention import COMPACT_POLICY, RetentionWorker, add_policy_arguments, policy_from_args
+from cost_model import CostModel, cpu_prior_scale, job_features, load_training_samples
+from disk_watchdog import DiskWatchdog
+from gpu_packer import GpuMemoryPacker
+from job_scheduler import lpt_order, simulate_makespan
+from prediction_cache import PredictionCache
+from results_log import ResultsLog, RESULTS_LOG_NAME, compact_results_log, node_log_paths
+from sampling_profiles import DEFAULT_GPU_MEMORY_GB, AdaptiveSampling, detect_gpu_memory_gb, profile_note
+from screen_jobs import (AFFINITY_TIER, PROFILE, build_result_record, cpu_slot_threads,
+                         extract_confidence, get_sampling_params, job_affinity)
+from screen_runners import check_options, make_runner
+
+
+# Written into a job's output directory once its result has been ingested
+COMPLETION_MARKER = ".screen_complete.json"
+
 
 def load_manifest(library_dir):
     """Load library manifest."""
@@ -19,92 +40,468 @@ def load_manifest(library_dir):
     with open(manifest_file, 'r') as f:
         return yaml.safe_load(f)
 
+def write_affinity_config(config_file, out_dir):
+    """
+    Copy of a screen config (same file name, so the same prediction stem)
+    that also requests Boltz-2 affinity for its ligand:
 
-def run_boltz_prediction(config_file, output_dir, devices=1, quick_mode=False):
+        properties:
+          - affinity:
+              binder: B
     """
-    Run a single Boltz prediction.
+    with open(config_file, 'r') as f:
+        config = yaml.safe_load(f)
+    ligand = next(entry['ligand']['id'] for entry in config['sequences'] if 'ligand' in entry)
+    config['properties'] = [{"affinity": {"binder": ligand[0] if isinstance(ligand, list) else ligand}}]
 
-    Returns:
-        (success, prediction_dir, elapsed_time)
+    out_file = Path(out_dir) / Path(config_file).name
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_file, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return out_file
+
+
+def build_jobs(library_dir, results_path, configs, tier=None, index_offset=0):
     """
-    start_time = time.time()
+    One job per manifest config, in manifest order.
 
-    # Set parameters based on mode
-    if quick_mode:
-        diffusion_samples = 1
-        sampling_steps = 50
-        recycling_steps = 1
-    else:
-        diffusion_samples = 3
-        sampling_steps = 150
-        recycling_steps = 2
-
-    cmd = [
-        "boltz", "predict", str(config_file),
-        "--out_dir", str(output_dir),
-        "--devices", str(devices),
-        "--accelerator", "gpu",
-        "--diffusion_samples", str(diffusion_samples),
-        "--sampling_steps", str(sampling_steps),
-        "--recycling_steps", str(recycling_steps),
-        "--write_full_pae"
-    ]
+    Args:
+        tier: Screening tier label ("quick"/"production") for tiered runs
+        index_offset: Added to job indices so tiers sort after each other
+    """
+    jobs = []
+    for i, config_info in enumerate(configs):
+        test_nuc = config_info['test_nucleotide']
+        variant_id = config_info['variant_id']
+        jobs.append({
+            "index": index_offset + i,
+            "config_info": config_info,
+            "config_file": Path(library_dir) / "configs_with_msas" / Path(config_info['config_file']).name,
+            "output_dir": results_path / f"{variant_id}_vs_{test_nuc}",
+            "tier": tier,
+        })
+    return jobs
 
+
+def job_settings(job, sampling):
+    """
+    Settings a job's prediction depends on besides its config: the sampling
+    parameters it requested (the prediction cache key's inputs) and its
+    sampling profile.
+    """
+    profile = job.get('sampling_profile')
+    return {"sampling": job.get('sampling') or sampling,
+            "sampling_profile": profile['profile'] if profile else None}
+
+
+def write_completion_marker(output_dir, record, settings):
+    """
+    Mark a job complete; written atomically after its result is ingested.
+    settings (from job_settings) let --resume tell quick-mode or other-profile
+    predictions from ones matching the current run.
+    """
+    marker = Path(output_dir) / COMPLETION_MARKER
+    tmp = marker.with_name(marker.name + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump({"completed": datetime.now().isoformat(), "settings": settings, "record": record},
+                  f, indent=2)
+    os.replace(tmp, marker)
+
+
+def load_completed_job(job, settings):
+    """
+    Re-ingest a job finished by an earlier run.
+
+    A job counts as complete only if it has a completion marker written with
+    the same settings (job_settings) as the current run AND its prediction
+    directory still holds confidence outputs. A quick-mode prediction is
+    therefore never re-ingested by a production resume.
+
+    Returns:
+        Result record with freshly extracted confidence, or None
+    """
+    marker = Path(job['output_dir']) / COMPLETION_MARKER
+    if not marker.exists():
+        return None
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 minute timeout per prediction
-        )
+        with open(marker, 'r') as f:
+            completed = json.load(f)
+        previous = completed['record']
+    except (json.JSONDecodeError, KeyError, OSError):
+        return None
+    if completed.get('settings') != settings:
+        return None
 
-        elapsed = time.time() - start_time
+    pred_dir = Path(previous['prediction_dir'])
+    if not pred_dir.exists():
+        return None
+    confidence = extract_confidence(pred_dir)
+    if confidence is None:
+        return None
+
+    record = build_result_record(job['config_info'], pred_dir, confidence, previous['elapsed_time'],
+                                 tier=job.get('tier'), affinity=job_affinity(job, pred_dir))
+    if previous.get('job_features'):
+        record['job_features'] = previous['job_features']
+    return record
+
+
+def available_cores():
+    """CPU cores this process may run on (respects taskset, cgroups and Slurm)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def make_cpu_pool(workers, cores=None):
+    """
+    Queue of CPU slots "cpu<slot>:<threads>", one per worker, splitting the
+    cores as evenly as possible: the workers' thread counts add up to at
+    most the cores available, so concurrent jobs never oversubscribe them.
+    """
+    cores = cores or available_cores()
+    workers = max(1, min(workers, cores))
+    pool = queue.Queue()
+    for slot in range(workers):
+        threads = cores // workers + (1 if slot < cores % workers else 0)
+        pool.put(f"cpu{slot}:{threads}")
+    return pool
+
+
+def make_device_pool(workers, gpu_ids=None):
+    """
+    Queue of device IDs, one entry per worker slot.
+
+    With a single worker and no explicit GPU list, no pinning is done.
+    """
+    if gpu_ids is None:
+        if workers == 1:
+            return None
+        gpu_ids = list(range(workers))
+
+    pool = queue.Queue()
+    for slot in range(workers):
+        pool.put(gpu_ids[slot % len(gpu_ids)])
+    return pool
+
+
+def select_promoted_variants(records, promote_margin=0.0):
+    """
+    Variants whose quick-tier selectivity earns a production re-run.
+
+    A variant is promoted when its target confidence exceeds its best
+    off-target confidence by at least promote_margin (selectivity_conf in
+    analyze_specificity.py). Variants without a complete quick panel are
+    not promoted.
+    """
+    from analyze_specificity import calculate_specificity_scores
 
-        if result.returncode == 0:
-            # Find prediction directory
-            output_path = Path(output_dir)
-            pred_dirs = list(output_path.glob("boltz_results_*"))
-            if pred_dirs:
-                return True, pred_dirs[0], elapsed
-            else:
-                return False, None, elapsed
+    scored = calculate_specificity_scores({'results': records})
+    promoted = scored['panel_complete'] & (scored['selectivity_conf'] >= promote_margin)
+    return set(scored.loc[promoted, 'variant_id'])
+
+
+def select_affinity_candidates(records, top_n):
+    """
+    Variants shortlisted for affinity re-runs: the top_n per target
+    nucleotide by combined_score (the analyze_specificity.py ranking)
+    among variants with a complete off-target panel.
+
+    Returns:
+        {target nucleotide: [variant_id, ...]} best first
+    """
+    from analyze_specificity import calculate_specificity_scores
+
+    scored = calculate_specificity_scores({'results': records})
+    ranked = scored[scored['panel_complete']].sort_values('combined_score', ascending=False)
+    top = ranked.groupby('target_nucleotide', sort=True).head(top_n)
+    return {nuc: list(group['variant_id']) for nuc, group in top.groupby('target_nucleotide')}
+
+
+def target_passes(record, min_confidence=None, min_iptm=None):
+    """Whether a target-nucleotide result clears the target-first thresholds."""
+    confidence = record.get('confidence') if record else None
+    if not confidence:
+        return False
+    if min_confidence is not None and confidence['confidence_score'] < min_confidence:
+        return False
+    if min_iptm is not None and confidence['ligand_iptm'] < min_iptm:
+        return False
+    return True
+
+
+def build_pruned_record(config_info, reason, tier=None):
+    """Result record for an off-target job skipped by target-first scheduling."""
+    record = build_result_record(config_info, None, None, None, tier=tier)
+    record['prediction_dir'] = None
+    record['status'] = 'pruned'
+    record['prune_reason'] = reason
+    return record
+
+
+def run_target_first(jobs, results_log, min_confidence=None, min_iptm=None, **tier_kwargs):
+    """
+    Run every variant's target job first, then off-targets only for
+    variants whose target prediction clears the thresholds.
+
+    Off-target jobs of the other variants are logged as "pruned" records
+    (no prediction, confidence None) so the panel gap is explicit.
+
+    Returns:
+        (results by job index, success_count, fail_count, pruned_count)
+    """
+    adaptive = tier_kwargs.get('adaptive')
+    if adaptive is not None:
+        # Profiles per whole panel, so off-targets match their target's settings
+        adaptive.assign(jobs, tier_kwargs.get('quick_mode', False))
+
+    target_jobs = [job for job in jobs if job['config_info']['is_target']]
+    off_target_jobs = [job for job in jobs if not job['config_info']['is_target']]
+
+    print(f"TARGET-FIRST: {len(target_jobs)} target predictions before "
+          f"{len(off_target_jobs)} off-targets\n")
+    results, success_count, fail_count = run_tier(target_jobs, results_log, **tier_kwargs)
+
+    target_results = {job['config_info']['variant_id']: results.get(job['index'])
+                      for job in target_jobs}
+    passing = {variant_id for variant_id, record in target_results.items()
+               if target_passes(record, min_confidence, min_iptm)}
+
+    runnable = []
+    pruned_count = 0
+    for job in off_target_jobs:
+        variant_id = job['config_info']['variant_id']
+        if variant_id in passing:
+            runnable.append(job)
+            continue
+        reason = "target_below_threshold" if target_results.get(variant_id) else "target_failed"
+        record = build_pruned_record(job['config_info'], reason, tier=job.get('tier'))
+        results[job['index']] = record
+        results_log.append_result(job['index'], record)
+        pruned_count += 1
+
+    print(f"\nTARGET-FIRST: {len(passing)}/{len(target_results)} variants pass; "
+          f"{pruned_count} off-target predictions pruned, {len(runnable)} to run\n")
+    off_results, off_success, off_fail = run_tier(runnable, results_log, **tier_kwargs)
+    results.update(off_results)
+
+    return results, success_count + off_success, fail_count + off_fail, pruned_count
+
+
+def estimate_screen_seconds(jobs, quick_mode, cost_model, accelerator="gpu", adaptive=None):
+    """Predicted device seconds for a set of jobs (configs that exist)."""
+    sampling = get_sampling_params(quick_mode, accelerator)
+    if adaptive is not None:
+        adaptive.assign(jobs, quick_mode)
+    return float(cost_model.predict_many([job_features(job['config_file'], job.get('sampling', sampling))
+                                          for job in jobs if job['config_file'].exists()]).sum())
+
+
+def run_tier(jobs, results_log, runner, quick_mode=False, resume=False, cache=None,
+             cost_model=None, schedule="lpt", retention=None, adaptive=None, watchdog=None):
+    """
+    Run one set of jobs (a whole screen, or one tier of a tiered screen) on
+    an execution backend (runner, see screen_runners.py).
+
+    With a cost_model, each job gets a predicted-runtime timeout, a live ETA
+    is printed, and the model is refitted as jobs finish (pending jobs pick
+    up the refreshed timeouts). With schedule="lpt" jobs (or shards) are
+    dispatched longest-predicted-first and the runner re-sorts its pending
+    work on every refit; "manifest" keeps manifest order.
+    With a retention worker (artifact_retention.RetentionWorker), each
+    ingested job's outputs are trimmed in the background. With adaptive
+    (sampling_profiles.AdaptiveSampling), jobs without a sampling profile
+    get one per variant and run, are cached and are costed at its settings.
+    With a watchdog (disk_watchdog.DiskWatchdog), each job (or shard) waits
+    for disk space before it is launched and ingested outputs are reported
+    to it for measurement and emergency cleanup.
+
+    Returns:
+        (results by job index, success_count, fail_count)
+    """
+    if adaptive is not None:
+        adaptive.assign([job for job in jobs if 'sampling_profile' not in job], quick_mode)
+        profiles = Counter(job['sampling_profile']['profile'] for job in jobs if 'sampling_profile' in job)
+        print(f"SAMPLING PROFILES ({adaptive.memory_gb:.0f} GB GPUs): "
+              + ", ".join(f"{name} {count}" for name, count in sorted(profiles.items())) + "\n")
+
+    results = {}
+    success_count = 0
+    fail_count = 0
+
+    runnable = []
+    resumed = 0
+    sampling = get_sampling_params(quick_mode, runner.accelerator)
+    for job in jobs:
+        if resume:
+            record = load_completed_job(job, job_settings(job, sampling))
+            if record is not None:
+                results[job['index']] = record
+                results_log.append_result(job['index'], record)
+                if retention is not None:
+                    retention.submit(record['prediction_dir'], job['config_file'])
+                if watchdog is not None:
+                    watchdog.ingested(record['prediction_dir'], job['config_file'])
+                success_count += 1
+                resumed += 1
+                continue
+            # Partial outputs would make boltz skip the input; start clean
+            # (shared queue: cleaned once claimed, another node may be running it)
+            if runner.exclusive_outputs and job['output_dir'].exists():
+                shutil.rmtree(job['output_dir'])
+
+        if job['config_file'].exists():
+            runnable.append(job)
         else:
-            print(f"  ERROR: {result.stderr[:200]}")
-            return False, None, elapsed
+            print(f"  ERROR: Config not found: {job['config_file'].name}")
+            results_log.append_failure(job['index'], job['config_info'], reason="config_not_found",
+                                       tier=job.get('tier'))
+            fail_count += 1
+
+    if resume:
+        print(f"RESUME: {resumed} completed predictions re-ingested, {len(runnable)} to run\n")
 
-    except subprocess.TimeoutExpired:
-        print(f"  TIMEOUT after 10 minutes")
-        return False, None, time.time() - start_time
-    except Exception as e:
-        print(f"  EXCEPTION: {str(e)[:200]}")
-        return False, None, time.time() - start_time
+    # Serve identical jobs from the prediction cache
+    if cache is not None:
+        misses = []
+        for job in runnable:
+            hit = cache.fetch(job['config_file'], job['output_dir'], job.get('sampling', sampling))
+            if hit is None:
+                misses.append(job)
+                continue
+            confidence = extract_confidence(hit['prediction_dir'])
+            record = build_result_record(job['config_info'], hit['prediction_dir'], confidence,
+                                         hit['elapsed'], tier=job.get('tier'),
+                                         affinity=job_affinity(job, hit['prediction_dir']))
+            record['cache_hit'] = True
+            results[job['index']] = record
+            results_log.append_result(job['index'], record)
+            write_completion_marker(job['output_dir'], record, job_settings(job, sampling))
+            if retention is not None:
+                retention.submit(hit['prediction_dir'], job['config_file'])
+            if watchdog is not None:
+                watchdog.ingested(hit['prediction_dir'], job['config_file'])
+            success_count += 1
+        print(f"CACHE: {len(runnable) - len(misses)} hits, {len(misses)} to predict "
+              f"({len(cache)} entries in {cache.root})\n")
+        runnable = misses
 
+    def refresh_predictions(pending_jobs):
+        """Predicted runtime and timeout of each pending job; returns their sum."""
+        features = [j['features'] for j in pending_jobs]
+        for pending_job, predicted, timeout in zip(pending_jobs, cost_model.predict_many(features),
+                                                   cost_model.timeout_many(features)):
+            pending_job['predicted'] = float(predicted)
+            pending_job['timeout'] = float(timeout)
+        return sum(j['predicted'] for j in pending_jobs)
 
-def extract_confidence(prediction_dir):
-    """Extract confidence metrics from prediction directory."""
-    pred_path = Path(prediction_dir)
+    remaining = {}
+    remaining_seconds = 0.0
+    cpu_threads = None
+    if runner.accelerator == "cpu" and runner.device_pool is not None:
+        cpu_threads = min(cpu_slot_threads(slot) for slot in runner.device_pool.queue)
+    if cost_model is not None:
+        with PROFILE.phase("cost_model"):
+            for job in runnable:
+                job['features'] = job_features(job['config_file'], job.get('sampling', sampling),
+                                               runner.accelerator, cpu_threads)
+                remaining[job['index']] = job
+            remaining_seconds = refresh_predictions(runnable)
 
-    # Find confidence JSON files
-    confidence_files = list(pred_path.rglob("confidence_*_model_*.json"))
+    # Longest-processing-time-first dispatch on predicted runtime
+    cost_fn = None
+    if schedule == "lpt" and cost_model is not None:
+        def cost_fn(item):
+            return sum(job['predicted'] for job in item)
 
-    if not confidence_files:
-        return None
+        runnable = lpt_order(runnable, lambda job: cost_fn([job]))
+        if runnable:
+            costs = [cost_fn([job]) for job in runnable]
+            manifest_costs = [cost_fn([job]) for job in sorted(runnable, key=lambda j: j['index'])]
+            print(f"SCHEDULE: LPT over {runner.workers} workers, predicted makespan "
+                  f"{simulate_makespan(costs, runner.workers) / 60:.1f} min "
+                  f"(manifest order: {simulate_makespan(manifest_costs, runner.workers) / 60:.1f} min)\n")
+
+    outcome_batches = runner.run(runnable, quick_mode, cost_fn, watchdog)
+    dispatch_start = time.perf_counter()
+    done = 0
+    try:
+        # Collect in completion order
+        for outcomes in outcome_batches:
+            for job, record, elapsed, device_id, failure in outcomes:
+                ingest_start = time.perf_counter()
+                PROFILE.add("prediction", elapsed)
+                done += 1
+                config_info = job['config_info']
+                is_target = config_info['is_target']
+                device_note = f" (GPU {device_id})" if device_id is not None else ""
+                tier_note = f" ({job['tier']})" if job.get('tier') else ""
+
+                print(f"\n[{done}/{len(runnable)}] {config_info['variant_id']} vs {config_info['test_nucleotide']} "
+                      f"{'[TARGET]' if is_target else '[OFF-TARGET]'}{tier_note}")
+                print(f"  Config: {job['config_file'].name}")
+                if job.get('sampling_profile'):
+                    print(f"  Profile: {profile_note(job)}")
+
+                if remaining.pop(job['index'], None) is not None:
+                    remaining_seconds -= job['predicted']
+                if record is not None:
+                    retry_note = f" after {record['attempts']} attempts" if record.get('attempts') else ""
+                    print(f"  ✓ Success in {elapsed:.1f}s{device_note}{retry_note}")
+                    if job.get('features'):
+                        # Features of the settings actually run (retries may reduce sampling)
+                        record['job_features'] = dict(job['features'], **{
+                            k: v for k, v in record.get('sampling', {}).items() if k in job['features']})
+                    results[job['index']] = record
+                    results_log.append_result(job['index'], record)
+                    write_completion_marker(job['output_dir'], record, job_settings(job, sampling))
+                    if cache is not None and 'sampling' not in record:
+                        cache.put(job['config_file'], job.get('sampling', sampling),
+                                  record['prediction_dir'], elapsed)
+                    if retention is not None:
+                        retention.submit(record['prediction_dir'], job['config_file'])
+                    if watchdog is not None:
+                        watchdog.ingested(record['prediction_dir'], job['config_file'])
+                    success_count += 1
 
-    # Use best model (model_0)
-    best_conf_file = None
-    for cf in confidence_files:
-        if "model_0" in cf.name:
-            best_conf_file = cf
-            break
+                    # Print key metrics
+                    confidence = record['confidence']
+                    if confidence:
+                        print(f"  Confidence: {confidence['confidence_score']:.3f}")
+                        print(f"  Ligand iPTM: {confidence['ligand_iptm']:.3f}")
+                else:
+                    print(f"  ✗ Failed{device_note} [{failure['failure_class']}] "
+                          f"after {failure['attempts']} attempt(s)")
+                    results_log.append_failure(job['index'], config_info, reason="prediction_failed",
+                                               tier=job.get('tier'), **failure)
+                    fail_count += 1
 
-    if not best_conf_file:
-        best_conf_file = confidence_files[0]
+                if cost_model is not None:
+                    if record is not None and cost_model.observe(record['job_features'], elapsed):
+                        remaining_seconds = refresh_predictions(list(remaining.values()))
+                        if cost_fn is not None:
+                            # Re-sort what has not been dispatched yet
+                            runner.reprioritize(list(remaining.values()), cost_fn)
+                    if remaining:
+                        eta = max(remaining_seconds, 0.0) / runner.workers
+                        print(f"  ETA: {eta / 60:.1f} minutes ({len(remaining)} remaining)")
+                PROFILE.add("ingestion", time.perf_counter() - ingest_start)
+    finally:
+        outcome_batches.close()
+        PROFILE.add("dispatch", time.perf_counter() - dispatch_start, count=done)
 
-    with open(best_conf_file, 'r') as f:
-        return json.load(f)
+    runner.collect(jobs, results)
+    return results, success_count, fail_count
 
 
-def run_batch_predictions(library_dir, results_dir, quick_mode=False, limit=None):
+def run_batch_predictions(library_dir, results_dir, quick_mode=False, limit=None,
+                          workers=1, gpu_ids=None, backend="threads", backend_options=None,
+                          resume=False, cache_dir=None, tiered=False, promote_margin=0.0,
+                          target_first=False, min_target_confidence=None, min_target_iptm=None,
+                          cost_history=None, estimate_only=False, schedule="lpt",
+                          accelerator="gpu", retention=None, adaptive_sampling=False,
+                          gpu_memory_gb=None, pack_gpus=False, min_free_gb=None,
+                          resume_free_gb=None, affinity_top_n=None):
     """
     Run predictions for all variant-nucleotide combinations.
 
@@ -113,119 +510,350 @@ def run_batch_predictions(library_dir, results_dir, quick_mode=False, limit=None
         results_dir: Results output directory
         quick_mode: Use faster settings
         limit: Limit number of predictions (for testing)
+        workers: Number of concurrent `boltz predict` subprocesses
+        gpu_ids: Devices to pin workers to (default: 0..workers-1)
+        backend: Execution backend (screen_runners.RUNNERS):
+            "threads" (default; a thread per running job), "shards"
+            (several configs per `boltz predict` invocation), "async" (one
+            asyncio event loop streaming Boltz output to per-job logs and
+            progress events to screen_events.jsonl), "spool" (persistent
+            boltz_worker daemons) or "shared" (multi-node: claim jobs through
+            leases in <results_dir>/queue with other nodes running the same
+            command on a shared filesystem; each node logs to
+            screening_results.<node_id>.jsonl and the logs of this screen
+            are merged at the end)
+        backend_options: Settings of the backend: shard_size ("shards");
+            spool_dir, library_name (default: the library directory's
+            name), share_weight and share_priority ("spool", see
+            fair_share.py); node_id ("shared", default: hostname-pid)
+        resume: Skip jobs completed by a previous run (completion marker +
+            outputs present) and re-ingest their confidence; without it the
+            results of earlier runs in results_dir are not compacted into
+            screening_results.json
+        cache_dir: Content-addressed prediction cache; identical jobs from
+            any earlier library or run are linked/copied instead of predicted
+        tiered: Run every config in quick mode, then re-run only variants
+            passing promote_margin at production settings (overrides quick_mode)
+        promote_margin: Minimum quick-tier selectivity (target confidence -
+            max off-target confidence) for promotion to production
+        target_first: Run all target-nucleotide jobs first and prune the
+            off-target jobs of variants below min_target_confidence /
+            min_target_iptm (in tiered mode, applied to the quick tier)
+        cost_history: Extra screening_results.json/.jsonl files to fit the
+            runtime cost model on (this results directory's log is always used)
+        estimate_only: Print the cost-model estimate for the manifest and
+            return it without running anything
+        schedule: "lpt" (longest predicted runtime first, re-sorted as the
+            cost model is refitted) or "manifest" (manifest order)
+        accelerator: "gpu", or "cpu" to run on CPU cores: each of the
+            `workers` jobs gets an equal share of the cores as its
+            OMP/MKL thread count (workers are capped at the core count), and
+            CPU sampling settings and a CPU cost model are used
+        retention: RetentionPolicy applied to each job's outputs in a
+            background thread once its result is ingested (artifact_retention.py)
+        adaptive_sampling: Choose sampling settings per variant from its token
+            count and the GPU memory instead of the fixed quick/production
+            settings (sampling_profiles.py)
+        gpu_memory_gb: GPU memory for adaptive sampling and packing (default:
+            smallest GPU reported by nvidia-smi, else DEFAULT_GPU_MEMORY_GB)
+        pack_gpus: Run up to `workers` jobs spread over gpu_ids (default: GPU
+            0) with several jobs per GPU while their estimated peak memory
+            fits gpu_memory_gb, backing off after CUDA OOM (gpu_packer.py)
+        min_free_gb: Pause job admission while the results volume has less
+            free space (plus one job's output), trimming ingested outputs with
+            the retention policy (compact if none); pauses are logged to the
+            results log (disk_watchdog.py)
+        resume_free_gb: Free space at which admission resumes
+            (default: 1.25 x min_free_gb)
+        affinity_top_n: After the structure-only screen, re-run the full
+            nucleotide panel of the top N variants per target nucleotide
+            (by combined_score) with Boltz-2 affinity enabled, as tier
+            "affinity" (configs under <results_dir>/affinity/configs); the
+            affinity values feed the fold-selectivity metrics of
+            analyze_specificity.py
+
+    Options a backend cannot honour (e.g. pack_gpus with "async", or
+    affinity_top_n with "spool") raise ValueError, see Runner.unsupported.
     """
     print("="*80)
     print("SPECIFICITY SCREENING - BATCH PREDICTIONS")
     print("="*80)
     print()
 
+    if accelerator == "cpu" and (gpu_ids or adaptive_sampling or pack_gpus):
+        raise ValueError("CPU runs split cores across local subprocesses; --gpu-ids, "
+                         "--adaptive-sampling and --pack-gpus size jobs to GPUs")
+    check_options(backend, {
+        "--accelerator cpu": accelerator == "cpu",
+        "--pack-gpus": pack_gpus,
+        "--min-free-gb": min_free_gb is not None,
+        "--affinity-top-n": bool(affinity_top_n),
+    }, backend_options)
+
     library_path = Path(library_dir)
     results_path = Path(results_dir)
     results_path.mkdir(parents=True, exist_ok=True)
 
+    PROFILE.reset()
+
     # Load manifest
-    manifest = load_manifest(library_dir)
+    with PROFILE.phase("manifest_io"):
+        manifest = load_manifest(library_dir)
     configs = manifest['configs']
 
     if limit:
         configs = configs[:limit]
         print(f"LIMIT MODE: Running only {limit} predictions\n")
 
+    mode = "tiered" if tiered else ("quick" if quick_mode else "production")
     total = len(configs)
-    print(f"Total predictions to run: {total}")
-    print(f"Mode: {'QUICK' if quick_mode else 'PRODUCTION'}")
-    print(f"Estimated time: {total * (3 if quick_mode else 8)} minutes\n")
-
-    # Run predictions
-    results = []
-    success_count = 0
-    fail_count = 0
+    prior_scale = 1.0
+    memory_gb = None
+    if adaptive_sampling or pack_gpus:
+        memory_gb = gpu_memory_gb or detect_gpu_memory_gb(gpu_ids) or DEFAULT_GPU_MEMORY_GB
+    if accelerator == "cpu":
+        cores = available_cores()
+        if workers > cores:
+            print(f"WARNING: {workers} workers on {cores} cores; running {cores} jobs at a time\n")
+            workers = cores
+        device_pool = make_cpu_pool(workers, cores)
+        prior_scale = cpu_prior_scale(cores // workers)
+    elif pack_gpus:
+        device_pool = GpuMemoryPacker(gpu_ids or ["0"], memory_gb)
+    else:
+        device_pool = make_device_pool(workers, gpu_ids)
 
-    start_time = time.time()
+    options = dict(backend_options or {})
+    if backend == "spool":
+        options.setdefault("library_name", library_path.resolve().name)
+    runner = make_runner(backend, results_path, workers, device_pool, accelerator, resume, **options)
+    workers = runner.workers
 
-    for i, config_info in enumerate(configs, 1):
-        config_file = Path(library_dir) / "configs_with_msas" / Path(config_info['config_file']).name
-        variant_id = config_info['variant_id']
-        test_nuc = config_info['test_nucleotide']
-        is_target = config_info['is_target']
+    print(f"Total predictions to run: {total}")
+    print(f"Mode: {mode.upper()}")
+    if tiered:
+        print(f"Promotion margin: selectivity >= {promote_margin:+.3f}")
+    if target_first:
+        print(f"Target-first pruning: confidence >= {min_target_confidence}, "
+              f"ligand iPTM >= {min_target_iptm}")
+    if affinity_top_n:
+        print(f"Affinity re-runs: top {affinity_top_n} variants per nucleotide")
+    if runner.local_devices:
+        if accelerator == "cpu":
+            print(f"Workers: {workers} on CPU ({cores} cores; threads per job: "
+                  f"{sorted({cpu_slot_threads(slot) for slot in device_pool.queue})})")
+        elif pack_gpus:
+            print(f"Workers: {workers} packed by memory onto GPUs {device_pool.device_ids} "
+                  f"({memory_gb:.0f} GB, planning budget {device_pool.budget[device_pool.device_ids[0]]:.1f} GB)")
+        elif device_pool is not None:
+            print(f"Workers: {workers} (devices: {sorted(device_pool.queue)})")
+    backend_note = runner.describe()
+    if backend_note:
+        print(backend_note)
+    adaptive = None
+    if adaptive_sampling:
+        adaptive = AdaptiveSampling(memory_gb)
+        print(f"Sampling: adaptive profiles for {adaptive.memory_gb:.0f} GB GPUs "
+              f"(planning budget {adaptive.budget_gb:.1f} GB)")
 
-        print(f"\n[{i}/{total}] {variant_id} vs {test_nuc} {'[TARGET]' if is_target else '[OFF-TARGET]'}")
-        print(f"  Config: {config_file.name}")
+    # Runtime cost model fitted on recorded elapsed times
+    with PROFILE.phase("cost_model"):
+        cost_model = CostModel(prior_scale=prior_scale).fit(load_training_samples(
+            [results_path / RESULTS_LOG_NAME] + node_log_paths(results_path) + list(cost_history or []),
+            accelerator))
+        print(f"Cost model: {cost_model.summary()}")
+        estimate_jobs = build_jobs(library_path, results_path, configs)
+        if tiered:
+            estimated_seconds = (
+                estimate_screen_seconds(estimate_jobs, True, cost_model, accelerator, adaptive) +
+                estimate_screen_seconds(estimate_jobs, False, cost_model, accelerator, adaptive))
+        else:
+            estimated_seconds = estimate_screen_seconds(estimate_jobs, quick_mode, cost_model,
+                                                        accelerator, adaptive)
+    bound_note = " (upper bound: no pruning/promotion filtering)" if tiered or target_first else ""
+    if affinity_top_n:
+        bound_note += " (structure screen only; affinity re-runs not included)"
+    print(f"Estimated {accelerator.upper()} time: {estimated_seconds / 3600:.1f} hours{bound_note}")
+    print(f"Estimated time: {estimated_seconds / workers / 60:.0f} minutes with {workers} workers\n")
 
-        if not config_file.exists():
-            print(f"  ERROR: Config not found!")
-            fail_count += 1
-            continue
+    if estimate_only:
+        return {
+            "mode": mode,
+            "total_predictions": total,
+            "estimated_gpu_seconds": estimated_seconds,
+            "estimated_wall_seconds": estimated_seconds / workers,
+        }
 
-        # Run prediction
-        output_dir = results_path / f"{variant_id}_vs_{test_nuc}"
-        success, pred_dir, elapsed = run_boltz_prediction(
-            config_file, output_dir, devices=1, quick_mode=quick_mode
-        )
+    start_time = time.time()
 
-        if success:
-            print(f"  ✓ Success in {elapsed:.1f}s")
+    # Append-only, fsync'd result log; screening_results.json is compacted from it
+    results_log = ResultsLog(runner.results_log_path())
+    runner.start()
+    results_log.start_run(mode, total, resume=resume, screen_id=runner.screen_id)
 
-            # Extract confidence
-            confidence = extract_confidence(pred_dir)
+    cache = PredictionCache(cache_dir) if cache_dir else None
+    retention_worker = None
+    if retention is not None and retention.active:
+        print(f"Retention: {retention}\n")
+        retention_worker = RetentionWorker(retention).start()
+    watchdog = None
+    if min_free_gb is not None:
+        # With a retention worker every ingested job is trimmed already
+        watchdog = DiskWatchdog(results_path, min_free_gb, resume_free_gb,
+                                cleanup_policy=None if retention_worker is not None else COMPACT_POLICY,
+                                log=results_log.append_event)
+        print(f"Disk watchdog: pausing below {min_free_gb:.1f} GB free "
+              f"(now {watchdog.summary()['free_gb']:.1f} GB)\n")
+    tier_kwargs = dict(runner=runner, resume=resume, cache=cache, cost_model=cost_model,
+                       schedule=schedule, retention=retention_worker, adaptive=adaptive,
+                       watchdog=watchdog)
 
-            result = {
-                "variant_id": variant_id,
-                "target_nucleotide": config_info['target_nucleotide'],
-                "test_nucleotide": test_nuc,
-                "is_target": is_target,
-                "mutations": config_info['mutations'],
-                "prediction_dir": str(pred_dir),
-                "confidence": confidence,
-                "elapsed_time": elapsed
-            }
+    def run_screen(jobs, quick):
+        if target_first:
+            return run_target_first(jobs, results_log, min_target_confidence, min_target_iptm,
+                                    quick_mode=quick, **tier_kwargs)
+        return run_tier(jobs, results_log, quick_mode=quick, **tier_kwargs) + (0,)
 
-            results.append(result)
-            success_count += 1
+    try:
+        if tiered:
+            print(f"{'='*80}\nTIER 1: QUICK SCREEN ({total} predictions)\n{'='*80}\n")
+            quick_jobs = build_jobs(library_path, results_path / "quick", configs, tier="quick")
+            quick_results, success_count, fail_count, pruned_count = run_screen(quick_jobs, True)
 
-            # Print key metrics
-            if confidence:
-                print(f"  Confidence: {confidence['confidence_score']:.3f}")
-                print(f"  Ligand iPTM: {confidence['ligand_iptm']:.3f}")
+            promoted = select_promoted_variants(list(quick_results.values()), promote_margin)
+            production_configs = [c for c in configs if c['variant_id'] in promoted]
+            n_variants = len({c['variant_id'] for c in configs})
+            total += len(production_configs)
 
+            print(f"\n{'='*80}\nTIER 2: PRODUCTION RE-RUN "
+                  f"({len(promoted)}/{n_variants} variants promoted, "
+                  f"{len(production_configs)} predictions)\n{'='*80}\n")
+            production_jobs = build_jobs(library_path, results_path / "production", production_configs,
+                                         tier="production", index_offset=len(configs))
+            production_results, tier_success, tier_fail = run_tier(
+                production_jobs, results_log, quick_mode=False, **tier_kwargs)
+            success_count += tier_success
+            fail_count += tier_fail
+            structure_records = list(quick_results.values()) + list(production_results.values())
         else:
-            print(f"  ✗ Failed")
-            fail_count += 1
+            jobs = build_jobs(library_path, results_path, configs)
+            structure_results, success_count, fail_count, pruned_count = run_screen(jobs, quick_mode)
+            structure_records = list(structure_results.values())
 
-        # Save intermediate results
-        if i % 10 == 0 or i == total:
-            intermediate_file = results_path / "results_intermediate.json"
-            with open(intermediate_file, 'w') as f:
-                json.dump(results, f, indent=2)
+        if affinity_top_n:
+            shortlist = select_affinity_candidates(structure_records, affinity_top_n)
+            shortlisted = {v for variants in shortlist.values() for v in variants}
+            affinity_configs = [c for c in configs if c['variant_id'] in shortlisted]
 
-    total_time = time.time() - start_time
+            print(f"\n{'='*80}\nAFFINITY RE-RUN ({len(shortlisted)} shortlisted variants, "
+                  f"{len(affinity_configs)} predictions)\n{'='*80}\n")
+            for nuc, variants in sorted(shortlist.items()):
+                print(f"  {nuc}: {', '.join(variants)}")
+            print()
+            affinity_jobs = build_jobs(library_path, results_path / AFFINITY_TIER, affinity_configs,
+                                       tier=AFFINITY_TIER, index_offset=total)
+            for job in affinity_jobs:
+                if job['config_file'].exists():
+                    job['config_file'] = write_affinity_config(
+                        job['config_file'], results_path / AFFINITY_TIER / "configs")
+            total += len(affinity_configs)
+            # Same settings as the screen's final tier
+            _, tier_success, tier_fail = run_tier(
+                affinity_jobs, results_log, quick_mode=quick_mode and not tiered, **tier_kwargs)
+            success_count += tier_success
+            fail_count += tier_fail
+    finally:
+        results_log.close()
+        runner.close()
+        if retention_worker is not None:
+            retention_worker.close()
 
-    # Save final results
-    final_results = {
-        "timestamp": datetime.now().isoformat(),
-        "total_predictions": total,
-        "successful": success_count,
-        "failed": fail_count,
-        "total_time_seconds": total_time,
-        "mode": "quick" if quick_mode else "production",
-        "results": results
-    }
+    total_time = time.time() - start_time
 
+    # Final results: compaction of the log (latest entry per job, manifest order)
     results_file = results_path / "screening_results.json"
-    with open(results_file, 'w') as f:
-        json.dump(final_results, f, indent=2)
+    with PROFILE.phase("compaction"):
+        final_results = compact_results_log(
+            runner.log_files(results_log), results_file,
+            screen_id=runner.screen_id,
+            timestamp=datetime.now().isoformat(),
+            total_predictions=total,
+            total_time_seconds=total_time,
+            mode=mode
+        )
 
     print(f"\n{'='*80}")
     print("BATCH PREDICTIONS COMPLETE")
     print(f"{'='*80}\n")
     print(f"Total time: {total_time/60:.1f} minutes")
+    if runner.node_id is not None:
+        print(f"This node ({runner.node_id}): {success_count} succeeded, {fail_count} failed")
+        success_count, fail_count = final_results['successful'], final_results['failed']
+        pruned_count = final_results.get('pruned', 0)
     print(f"Success: {success_count}/{total}")
     print(f"Failed: {fail_count}/{total}")
-    print(f"Results saved: {results_file}\n")
+    if pruned_count:
+        print(f"Pruned: {pruned_count}/{total} (target-first)")
+    print(f"Results saved: {results_file}")
+    if retention_worker is not None:
+        retained = retention_worker.summary()
+        print(f"Retention: {retained['jobs']} jobs trimmed, {retained['bytes_saved'] / 1e6:.1f} MB saved "
+              f"({retained['bytes_before'] / 1e6:.1f} -> {retained['bytes_after'] / 1e6:.1f} MB)"
+              + (f", {retained['errors']} errors" if retained['errors'] else ""))
+    if watchdog is not None:
+        disk = watchdog.summary()
+        print(f"Disk: {disk['free_gb']:.1f} GB free, {disk['mean_job_mb']:.1f} MB per job "
+              f"(max {disk['max_job_mb']:.1f}), {disk['pauses']} pauses "
+              f"({disk['paused_seconds'] / 60:.1f} min), {disk['cleaned_mb']:.1f} MB cleaned up")
+    if pack_gpus:
+        for device_id, packing in device_pool.summary().items():
+            print(f"GPU {device_id}: up to {packing['peak_jobs']} concurrent jobs, "
+                  f"{packing['ooms']} OOM, final budget {packing['budget_gb']:.1f} GB")
+    runner.report()
+    print()
 
     print("Next step: Analyze specificity")
     print("  python analyze_specificity.py")
 
+    # Runner phase timings (see screen_jobs.ScreenProfile), not written to screening_results.json
+    final_results['profile'] = PROFILE.summary()
+    if retention_worker is not None:
+        final_results['retention'] = retention_worker.summary()
+    if pack_gpus:
+        final_results['gpu_packing'] = device_pool.summary()
+    if watchdog is not None:
+        final_results['disk'] = watchdog.summary()
+    final_results.update(runner.summary())
+    return final_results
+
+
+def backend_from_args(args):
+    """
+    Execution backend and its options selected by the CLI flags; the
+    backend flags are mutually exclusive.
+    """
+    selected = {
+        "shards": args.shard_size > 1,
+        "spool": bool(args.worker_spool),
+        "shared": args.shared_queue,
+        "async": args.orchestrator == "async",
+    }
+    chosen = [backend for backend, on in selected.items() if on]
+    if len(chosen) > 1:
+        raise ValueError("--shard-size, --worker-spool, --shared-queue and --orchestrator async "
+                         "select different execution backends; use one of them")
+    backend = chosen[0] if chosen else "threads"
+
+    options = {
+        "shard_size": args.shard_size if backend == "shards" else None,
+        "spool_dir": args.worker_spool,
+        "library_name": args.library_name,
+        "share_weight": args.share_weight,
+        "share_priority": args.priority,
+        "node_id": args.node_id,
+    }
+    return backend, {name: value for name, value in options.items() if value is not None}
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -251,14 +879,193 @@ def main():
         type=int,
         help="Limit number of predictions (for testing)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Concurrent boltz predict processes (default: 1)"
+    )
+    parser.add_argument(
+        "--gpu-ids",
+        help="Comma-separated GPU IDs to pin workers to (default: 0..workers-1)"
+    )
+    parser.add_argument(
+        "--accelerator",
+        choices=["gpu", "cpu"],
+        default="gpu",
+        help="Run on GPUs (default) or on CPU cores, split evenly across --workers "
+             "via OMP/MKL thread counts"
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=1,
+        help="Configs per boltz predict invocation, to amortize model loading (default: 1)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip predictions completed by a previous run and only run missing/failed ones"
+    )
+    parser.add_argument(
+        "--tiered",
+        action="store_true",
+        help="Quick-screen every config, then re-run promising variants at production settings"
+    )
+    parser.add_argument(
+        "--promote-margin",
+        type=float,
+        default=0.0,
+        help="Minimum quick-tier selectivity (target - max off-target confidence) "
+             "for promotion to production (default: 0.0)"
+    )
+    parser.add_argument(
+        "--target-first",
+        action="store_true",
+        help="Run target-nucleotide predictions first and prune off-targets of weak variants"
+    )
+    parser.add_argument(
+        "--min-target-confidence",
+        type=float,
+        help="Target-first: minimum target confidence_score to run off-targets"
+    )
+    parser.add_argument(
+        "--min-target-iptm",
+        type=float,
+        help="Target-first: minimum target ligand_iptm to run off-targets"
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=["lpt", "manifest"],
+        default="lpt",
+        help="Job order: longest predicted runtime first (default) or manifest order"
+    )
+    parser.add_argument(
+        "--orchestrator",
+        choices=["threads", "async"],
+        default="threads",
+        help="Run jobs with a thread each (default) or on one asyncio event loop "
+             "with streamed logs and progress events"
+    )
+    parser.add_argument(
+        "--shared-queue",
+        action="store_true",
+        help="Multi-node: claim jobs through leases in <results-dir>/queue shared with other "
+             "nodes running the same command (delete the queue directory to start over)"
+    )
+    parser.add_argument(
+        "--node-id",
+        help="Node name for --shared-queue (default: hostname-pid)"
+    )
+    parser.add_argument(
+        "--cost-history",
+        nargs="+",
+        help="Earlier screening_results.json/.jsonl files to fit the runtime cost model on"
+    )
+    parser.add_argument(
+        "--estimate-only",
+        action="store_true",
+        help="Print the estimated cost of the manifest and exit"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Retention: keep only the top model, inter-chain PAE and a gzipped CIF per job "
+             "and delete processed/ (the options below override single parts)"
+    )
+    add_policy_arguments(parser)
+    parser.add_argument(
+        "--adaptive-sampling",
+        action="store_true",
+        help="Choose sampling settings per variant from its size and the GPU memory "
+             "(small/medium/large profiles, see sampling_profiles.py)"
+    )
+    parser.add_argument(
+        "--pack-gpus",
+        action="store_true",
+        help="Co-schedule several of the --workers jobs per GPU while their estimated peak "
+             "memory fits --gpu-memory (backs off after CUDA OOM)"
+    )
+    parser.add_argument(
+        "--gpu-memory",
+        type=float,
+        help="GPU memory in GB for --adaptive-sampling/--pack-gpus (default: detected with "
+             f"nvidia-smi, else {DEFAULT_GPU_MEMORY_GB:.0f})"
+    )
+    parser.add_argument(
+        "--min-free-gb",
+        type=float,
+        help="Pause launching jobs while the results volume has less free space, "
+             "compacting already-ingested outputs (events go to the results log)"
+    )
+    parser.add_argument(
+        "--resume-free-gb",
+        type=float,
+        help="Free space at which paused admission resumes (default: 1.25 x --min-free-gb)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Content-addressed prediction cache shared across libraries and runs"
+    )
+    parser.add_argument(
+        "--worker-spool",
+        help="Submit jobs to persistent boltz_worker.py daemons on this spool directory"
+    )
+    parser.add_argument(
+        "--library-name",
+        help="Name this screen's jobs are queued and accounted under on a shared "
+             "--worker-spool (default: the library directory's name)"
+    )
+    parser.add_argument(
+        "--share-weight",
+        type=float,
+        help="Relative share of the worker spool's device time (default: 1)"
+    )
+    parser.add_argument(
+        "--priority",
+        type=int,
+        help="Spool priority; workers serve higher-priority libraries first (default: 0)"
+    )
+    parser.add_argument(
+        "--affinity-top-n",
+        type=int,
+        help="After the structure-only screen, re-run the top N variants per nucleotide "
+             "(all four nucleotides) with Boltz-2 affinity prediction (not with --worker-spool)"
+    )
 
     args = parser.parse_args()
 
+    gpu_ids = [g.strip() for g in args.gpu_ids.split(",")] if args.gpu_ids else None
+
+    backend, backend_options = backend_from_args(args)
+
     run_batch_predictions(
         args.library_dir,
         args.results_dir,
         quick_mode=args.quick,
-        limit=args.limit
+        limit=args.limit,
+        workers=args.workers,
+        gpu_ids=gpu_ids,
+        backend=backend,
+        backend_options=backend_options,
+        resume=args.resume,
+        cache_dir=args.cache_dir,
+        tiered=args.tiered,
+        promote_margin=args.promote_margin,
+        target_first=args.target_first,
+        min_target_confidence=args.min_target_confidence,
+        min_target_iptm=args.min_target_iptm,
+        cost_history=args.cost_history,
+        estimate_only=args.estimate_only,
+        schedule=args.schedule,
+        accelerator=args.accelerator,
+        retention=policy_from_args(args),
+        adaptive_sampling=args.adaptive_sampling,
+        gpu_memory_gb=args.gpu_memory,
+        pack_gpus=args.pack_gpus,
+        min_free_gb=args.min_free_gb,
+        resume_free_gb=args.resume_free_gb,
+        affinity_top_n=args.affinity_top_n
     )
 
 
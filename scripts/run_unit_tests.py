@@ -517,6 +517,1695 @@ def test_error_handling():
     return suite
 
 
+def test_msa_profile():
+    """Test PSSM / conservation profile construction and mutation scoring."""
+    print_test("MSA Profile (PSSM)")
+    suite = TestSuite()
+
+    try:
+        from msa_profile import load_profile, build_profile, filter_variants, parse_mutations
+
+        sequences = ["ACDEFGHIKL", "ACDEFGHIKL", "ACDEYGHIKL", "ACNEFGHVKL"]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            a3m_file = Path(tmpdir) / "scaffold.a3m"
+            with open(a3m_file, 'w') as f:
+                for i, seq in enumerate(sequences):
+                    # Lowercase insertions must be stripped
+                    f.write(f">seq{i}\n{seq[:5]}gg{seq[5:]}\n")
+
+            cache_dir = Path(tmpdir) / "cache"
+            profile = load_profile(a3m_file, cache_dir=cache_dir, identity_threshold=0.95)
+
+            # Test 1: Dimensions and query
+            suite.test(profile.pssm.shape == (10, 20) and profile.query == sequences[0],
+                      "Profile has one PSSM row per query position",
+                      f"Unexpected PSSM shape {profile.pssm.shape}")
+
+            # Test 2: Identical sequences are down-weighted
+            suite.test(abs(profile.neff - 3.0) < 1e-9,
+                      "Duplicate sequences share weight (Neff = 3)",
+                      f"Expected Neff 3.0, got {profile.neff}")
+
+            # Test 3: Observed residue scores above an unobserved one
+            observed, unobserved = profile.score_mutations([4, 4], ['Y', 'W'])
+            suite.test(observed > unobserved,
+                      "Observed substitution scores above unobserved",
+                      f"F5Y ({observed:.2f}) should beat F5W ({unobserved:.2f})")
+
+            # Test 4: Sequence scoring agrees with mutation scoring
+            seq_score = profile.score_sequences(["ACDEYGHIKL"])[0]
+            suite.test(abs(seq_score - observed) < 1e-9,
+                      "Sequence score equals summed mutation scores",
+                      f"Sequence score {seq_score} != {observed}")
+
+            # Test 5: Cache returns the same profile, and persists to disk
+            suite.test(load_profile(a3m_file, cache_dir=cache_dir, identity_threshold=0.95) is profile,
+                      "In-memory cache hit",
+                      "Profile rebuilt despite cache")
+            suite.test(len(list(cache_dir.glob("*.npz"))) == 1,
+                      "Profile cached on disk",
+                      "Profile cache file missing")
+
+        # Test 6: Mutation string parsing is 1-indexed
+        positions, amino_acids = parse_mutations("F5Y,I8V", "ACDEFGHIKL")
+        suite.test(list(positions) == [4, 7] and amino_acids == ['Y', 'V'],
+                  "Mutation strings parsed (1-indexed)",
+                  f"Parsed {list(positions)}, {amino_acids}")
+
+        # Test 7: Framework filter drops implausible variants, keeps WT
+        variants = [
+            {'id': 'wt', 'mutations': 'WT'},
+            {'id': 'plausible', 'mutations': 'F5Y'},
+            {'id': 'implausible', 'mutations': 'A1W'},
+        ]
+        kept, dropped = filter_variants(variants, build_profile(sequences),
+                                        {"CDR": (4, 6)}, framework_threshold=-2.0)
+        suite.test([v['id'] for v in kept] == ['wt', 'plausible'] and
+                   [v['id'] for v in dropped] == ['implausible'],
+                  "Implausible framework mutation filtered",
+                  f"Kept {[v['id'] for v in kept]}, dropped {[v['id'] for v in dropped]}")
+
+    except Exception as e:
+        suite.test(False, "", f"MSA profile test failed with error: {e}")
+
+    return suite
+
+
+def test_boltz_worker_queue():
+    """Test the persistent worker spool queue with a stand-in backend."""
+    print_test("Boltz Worker Queue")
+    suite = TestSuite()
+
+    try:
+        import socket
+        import subprocess
+        import time
+        import boltz_worker
+        from boltz_worker import (BoltzWorker, submit_job, poll_results, check_health, request_drain,
+                                  requeue_stale_jobs, time_limit)
+
+        class FakeBackend:
+            name = "fake"
+
+            def __init__(self):
+                self.seen = []
+
+            def predict(self, job):
+                self.seen.append(job['sampling'])
+                stem = Path(job['config_file']).stem
+                pred = Path(job['output_dir']) / f"boltz_results_{stem}" / "predictions" / stem
+                pred.mkdir(parents=True, exist_ok=True)
+                with open(pred / f"confidence_{stem}_model_0.json", 'w') as f:
+                    json.dump({'confidence_score': 0.5}, f)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            spool = tmpdir / "spool"
+            config = tmpdir / "var_vs_dATP.yaml"
+            config.write_text("version: 1\n")
+
+            sampling = {'diffusion_samples': 1, 'sampling_steps': 50, 'recycling_steps': 1}
+            submit_job(spool, config, tmpdir / "out", sampling, job_id="job1")
+            submit_job(spool, config, tmpdir / "missing", sampling, job_id="job2")
+
+            backend = FakeBackend()
+            worker = BoltzWorker(spool, backend, device_id=0, poll_interval=0.01, worker_id="w0")
+
+            # Job 2's backend call raises -> reported as failure, worker keeps going
+            original = backend.predict
+            backend.predict = lambda job: original(job) if job['job_id'] == 'job1' else 1 / 0
+
+            worker.run_job(worker.claim_next())
+            worker.run_job(worker.claim_next())
+            results = poll_results(spool, ["job1", "job2"])
+
+            # Test 1: Both jobs reported
+            suite.test(set(results) == {"job1", "job2"},
+                      "Worker reported both jobs",
+                      f"Results for {sorted(results)}")
+
+            # Test 2: Success/failure and exact prediction dir
+            suite.test(results["job1"]['success'] and
+                       results["job1"]['prediction_dir'].endswith("boltz_results_var_vs_dATP"),
+                      "Successful job points at its boltz_results directory",
+                      f"Unexpected job1 result: {results.get('job1')}")
+            suite.test(not results["job2"]['success'] and "ZeroDivisionError" in results["job2"]['error'],
+                      "Backend exception recorded as failure",
+                      f"Unexpected job2 result: {results.get('job2')}")
+
+            # Test 3: Sampling parameters passed through to the backend
+            suite.test(backend.seen == [sampling],
+                      "Sampling parameters delivered to backend",
+                      f"Backend saw {backend.seen}")
+
+            # Test 4: Drain stops the serve loop and health reports it
+            request_drain(spool)
+            worker.serve()
+            health = check_health(spool)
+            suite.test(len(health) == 1 and health[0]['status'] == 'stopped' and not health[0]['healthy'],
+                      "Drained worker reports stopped",
+                      f"Unexpected health: {health}")
+
+            # Test 5: Heartbeat stays fresh while a job outlasts the stale threshold
+            (spool / "DRAIN").unlink()
+            saved_interval = boltz_worker.HEARTBEAT_INTERVAL
+            boltz_worker.HEARTBEAT_INTERVAL = 0.05
+            try:
+                fresh = []
+
+                def slow_predict(job):
+                    for _ in range(4):
+                        time.sleep(0.1)
+                        fresh.append(check_health(spool, stale_after=0.15)[0]['healthy'])
+                backend.predict = slow_predict
+                submit_job(spool, config, tmpdir / "out", sampling, job_id="slow")
+                worker.run_job(worker.claim_next())
+            finally:
+                boltz_worker.HEARTBEAT_INTERVAL = saved_interval
+            suite.test(fresh == [True] * 4,
+                      "Heartbeat refreshed during a long prediction",
+                      f"Heartbeat freshness during job: {fresh}")
+
+            # Test 6: Stale jobs requeued only once the owner process is gone
+            dead = subprocess.Popen([sys.executable, "-c", "pass"])
+            dead.wait()
+            for worker_id, pid in (("dead", dead.pid), ("slow", os.getpid())):
+                (spool / "running" / worker_id).mkdir()
+                submit_job(spool, config, tmpdir / "out", sampling, job_id=f"{worker_id}_job")
+                os.rename(spool / "pending" / f"{worker_id}_job.json",
+                          spool / "running" / worker_id / f"{worker_id}_job.json")
+                with open(spool / "workers" / f"{worker_id}.json", 'w') as f:
+                    json.dump({'worker_id': worker_id, 'pid': pid, 'host': socket.gethostname(),
+                               'status': 'busy', 'heartbeat': time.time() - 3600}, f)
+            requeued = requeue_stale_jobs(spool)
+            suite.test(requeued == 1 and (spool / "pending" / "dead_job.json").exists()
+                       and (spool / "running" / "slow" / "slow_job.json").exists(),
+                      "Only jobs of dead workers requeued",
+                      f"Requeued {requeued}")
+
+            # Test 7: In-process predictions interrupted at their timeout
+            start = time.time()
+            try:
+                with time_limit(0.2):
+                    while time.time() - start < 5:
+                        time.sleep(0.01)
+                timed_out = False
+            except TimeoutError:
+                timed_out = True
+            suite.test(timed_out and time.time() - start < 2,
+                      "Warm backend time limit enforced",
+                      "Time limit not enforced")
+
+    except Exception as e:
+        suite.test(False, "", f"Worker queue test failed with error: {e}")
+
+    return suite
+
+
+def test_screen_resume():
+    """Test completion markers used by run_specificity_screen --resume."""
+    print_test("Screen Resume Detection")
+    suite = TestSuite()
+
+    try:
+        from run_specificity_screen import write_completion_marker, load_completed_job, job_settings
+        from screen_jobs import build_result_record, get_sampling_params
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_dir = Path(tmpdir) / "var_vs_dATP"
+            pred_dir = output_dir / "boltz_results_var_vs_dATP"
+            conf_dir = pred_dir / "predictions" / "var_vs_dATP"
+            conf_dir.mkdir(parents=True)
+
+            config_info = {'variant_id': 'var', 'target_nucleotide': 'dATP', 'test_nucleotide': 'dATP',
+                           'is_target': True, 'mutations': 'WT'}
+            job = {'index': 0, 'config_info': config_info, 'output_dir': output_dir}
+            production = job_settings(job, get_sampling_params(quick_mode=False))
+
+            # Test 1: No marker -> not complete
+            suite.test(load_completed_job(job, production) is None,
+                      "Job without marker is rescheduled",
+                      "Job without marker treated as complete")
+
+            # Test 2: Marker but confidence outputs missing -> not complete
+            record = build_result_record(config_info, pred_dir, {'confidence_score': 0.1}, 12.0)
+            write_completion_marker(output_dir, record, production)
+            suite.test(load_completed_job(job, production) is None,
+                      "Marker without outputs is rescheduled",
+                      "Marker without outputs treated as complete")
+
+            # Test 3: Marker + outputs -> confidence re-ingested from artifacts
+            with open(conf_dir / "confidence_var_vs_dATP_model_0.json", 'w') as f:
+                json.dump({'confidence_score': 0.7, 'ligand_iptm': 0.6}, f)
+            resumed = load_completed_job(job, production)
+            suite.test(resumed is not None and resumed['confidence']['confidence_score'] == 0.7
+                       and resumed['elapsed_time'] == 12.0,
+                      "Completed job re-ingested from artifacts",
+                      f"Unexpected resumed record: {resumed}")
+
+            # Test 4: Quick-mode marker -> re-run by a production resume
+            quick = job_settings(job, get_sampling_params(quick_mode=True))
+            write_completion_marker(output_dir, record, quick)
+            suite.test(load_completed_job(job, quick) is not None
+                       and load_completed_job(job, production) is None,
+                      "Quick-mode prediction not re-ingested as production",
+                      "Marker settings ignored on resume")
+
+            # Test 5: Different sampling profile (or legacy marker without settings) -> re-run
+            profiled = dict(job, sampling_profile={'profile': 'large'})
+            write_completion_marker(output_dir, record, production)
+            other_profile = load_completed_job(profiled, job_settings(profiled, production['sampling']))
+            with open(output_dir / ".screen_complete.json", 'w') as f:
+                json.dump({"completed": "2024-01-01T00:00:00", "record": record}, f)
+            suite.test(other_profile is None and load_completed_job(job, production) is None,
+                      "Other-profile and legacy markers are rescheduled",
+                      "Marker without matching settings treated as complete")
+
+    except Exception as e:
+        suite.test(False, "", f"Resume test failed with error: {e}")
+
+    return suite
+
+
+def test_results_log():
+    """Test the append-only JSONL results log and its compaction."""
+    print_test("Results Log (JSONL)")
+    suite = TestSuite()
+
+    try:
+        from results_log import ResultsLog, load_results_log, compact_results_log
+        from analyze_specificity import load_screening_results
+
+        def record(variant, nuc, score):
+            return {'variant_id': variant, 'target_nucleotide': 'dATP', 'test_nucleotide': nuc,
+                    'is_target': nuc == 'dATP', 'mutations': 'WT',
+                    'confidence': {'confidence_score': score}, 'elapsed_time': 1.0}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_file = Path(tmpdir) / "screening_results.jsonl"
+
+            with ResultsLog(log_file) as log:
+                log.start_run("quick", 3)
+                log.append_result(1, record('v1', 'dGTP', 0.2))
+                log.append_failure(0, record('v1', 'dATP', 0))
+                log.append_failure(2, record('v1', 'dCTP', 0))
+
+            # Second run (resume) fixes one failure
+            with ResultsLog(log_file) as log:
+                log.start_run("quick", 3, resume=True)
+                log.append_result(0, record('v1', 'dATP', 0.9))
+
+            # Simulate a crash mid-write
+            with open(log_file, 'a') as f:
+                f.write('{"type": "result", "index": 3, "rec')
+
+            data = load_results_log(log_file)
+
+            # Test 1: Latest entry per job wins, manifest order restored
+            suite.test([r['test_nucleotide'] for r in data['results']] == ['dATP', 'dGTP'],
+                      "Compaction keeps latest entries in manifest order",
+                      f"Got {[r['test_nucleotide'] for r in data['results']]}")
+
+            # Test 2: Counts derived from the log
+            suite.test(data['successful'] == 2 and data['failed'] == 1,
+                      "Success/failure counts derived from log",
+                      f"successful={data['successful']}, failed={data['failed']}")
+
+            # Test 3: Compacted JSON and log load identically in analysis
+            json_file = Path(tmpdir) / "screening_results.json"
+            compact_results_log(log_file, json_file, total_time_seconds=5.0)
+            from_json = load_screening_results(json_file)
+            from_log = load_screening_results(log_file)
+            suite.test(from_json['results'] == from_log['results'] and
+                       from_json['total_time_seconds'] == 5.0,
+                      "analyze_specificity reads both JSON and JSONL",
+                      "JSON and JSONL results differ")
+
+            # Test 4: A new run without --resume does not report earlier runs' results
+            with ResultsLog(log_file) as log:
+                log.start_run("production", 1)
+                log.append_result(0, record('v2', 'dATP', 0.7))
+            fresh = load_results_log(log_file)
+            suite.test([r['variant_id'] for r in fresh['results']] == ['v2'] and
+                       fresh['successful'] == 1 and fresh['failed'] == 0 and fresh['mode'] == "production",
+                      "Non-resume run compacted on its own",
+                      f"Got {[r['variant_id'] for r in fresh['results']]}, {fresh['successful']} successful")
+
+    except Exception as e:
+        suite.test(False, "", f"Results log test failed with error: {e}")
+
+    return suite
+
+
+def test_prediction_cache():
+    """Test the content-addressed prediction cache."""
+    print_test("Prediction Cache")
+    suite = TestSuite()
+
+    try:
+        from prediction_cache import PredictionCache, cache_key
+        from screen_jobs import extract_confidence, get_sampling_params
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            for lib in ("lib_a", "lib_b"):
+                (tmpdir / lib).mkdir()
+                with open(tmpdir / lib / "scaffold.a3m", 'w') as f:
+                    f.write(">query\nMKVLAAG\n")
+
+            def write_config(path, smiles="CC(=O)O"):
+                config = {'version': 1, 'sequences': [
+                    {'protein': {'id': 'A', 'sequence': 'MKVLAAG', 'msa': 'scaffold.a3m'}},
+                    {'ligand': {'id': 'B', 'smiles': smiles}}]}
+                with open(path, 'w') as f:
+                    yaml.dump(config, f)
+                return path
+
+            config_a = write_config(tmpdir / "lib_a" / "var1_vs_dATP.yaml")
+            config_b = write_config(tmpdir / "lib_b" / "renamed_vs_dATP.yaml")
+            config_c = write_config(tmpdir / "lib_b" / "other_vs_dGTP.yaml", smiles="CCO")
+            sampling = get_sampling_params(True)
+
+            # Test 1: Key ignores config name and MSA path, not content
+            suite.test(cache_key(config_a, sampling) == cache_key(config_b, sampling),
+                      "Identical inputs share a cache key",
+                      "Config name/path changed the cache key")
+            suite.test(cache_key(config_a, sampling) != cache_key(config_c, sampling) and
+                       cache_key(config_a, sampling) != cache_key(config_a, get_sampling_params(False)),
+                      "Ligand and sampling changes alter the key",
+                      "Different inputs collided")
+
+            # Test 2: Stored prediction is materialized under the new stem
+            pred_dir = tmpdir / "out_a" / "boltz_results_var1_vs_dATP"
+            conf_dir = pred_dir / "predictions" / "var1_vs_dATP"
+            conf_dir.mkdir(parents=True)
+            with open(conf_dir / "confidence_var1_vs_dATP_model_0.json", 'w') as f:
+                json.dump({'confidence_score': 0.8}, f)
+
+            PredictionCache(tmpdir / "cache").put(config_a, sampling, pred_dir, 30.0)
+            cache = PredictionCache(tmpdir / "cache")  # reload index from disk
+            hit = cache.fetch(config_b, tmpdir / "out_b", sampling)
+            confidence = extract_confidence(hit['prediction_dir']) if hit else None
+            suite.test(hit is not None and hit['elapsed'] == 30.0 and
+                       confidence is not None and confidence['confidence_score'] == 0.8,
+                      "Cache hit materialized and readable by extract_confidence",
+                      f"Unexpected hit: {hit}, confidence: {confidence}")
+            suite.test(cache.fetch(config_c, tmpdir / "out_c", sampling) is None,
+                      "Different complex misses the cache",
+                      "Unexpected cache hit")
+
+    except Exception as e:
+        suite.test(False, "", f"Prediction cache test failed with error: {e}")
+
+    return suite
+
+
+def test_tiered_screening():
+    """Test quick-to-production promotion and tier selection in analysis."""
+    print_test("Tiered Screening")
+    suite = TestSuite()
+
+    try:
+        from run_specificity_screen import select_promoted_variants
+        from analyze_specificity import calculate_specificity_scores
+
+        def record(variant, nuc, score, tier):
+            return {'variant_id': variant, 'target_nucleotide': 'dATP', 'test_nucleotide': nuc,
+                    'is_target': nuc == 'dATP', 'mutations': 'WT', 'tier': tier,
+                    'confidence': {'confidence_score': score, 'ligand_iptm': score,
+                                   'complex_plddt': 0.8}}
+
+        off_targets = ['dGTP', 'dCTP', 'dTTP']
+        quick = ([record('selective', 'dATP', 0.9, 'quick')] +
+                 [record('selective', n, 0.5, 'quick') for n in off_targets] +
+                 [record('promiscuous', 'dATP', 0.6, 'quick')] +
+                 [record('promiscuous', n, 0.7, 'quick') for n in off_targets] +
+                 [record('incomplete', 'dATP', 0.9, 'quick')])
+
+        # Test 1: Promotion by quick-tier selectivity margin
+        suite.test(select_promoted_variants(quick, 0.0) == {'selective'},
+                  "Only selective variants with complete panels promoted",
+                  f"Promoted: {select_promoted_variants(quick, 0.0)}")
+        suite.test(select_promoted_variants(quick, -0.2) == {'selective', 'promiscuous'},
+                  "Negative margin promotes near-misses",
+                  f"Promoted: {select_promoted_variants(quick, -0.2)}")
+
+        # Test 2: Analysis scores promoted variants from the production tier
+        production = ([record('selective', 'dATP', 0.8, 'production')] +
+                      [record('selective', n, 0.2, 'production') for n in off_targets])
+        scores = calculate_specificity_scores(
+            {'results': quick + production}).set_index('variant_id').to_dict('index')
+        suite.test(scores['selective']['tier'] == 'production' and
+                   scores['selective']['target_confidence'] == 0.8 and
+                   scores['promiscuous']['tier'] == 'quick',
+                  "Analysis prefers production tier per variant",
+                  f"Unexpected scores: {scores}")
+
+    except Exception as e:
+        suite.test(False, "", f"Tiered screening test failed with error: {e}")
+
+    return suite
+
+
+def test_target_first_pruning():
+    """Test target-first pruning and incomplete-panel scoring."""
+    print_test("Target-First Pruning")
+    suite = TestSuite()
+
+    try:
+        from run_specificity_screen import target_passes, build_pruned_record
+        from analyze_specificity import calculate_specificity_scores, rank_candidates
+        from results_log import ResultsLog, load_results_log
+
+        def config(variant, nuc):
+            return {'variant_id': variant, 'target_nucleotide': 'dATP', 'test_nucleotide': nuc,
+                    'is_target': nuc == 'dATP', 'mutations': 'WT'}
+
+        def record(variant, nuc, score):
+            r = dict(config(variant, nuc))
+            r['confidence'] = {'confidence_score': score, 'ligand_iptm': score, 'complex_plddt': 0.8}
+            return r
+
+        # Test 1: Thresholds on confidence_score and ligand_iptm
+        strong, weak = record('strong', 'dATP', 0.8), record('weak', 'dATP', 0.3)
+        suite.test(target_passes(strong, 0.5, 0.5) and not target_passes(weak, 0.5) and
+                   not target_passes(None, 0.5) and target_passes(weak),
+                  "Target thresholds applied",
+                  "Unexpected target_passes result")
+
+        off_targets = ['dGTP', 'dCTP', 'dTTP']
+        results = ([strong] + [record('strong', n, 0.4) for n in off_targets] +
+                   [weak] + [build_pruned_record(config('weak', n), 'target_below_threshold')
+                             for n in off_targets])
+
+        # Test 2: Pruned variants kept with explicit status, ranked last
+        df = rank_candidates(calculate_specificity_scores({'results': results}))
+        weak_row = df[df['variant_id'] == 'weak'].iloc[0]
+        suite.test(list(df['variant_id']) == ['strong', 'weak'] and
+                   weak_row['status'] == 'pruned' and not weak_row['panel_complete'] and
+                   weak_row['n_off_targets'] == 0 and np.isnan(weak_row['combined_score']),
+                  "Pruned variant scored as incomplete panel",
+                  f"Unexpected ranking: {df[['variant_id', 'status', 'combined_score']].values.tolist()}")
+
+        # Test 3: Partial panels rank after complete ones however they score, and are marked
+        from analyze_specificity import panel_note
+        from streaming_analysis import StreamingAnalysis
+        partial = [record('partial', 'dATP', 0.9), record('partial', 'dGTP', 0.1)]
+        mixed = results + partial + [record('tied', n, r['confidence']['confidence_score'])
+                                     for n, r in zip(['dATP'] + off_targets, results[:4])]
+        ranked = rank_candidates(calculate_specificity_scores({'results': mixed}))
+        streamed = StreamingAnalysis().add_all(mixed).top_candidates()
+        suite.test(list(ranked['variant_id']) == ['strong', 'tied', 'partial', 'weak'] and
+                   list(streamed['variant_id']) == list(ranked['variant_id']) and
+                   panel_note(ranked.iloc[2]) == " [incomplete panel: 1/3 off-targets]" and
+                   panel_note(ranked.iloc[0]) == "",
+                  "Complete panels ranked first, ties in first-result order",
+                  f"Full {list(ranked['variant_id'])}, streamed {list(streamed['variant_id'])}")
+
+        # Test 4: Pruned records counted separately from successes
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_file = Path(tmpdir) / "screening_results.jsonl"
+            with ResultsLog(log_file) as log:
+                log.start_run("quick", len(results))
+                for i, r in enumerate(results):
+                    log.append_result(i, r)
+            data = load_results_log(log_file)
+            suite.test(data['successful'] == 5 and data['pruned'] == 3,
+                      "Pruned jobs counted separately in the log",
+                      f"successful={data['successful']}, pruned={data.get('pruned')}")
+
+    except Exception as e:
+        suite.test(False, "", f"Target-first test failed with error: {e}")
+
+    return suite
+
+
+def test_cost_model():
+    """Test runtime cost model features, fit and timeouts."""
+    print_test("Runtime Cost Model")
+    suite = TestSuite()
+
+    try:
+        from cost_model import (CostModel, job_features, smiles_heavy_atoms, training_samples,
+                                DEFAULT_TIMEOUT)
+
+        # Test 1: Features from a config (residues + ligand heavy atoms, MSA depth)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            msa = Path(tmpdir) / "A.a3m"
+            msa.write_text(">q\nMKV\n>h1\nMRV\n>h2\nMKI\n")
+            config = Path(tmpdir) / "var_vs_dATP.yaml"
+            with open(config, 'w') as f:
+                yaml.dump({'version': 1, 'sequences': [
+                    {'protein': {'id': 'A', 'sequence': 'M' * 118, 'msa': 'A.a3m'}},
+                    {'ligand': {'id': 'B', 'smiles': 'CC(=O)[O-]'}}]}, f)
+            features = job_features(config, {'diffusion_samples': 1, 'sampling_steps': 50,
+                                              'recycling_steps': 1})
+            suite.test(features['tokens'] == 122 and features['msa_depth'] == 3,
+                      "Tokens and MSA depth extracted",
+                      f"Unexpected features: {features}")
+        suite.test(smiles_heavy_atoms('Nc1ncnc2c1ncn2[C@H]3C[C@H](O)[C@@H](CO)O3') == 18,
+                  "SMILES heavy atoms counted",
+                  "Wrong SMILES atom count")
+
+        # Test 2: Fit recovers a known runtime law
+        rng = np.random.default_rng(0)
+        samples = []
+        for _ in range(60):
+            f = {'tokens': int(rng.integers(100, 500)), 'msa_depth': int(rng.integers(10, 4000)),
+                 'diffusion_samples': int(rng.choice([1, 3])), 'sampling_steps': int(rng.choice([50, 150])),
+                 'recycling_steps': int(rng.choice([1, 2]))}
+            elapsed = 0.5 * f['tokens'] ** 1.2 * f['sampling_steps'] ** 0.5 * np.exp(rng.normal(0, 0.05))
+            samples.append({'features': f, 'elapsed': elapsed})
+        model = CostModel(ridge=1e-3).fit(samples)
+        f = {'tokens': 300, 'msa_depth': 500, 'diffusion_samples': 1, 'sampling_steps': 100,
+             'recycling_steps': 1}
+        truth = 0.5 * 300 ** 1.2 * 100 ** 0.5
+        suite.test(abs(model.predict(f) / truth - 1) < 0.1,
+                  "Fitted model predicts held-out runtime within 10%",
+                  f"Predicted {model.predict(f):.1f}s vs {truth:.1f}s")
+
+        # Test 3: Timeouts track job size once fitted
+        big = dict(f, tokens=450)
+        suite.test(CostModel().timeout(f) == DEFAULT_TIMEOUT and
+                   model.timeout(f) > model.predict(f) and model.timeout(big) > model.timeout(f),
+                  "Timeouts default until fitted, then scale with predicted cost",
+                  "Unexpected timeouts")
+
+        # Test 4: Cache hits and pruned records are not training data
+        records = [{'job_features': f, 'elapsed_time': 10.0},
+                   {'job_features': f, 'elapsed_time': 10.0, 'cache_hit': True},
+                   {'job_features': f, 'elapsed_time': None, 'status': 'pruned'},
+                   {'elapsed_time': 10.0}]
+        suite.test(len(training_samples(records)) == 1,
+                  "Only freshly predicted records used for fitting",
+                  f"Got {len(training_samples(records))} samples")
+
+    except Exception as e:
+        suite.test(False, "", f"Cost model test failed with error: {e}")
+
+    return suite
+
+
+def test_lpt_scheduler():
+    """Test longest-processing-time-first job scheduling."""
+    print_test("LPT Job Scheduling")
+    suite = TestSuite()
+
+    try:
+        from job_scheduler import JobQueue, simulate_makespan
+        import boltz_worker
+
+        costs = {'vhh_1': 2.0, 'vhh_2': 2.0, 'vhh_3': 2.0, 'vhh_4': 2.0, 'chimera': 8.0}
+        manifest = list(costs)
+
+        # Test 1: Longest predicted job first; FIFO without a cost function
+        queue = JobQueue(manifest, cost_fn=costs.get)
+        fifo = JobQueue(manifest)
+        suite.test(queue.pop() == 'chimera' and [fifo.pop() for _ in manifest] == manifest,
+                  "LPT pops longest job first, FIFO keeps manifest order",
+                  "Unexpected dispatch order")
+
+        # Test 2: Re-prioritization after the cost model changes
+        costs['vhh_4'] = 20.0
+        queue.reprioritize()
+        suite.test(queue.items()[0] == 'vhh_4' and len(queue) == 4,
+                  "Pending queue re-sorted after refit",
+                  f"Order after refit: {queue.items()}")
+
+        # Test 3: LPT makespan beats manifest order with a big job last
+        sizes = [2.0, 2.0, 2.0, 2.0, 8.0]
+        suite.test(simulate_makespan(sorted(sizes, reverse=True), 2) == 8.0 and
+                   simulate_makespan(sizes, 2) == 12.0,
+                  "LPT reduces simulated makespan (12 -> 8)",
+                  "Unexpected makespans")
+
+        # Test 4: Spool jobs re-ordered for claim order
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spool = boltz_worker.init_spool(tmpdir)
+            for job_id in ('a', 'b', 'c'):
+                boltz_worker.submit_job(tmpdir, "x.yaml", tmpdir, {}, job_id=job_id)
+            boltz_worker.reorder_pending(tmpdir, ['c', 'a', 'b'])
+            order = sorted((spool / "pending").glob("*.json"), key=lambda p: p.stat().st_mtime)
+            suite.test([p.stem for p in order] == ['c', 'a', 'b'],
+                      "Pending spool jobs re-stamped in priority order",
+                      f"Claim order: {[p.stem for p in order]}")
+
+    except Exception as e:
+        suite.test(False, "", f"LPT scheduler test failed with error: {e}")
+
+    return suite
+
+
+def test_failure_policy():
+    """Test failure classification and retry policies."""
+    print_test("Failure Classification & Retry")
+    suite = TestSuite()
+
+    try:
+        from failure_policy import classify_failure, plan_retry, error_summary
+
+        # Test 1: Classes from stderr / timeout status
+        cases = {
+            "RuntimeError: CUDA out of memory. Tried to allocate 2.00 GiB": "cuda_oom",
+            "FileNotFoundError: [Errno 2] No such file or directory: 'msas/var/A.a3m'": "missing_msa",
+            "ValueError: Invalid SMILES string": "bad_input",
+            "OSError: [Errno 5] Input/output error": "transient_io",
+            "RuntimeError: CUDA error: an illegal memory access was encountered": "device_error",
+            "Segmentation fault": "unknown",
+            "OSError: [Errno 116] Stale file handle: '/nfs/msas/var/A.a3m'": "transient_io",
+            "OSError: [Errno 5] Input/output error: 'msas/var/A.a3m'": "transient_io",
+            "yaml.scanner.ScannerError: mapping values are not allowed here": "bad_input",
+            "ValueError: math domain error": "unknown",
+            "KeyError: 'cuda:3'": "unknown",
+            "RuntimeError: invalid device ordinal": "device_error",
+            "Loading var.a3m took 3.2s\nRuntimeError: NCCL error": "device_error",
+        }
+        got = {stderr: classify_failure(1, stderr) for stderr in cases}
+        suite.test(got == cases and classify_failure(None, "", timed_out=True) == "timeout",
+                  "Failures classified from stderr",
+                  f"Misclassified: {[(k, v) for k, v in got.items() if cases[k] != v]}")
+
+        # Test 2: Kills identified by exit status, even with empty stderr
+        suite.test(classify_failure(-9, "") == "host_oom" and classify_failure(137, "") == "host_oom"
+                   and classify_failure(124, "") == "timeout"
+                   and plan_retry("host_oom", 1, {'diffusion_samples': 3}, 600)['sampling']
+                   ['max_parallel_samples'] == 1,
+                  "Host OOM kill and timeout exit mapped from returncode",
+                  "Exit statuses not mapped")
+
+        # Test 3: Per-class policies
+        sampling = {'diffusion_samples': 3, 'sampling_steps': 150, 'recycling_steps': 2}
+        oom_1 = plan_retry("cuda_oom", 1, sampling, 600)
+        oom_2 = plan_retry("cuda_oom", 2, oom_1['sampling'], 600)
+        suite.test(oom_1['sampling']['max_parallel_samples'] == 1 and
+                   oom_1['sampling']['diffusion_samples'] == 3 and
+                   oom_2['sampling']['diffusion_samples'] == 1 and
+                   plan_retry("cuda_oom", 3, oom_2['sampling'], 600) is None,
+                  "OOM retried with serial, then fewer, diffusion samples",
+                  f"OOM retries: {oom_1}, {oom_2}")
+
+        io = [plan_retry("transient_io", n, sampling, 600) for n in (1, 2, 3, 4)]
+        suite.test([r['delay'] for r in io[:3]] == [10.0, 20.0, 40.0] and io[3] is None and
+                   plan_retry("bad_input", 1, sampling, 600) is None and
+                   plan_retry("missing_msa", 1, sampling, 600) is None and
+                   plan_retry("timeout", 1, sampling, 600)['timeout'] == 1200,
+                  "Backoff for transient errors, no retry for bad inputs",
+                  "Unexpected retry plans")
+
+        suite.test(error_summary("Traceback (most recent call last):\n  File x\nValueError: bad\n")
+                   == "ValueError: bad",
+                  "Error summary keeps the exception line",
+                  "Wrong error summary")
+
+    except Exception as e:
+        suite.test(False, "", f"Failure policy test failed with error: {e}")
+
+    return suite
+
+
+def test_async_orchestrator():
+    """Test the asyncio subprocess orchestrator and progress events."""
+    print_test("Async Orchestrator")
+    suite = TestSuite()
+
+    try:
+        import asyncio
+        import time
+        from async_orchestrator import AsyncOrchestrator, ProgressEvents, follow_events, stream_subprocess
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+
+            # Test 1: Output streamed to the log, stderr tail kept for classification
+            result = asyncio.run(stream_subprocess(
+                [sys.executable, "-c",
+                 "import sys; print('step 1'); print('ValueError: bad', file=sys.stderr); sys.exit(2)"],
+                log_file=tmp / "job.log"))
+            log = (tmp / "job.log").read_text()
+            suite.test(result['returncode'] == 2 and not result['timed_out'] and
+                       "step 1" in log and result['stderr'].endswith("ValueError: bad"),
+                      "Subprocess output streamed to log",
+                      f"Unexpected result {result}, log {log!r}")
+
+            # Test 2: Timeout kills the job
+            start = time.time()
+            result = asyncio.run(stream_subprocess(
+                [sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5))
+            suite.test(result['timed_out'] and time.time() - start < 10,
+                      "Timed-out job killed",
+                      f"Timeout not enforced: {result}")
+
+            # Test 3: Concurrency bounded by slots, devices handed out per job
+            events = ProgressEvents(tmp / "events.jsonl")
+            orchestrator = AsyncOrchestrator(2, device_ids=["0", "1"], events=events)
+            items = list(range(6))
+            running = []
+            peak = []
+            outcomes = []
+
+            async def execute(item):
+                async with orchestrator.device() as device_id:
+                    events.emit("started", job=str(item), device=device_id)
+                    running.append(item)
+                    peak.append(len(running))
+                    await asyncio.sleep(0.05)
+                    running.remove(item)
+                    events.emit("finished", job=str(item), device=device_id)
+                    return item, device_id
+
+            asyncio.run(orchestrator.run(lambda: items.pop(0) if items else None, execute,
+                                         outcomes.append))
+            events.close()
+            suite.test(len(outcomes) == 6 and max(peak) == 2 and
+                       {device for _, device in outcomes} == {"0", "1"},
+                      "Jobs limited to slots with device pinning",
+                      f"Peak concurrency {max(peak)}, outcomes {outcomes}")
+
+            # Test 4: Events readable by a follower
+            followed = list(follow_events(tmp / "events.jsonl", poll_interval=0.05, stop_after=0.1))
+            suite.test([e['event'] for e in followed].count("finished") == 6 and
+                       all('time' in e and 'device' in e for e in followed),
+                      "Progress events written as JSONL",
+                      f"Got {len(followed)} events")
+
+    except Exception as e:
+        suite.test(False, "", f"Async orchestrator test failed with error: {e}")
+
+    return suite
+
+
+def test_shared_queue():
+    """Test the multi-node lease queue with local processes as nodes."""
+    print_test("Shared-Filesystem Work Queue")
+    suite = TestSuite()
+
+    try:
+        import subprocess
+        import time
+        from shared_queue import SharedWorkQueue
+        from results_log import ResultsLog, merge_results_logs
+
+        scripts_dir = Path(__file__).parent
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            queue_dir = tmp / "queue"
+            job_ids = [f"job_{i:03d}" for i in range(30)]
+
+            # Test 1: Several processes drain the queue, each job run exactly once
+            node_script = (
+                "import sys, time; sys.path.insert(0, sys.argv[1])\n"
+                "from shared_queue import SharedWorkQueue\n"
+                "jobs = [f'job_{i:03d}' for i in range(30)]\n"
+                "with SharedWorkQueue(sys.argv[2], sys.argv[3], heartbeat_interval=0.2) as q:\n"
+                "    while True:\n"
+                "        job = q.claim_next(q.pending(jobs))\n"
+                "        if job is None:\n"
+                "            break\n"
+                "        time.sleep(0.02)\n"
+                "        with open(sys.argv[4], 'a') as f:\n"
+                "            f.write(job + '\\n')\n"
+                "        q.complete(job)\n"
+            )
+            nodes = [subprocess.Popen([sys.executable, "-c", node_script, str(scripts_dir),
+                                       str(queue_dir), f"node{n}", str(tmp / f"ran_{n}.txt")])
+                     for n in range(4)]
+            for node in nodes:
+                node.wait(timeout=60)
+            ran = [line for n in range(4) if (tmp / f"ran_{n}.txt").exists()
+                   for line in (tmp / f"ran_{n}.txt").read_text().split()]
+            suite.test(sorted(ran) == job_ids and
+                       len([n for n in range(4) if (tmp / f"ran_{n}.txt").exists()]) > 1,
+                      "Jobs split across node processes, each run once",
+                      f"{len(ran)} runs for {len(set(ran))} distinct jobs")
+
+            # Test 2: Stale lease of a dead node is reclaimed, a live one is not
+            dead = SharedWorkQueue(queue_dir, "dead", lease_timeout=0.5)
+            alive = SharedWorkQueue(queue_dir, "alive", lease_timeout=0.5)
+            other = SharedWorkQueue(queue_dir, "other", lease_timeout=0.5)
+            suite.test(dead.try_claim("job_x") and alive.try_claim("job_y") and
+                       not other.try_claim("job_x"),
+                      "Held lease cannot be claimed twice",
+                      "Lease claimed by two nodes")
+            time.sleep(1.2)
+            alive.heartbeat()
+            suite.test(other.try_claim("job_x") and not other.try_claim("job_y"),
+                      "Stale lease reclaimed, heartbeating lease kept",
+                      "Stale lease handling wrong")
+
+            # Test 3: Per-node logs merged, results beating failures
+            info_a = {'variant_id': 'v1', 'test_nucleotide': 'dATP'}
+            with ResultsLog(tmp / "screening_results.a.jsonl") as log:
+                log.start_run("quick", 2)
+                log.append_failure(0, info_a, reason="prediction_failed")
+            with ResultsLog(tmp / "screening_results.b.jsonl") as log:
+                log.start_run("quick", 2)
+                log.append_result(0, dict(info_a, confidence={'confidence_score': 0.9}))
+                log.append_result(1, {'variant_id': 'v1', 'test_nucleotide': 'dGTP', 'confidence': None})
+            merged = merge_results_logs([tmp / "screening_results.a.jsonl",
+                                         tmp / "screening_results.b.jsonl"])
+            suite.test(merged['successful'] == 2 and merged['failed'] == 0 and
+                       [r['test_nucleotide'] for r in merged['results']] == ['dATP', 'dGTP'],
+                      "Per-node logs merged",
+                      f"Merged: {merged['successful']} ok, {merged['failed']} failed")
+
+            # Test 4: A new screen retires the old done markers; the merge reads only its runs
+            screen_dir = tmp / "screen_queue"
+            first = SharedWorkQueue(screen_dir, "first")
+            first_screen = first.join_screen()
+            first.start()
+            joining = SharedWorkQueue(screen_dir, "joining")
+            joined = joining.join_screen() == first_screen
+            first.complete("job_a")
+            first.stop()
+            with ResultsLog(tmp / "screening_results.first.jsonl") as log:
+                log.start_run("quick", 1, screen_id=first_screen)
+                log.append_result(0, dict(info_a, confidence={'confidence_score': 0.1}))
+            joining.status = "stopped"
+            joining.heartbeat()
+            second = SharedWorkQueue(screen_dir, "second")
+            second_screen = second.join_screen()
+            resumed = SharedWorkQueue(screen_dir, "resumed").join_screen(resume=True)
+            with ResultsLog(tmp / "screening_results.second.jsonl") as log:
+                log.start_run("quick", 1, screen_id=second_screen)
+                log.append_result(0, {'variant_id': 'v2', 'test_nucleotide': 'dATP', 'confidence': None})
+            merged = merge_results_logs([tmp / "screening_results.first.jsonl",
+                                         tmp / "screening_results.second.jsonl"], second_screen)
+            suite.test(joined and second_screen != first_screen and resumed == second_screen and
+                       not second.is_done("job_a") and
+                       [r['variant_id'] for r in merged['results']] == ['v2'],
+                      "Screens separated: live screen joined, finished one retired",
+                      f"Merged {[r['variant_id'] for r in merged['results']]}, "
+                      f"job_a done: {second.is_done('job_a')}")
+
+    except Exception as e:
+        suite.test(False, "", f"Shared queue test failed with error: {e}")
+
+    return suite
+
+
+def test_mock_boltz_benchmark():
+    """Test the mock Boltz executable and the throughput benchmark."""
+    print_test("Mock Boltz & Benchmark")
+    suite = TestSuite()
+
+    try:
+        import subprocess
+        from benchmark_screen import build_library, run_benchmark
+        from failure_policy import classify_failure
+        from screen_jobs import extract_confidence
+
+        scripts_dir = Path(__file__).parent
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            n_configs = build_library(tmp / "library_8", 8)
+            config = sorted((tmp / "library_8" / "configs_with_msas").glob("*.yaml"))[0]
+            mock = [sys.executable, str(scripts_dir / "mock_boltz.py"), "predict", str(config),
+                    "--out_dir", str(tmp / "out"), "--diffusion_samples", "2", "--write_full_pae"]
+
+            # Test 1: Real output layout
+            subprocess.run(mock, check=True, capture_output=True)
+            pred_dir = tmp / "out" / f"boltz_results_{config.stem}"
+            files = {p.name for p in (pred_dir / "predictions" / config.stem).iterdir()}
+            pae = np.load(pred_dir / "predictions" / config.stem / f"pae_{config.stem}_model_0.npz")['pae']
+            confidence = extract_confidence(pred_dir)
+            suite.test(n_configs == 8 and f"confidence_{config.stem}_model_1.json" in files and
+                       f"{config.stem}_model_0.cif" in files and pae.shape[0] == pae.shape[1] and
+                       (pred_dir / "processed" / "manifest.json").exists() and
+                       0 <= confidence['ligand_iptm'] <= 1,
+                      "Mock writes Boltz output layout",
+                      f"Files: {sorted(files)}")
+
+            # Test 2: Injected failures look like real ones
+            env = dict(os.environ, MOCK_BOLTZ_FAILURES="cuda_oom=1")
+            failed = subprocess.run(mock, capture_output=True, text=True, env=env)
+            cured = subprocess.run(mock + ["--max_parallel_samples", "1"], capture_output=True, env=env)
+            suite.test(failed.returncode == 1 and
+                       classify_failure(failed.returncode, failed.stderr) == "cuda_oom" and
+                       cured.returncode == 0,
+                      "Injected OOM classified, cured by serial samples",
+                      f"returncodes {failed.returncode}/{cured.returncode}")
+
+            # Test 3: Benchmark runs the screen against the mock
+            metrics = run_benchmark(8, tmp, workers=2)
+            suite.test(metrics['successful'] == 8 and metrics['failed'] == 0 and
+                       0 < metrics['utilization'] <= 1.05 and metrics['manifest_io_seconds'] > 0,
+                      "Benchmark reports screen metrics",
+                      f"Metrics: {metrics}")
+
+    except Exception as e:
+        suite.test(False, "", f"Mock Boltz test failed with error: {e}")
+
+    return suite
+
+
+def test_cpu_profile():
+    """Test the CPU execution profile and its per-worker thread split."""
+    print_test("CPU Execution Profile")
+    suite = TestSuite()
+
+    try:
+        from benchmark_screen import run_benchmark
+        from cost_model import CostModel, cpu_prior_scale, training_samples
+        from run_specificity_screen import make_cpu_pool
+        from screen_jobs import build_boltz_command, cpu_slot_threads, device_env, get_sampling_params
+
+        # Test 1: Cores split without oversubscription
+        splits = {}
+        for cores, workers in [(64, 8), (10, 3), (4, 8), (1, 1)]:
+            pool = make_cpu_pool(workers, cores)
+            splits[(cores, workers)] = [cpu_slot_threads(slot) for slot in pool.queue]
+        suite.test(splits[(64, 8)] == [8] * 8 and splits[(10, 3)] == [4, 3, 3] and
+                   splits[(4, 8)] == [1] * 4 and
+                   all(sum(t) <= cores for (cores, _), t in splits.items()),
+                  "Cores split evenly across workers",
+                  f"Splits: {splits}")
+
+        # Test 2: Subprocess environment and command line
+        env = device_env("cpu1:6", accelerator="cpu")
+        cmd = build_boltz_command("job.yaml", "out", accelerator="cpu")
+        suite.test(env['OMP_NUM_THREADS'] == env['MKL_NUM_THREADS'] == "6" and
+                   env['CUDA_VISIBLE_DEVICES'] == "" and
+                   cmd[cmd.index("--accelerator") + 1] == "cpu" and
+                   cmd[cmd.index("--num_workers") + 1] == "0" and
+                   device_env("2")['CUDA_VISIBLE_DEVICES'] == "2",
+                  "CPU slots set thread counts, GPU slots pin devices",
+                  f"Command: {cmd}")
+
+        # Test 3: CPU sampling and cost model kept apart from GPU history
+        gpu_record = {"elapsed_time": 180.0, "job_features": {
+            "tokens": 148, "msa_depth": 1000, "diffusion_samples": 1, "sampling_steps": 50,
+            "recycling_steps": 1}}
+        cpu_record = {"elapsed_time": 4000.0, "job_features": dict(
+            gpu_record['job_features'], accelerator="cpu", cpu_threads=8)}
+        cpu_model = CostModel(prior_scale=cpu_prior_scale(8))
+        suite.test(get_sampling_params(True, "cpu") == get_sampling_params(True) and
+                   get_sampling_params(False, "cpu")['max_parallel_samples'] == 1 and
+                   len(training_samples([gpu_record, cpu_record])) == 1 and
+                   training_samples([gpu_record, cpu_record], "cpu")[0]['elapsed'] == 4000.0 and
+                   cpu_model.predict(gpu_record['job_features']) > 10 * CostModel().predict(
+                       gpu_record['job_features']) and
+                   cpu_model.timeout(gpu_record['job_features']) > 600,
+                  "CPU sampling profile and separate CPU cost model",
+                  f"CPU prior: {cpu_model.predict(gpu_record['job_features']):.0f}s")
+
+        # Test 4: Screen runs on CPU slots end to end (mock Boltz)
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics = run_benchmark(8, tmp, workers=2, accelerator="cpu")
+            with open(Path(tmp) / "results_8" / "screening_results.json", 'r') as f:
+                records = json.load(f)['results']
+        suite.test(metrics['successful'] == 8 and
+                   all(r['job_features']['accelerator'] == "cpu" for r in records),
+                  "Screen runs with --accelerator cpu",
+                  f"Metrics: {metrics}")
+
+    except Exception as e:
+        suite.test(False, "", f"CPU profile test failed with error: {e}")
+
+    return suite
+
+
+def test_artifact_retention():
+    """Test the retention policy for prediction outputs."""
+    print_test("Artifact Retention")
+    suite = TestSuite()
+
+    try:
+        import gzip
+        import subprocess
+        from artifact_retention import (COMPACT_POLICY, RetentionPolicy, RetentionWorker,
+                                        apply_retention, chain_tokens)
+        from benchmark_screen import build_library
+        from screen_jobs import extract_confidence
+
+        scripts_dir = Path(__file__).parent
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            build_library(tmp / "library", 4)
+            configs = sorted((tmp / "library" / "configs_with_msas").glob("*.yaml"))
+            pred_dirs = []
+            for config in configs:
+                subprocess.run([sys.executable, str(scripts_dir / "mock_boltz.py"), "predict",
+                                str(config), "--out_dir", str(tmp / config.stem),
+                                "--diffusion_samples", "3", "--write_full_pae"],
+                               check=True, capture_output=True)
+                pred_dirs.append(tmp / config.stem / f"boltz_results_{config.stem}")
+
+            # Test 1: Compact policy keeps the best model, inter-chain PAE and a gzipped CIF
+            stem = configs[0].stem
+            model_dir = pred_dirs[0] / "predictions" / stem
+            scores = {}
+            for n in range(3):
+                with open(model_dir / f"confidence_{stem}_model_{n}.json", 'r') as f:
+                    scores[n] = json.load(f)['confidence_score']
+            best = max(scores, key=scores.get)
+            cif_text = (model_dir / f"{stem}_model_{best}.cif").read_text()
+            stats = apply_retention(pred_dirs[0], COMPACT_POLICY, configs[0])
+            files = sorted(p.name for p in model_dir.iterdir())
+            chains = chain_tokens(configs[0])
+            blocks = np.load(model_dir / f"pae_interchain_{stem}_model_{best}.npz")
+            with gzip.open(model_dir / f"{stem}_model_{best}.cif.gz", 'rt') as f:
+                cif_roundtrip = f.read()
+            suite.test(len(files) == 6 and f"{stem}_model_{best}.cif.gz" in files and
+                       blocks["A_B"].shape == (chains[0][1], chains[1][1]) and
+                       cif_roundtrip == cif_text and not (pred_dirs[0] / "processed").exists() and
+                       stats['models_removed'] == 2 and stats['bytes_after'] < stats['bytes_before'] and
+                       extract_confidence(pred_dirs[0]) is not None,
+                      "Compact policy trims outputs, confidence still readable",
+                      f"Files: {files}")
+
+            # Test 2: Hard-linked files (prediction cache) are left intact
+            cached = tmp / "cached_pae.npz"
+            os.link(pred_dirs[1] / "predictions" / configs[1].stem / f"pae_{configs[1].stem}_model_0.npz",
+                    cached)
+            size = cached.stat().st_size
+            apply_retention(pred_dirs[1], RetentionPolicy(pae="none"), configs[1])
+            suite.test(cached.exists() and cached.stat().st_size == size and
+                       not any((pred_dirs[1] / "predictions").rglob("pae_*")),
+                      "Linked cache copies survive retention",
+                      f"Cached size {size}")
+
+            # Test 3: Background worker reports bytes saved
+            worker = RetentionWorker(COMPACT_POLICY).start()
+            for config, pred_dir in zip(configs[2:], pred_dirs[2:]):
+                worker.submit(pred_dir, config)
+            worker.close()
+            summary = worker.summary()
+            suite.test(summary['jobs'] == 2 and summary['errors'] == 0 and summary['bytes_saved'] > 0 and
+                       not RetentionPolicy().active and COMPACT_POLICY.active,
+                      "Retention worker trims submitted jobs",
+                      f"Summary: {summary}")
+
+    except Exception as e:
+        suite.test(False, "", f"Artifact retention test failed with error: {e}")
+
+    return suite
+
+
+def test_prediction_index():
+    """Test the per-prediction artifact index."""
+    print_test("Prediction Output Index")
+    suite = TestSuite()
+
+    try:
+        from analyze_predictions import analyze_prediction
+        from benchmark_screen import build_library, mock_boltz_env
+        from prediction_index import INDEX_NAME, artifact_path, load_index
+        from screen_jobs import extract_confidence, run_boltz_prediction_detailed
+
+        with mock_boltz_env():
+            with tempfile.TemporaryDirectory() as tmp:
+                tmp = Path(tmp)
+                build_library(tmp / "library", 4)
+                configs = sorted((tmp / "library" / "configs_with_msas").glob("*.yaml"))
+                config = configs[1]
+                out_dir = tmp / "job"
+
+                # Test 1: The job's own directory is indexed, not a stray sibling
+                stray = out_dir / f"boltz_results_{configs[0].stem}"
+                run_boltz_prediction_detailed(configs[0], out_dir, params={
+                    "diffusion_samples": 1, "sampling_steps": 50, "recycling_steps": 1})
+                outcome = run_boltz_prediction_detailed(config, out_dir, params={
+                    "diffusion_samples": 3, "sampling_steps": 50, "recycling_steps": 1})
+                pred_dir = outcome['prediction_dir']
+                index = load_index(pred_dir)
+                suite.test(outcome['success'] and stray.exists() and
+                           pred_dir == out_dir / f"boltz_results_{config.stem}" and
+                           (pred_dir / INDEX_NAME).exists() and len(index['models']) == 3,
+                          "Prediction bound to its own boltz_results directory",
+                          f"Prediction dir: {pred_dir}")
+
+                # Test 2: Best model and artifact paths
+                scores = [m['confidence_score'] for m in index['models']]
+                best = artifact_path(pred_dir, "confidence")
+                with open(best, 'r') as f:
+                    best_confidence = json.load(f)
+                suite.test(scores == sorted(scores, reverse=True) and
+                           best_confidence == extract_confidence(pred_dir) and
+                           best_confidence['confidence_score'] == max(scores) and
+                           artifact_path(pred_dir, "structure").exists() and
+                           artifact_path(pred_dir, "pae", model=2).exists() and
+                           artifact_path(pred_dir, "pde") is None,
+                          "Index ranks models and resolves artifacts",
+                          f"Scores: {scores}")
+
+                # Test 3: Stale index (renamed copy, trimmed files) is rebuilt
+                copy = tmp / "copy" / "boltz_results_renamed"
+                shutil.copytree(pred_dir, copy)
+                for path in sorted(copy.rglob(f"*{config.stem}*"), key=lambda p: -len(p.parts)):
+                    path.rename(path.with_name(path.name.replace(config.stem, "renamed")))
+                (copy / "predictions" / "renamed" / "renamed_model_0.cif").unlink()
+                rebuilt = load_index(copy)
+                models = analyze_prediction(copy / "predictions" / "renamed")
+                suite.test(rebuilt['stem'] == "renamed" and len(models) == 3 and
+                           sum(m['structure_file'] is None for m in models) == 1,
+                          "Stale index rebuilt on read",
+                          f"Models: {[m['model'] for m in models]}")
+
+    except Exception as e:
+        suite.test(False, "", f"Prediction index test failed with error: {e}")
+
+    return suite
+
+
+def test_sampling_profiles():
+    """Test token-count-aware adaptive sampling profiles."""
+    print_test("Adaptive Sampling Profiles")
+    suite = TestSuite()
+
+    try:
+        from benchmark_screen import build_library, run_benchmark
+        from run_specificity_screen import build_jobs, load_manifest
+        from runner_shards import make_shards
+        from sampling_profiles import PRODUCTION_PROFILES, AdaptiveSampling, estimate_peak_gb
+        PROFILES = {profile.name: profile for profile in PRODUCTION_PROFILES}
+
+        # Test 1: Cheap settings for nanobodies, batch size limited by memory for large jobs
+        small = AdaptiveSampling(24).select(148)
+        large_24 = AdaptiveSampling(24).select(700)
+        large_80 = AdaptiveSampling(80).select(700)
+        suite.test(small['profile'] == "small" and 'max_parallel_samples' not in small['sampling'] and
+                   large_24['sampling']['diffusion_samples'] == 5 and
+                   large_24['sampling']['max_parallel_samples'] == 1 and
+                   large_80['parallel_samples'] > 1 and large_80['peak_gb'] <= 80 * 0.9 and
+                   estimate_peak_gb(400, 2) > estimate_peak_gb(400, 1) > estimate_peak_gb(150, 1),
+                  "Profiles follow token count and GPU memory",
+                  f"Small: {small}, large on 24 GB: {large_24}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            build_library(tmp / "library", 40, chimera_fraction=0.5)
+            configs = load_manifest(tmp / "library")['configs']
+            jobs = build_jobs(tmp / "library", tmp / "results", configs)
+            counts = AdaptiveSampling(24).assign(jobs)
+
+            # Test 2: One profile per variant panel; shards do not mix profiles
+            panels = {}
+            for job in jobs:
+                panels.setdefault(job['config_info']['variant_id'], set()).add(
+                    job['sampling_profile']['profile'])
+            shards = make_shards(jobs, 4)
+            suite.test(len(counts) > 1 and sum(counts.values()) == len(jobs) and
+                       all(len(profiles) == 1 for profiles in panels.values()) and
+                       all(len({str(j['sampling']) for j in shard}) == 1 for shard in shards),
+                      "Profiles chosen per variant, shards grouped by profile",
+                      f"Counts: {dict(counts)}")
+
+            # Test 3: Screen runs and logs the profile of every job (mock Boltz)
+            metrics = run_benchmark(16, tmp, workers=2, quick=False, adaptive_sampling=True,
+                                    gpu_memory_gb=24)
+            with open(tmp / "results_16" / "screening_results.json", 'r') as f:
+                records = json.load(f)['results']
+            suite.test(metrics['successful'] == 16 and
+                       all(r['sampling_profile'] in ("small", "medium", "large") for r in records) and
+                       all(r['job_features']['diffusion_samples'] ==
+                           PROFILES[r['sampling_profile']].diffusion_samples for r in records),
+                      "Adaptive screen records per-job profiles",
+                      f"Profiles: {sorted({r['sampling_profile'] for r in records})}")
+
+    except Exception as e:
+        suite.test(False, "", f"Sampling profile test failed with error: {e}")
+
+    return suite
+
+
+def test_gpu_packer():
+    """Test GPU-memory-aware co-scheduling of jobs."""
+    print_test("GPU Memory Packing")
+    suite = TestSuite()
+
+    try:
+        import threading
+        from benchmark_screen import run_benchmark
+        from gpu_packer import MIN_BUDGET_FRACTION, GpuMemoryPacker
+
+        # Test 1: Jobs spread over devices and share them while they fit
+        packer = GpuMemoryPacker(["0", "1"], 24)
+        placed = [packer.acquire(5.0) for _ in range(8)]
+        blocked = threading.Event()
+
+        def acquire_one_more():
+            packer.acquire(5.0)
+            blocked.set()
+
+        waiter = threading.Thread(target=acquire_one_more, daemon=True)
+        waiter.start()
+        waited = not blocked.wait(0.3)
+        packer.release("0", 5.0)
+        admitted = blocked.wait(2.0)
+        idle = GpuMemoryPacker(["0"], 24)
+        suite.test(placed.count("0") == placed.count("1") == 4 and waited and admitted and
+                   idle.acquire(100.0) == "0",
+                  "Jobs packed per device within the memory budget",
+                  f"Placement: {placed}")
+
+        # Test 2: OOM backs off the device's budget down to a floor
+        packer = GpuMemoryPacker(["0", "1"], 24)
+        first = packer.acquire(5.0)
+        packer.release(first, 5.0, oom=True)
+        after_oom = packer.acquire(5.0)
+        solo = GpuMemoryPacker(["0"], 24)
+        for _ in range(20):
+            solo.release(solo.acquire(5.0), 5.0, oom=True)
+        summary = packer.summary()
+        suite.test(first == "0" and after_oom == "1" and summary["0"]['ooms'] == 1 and
+                   summary["0"]['budget_gb'] < summary["1"]['budget_gb'] and
+                   solo.summary()["0"]['budget_gb'] == 24 * MIN_BUDGET_FRACTION,
+                  "CUDA OOM lowers the device budget",
+                  f"Summary: {summary}")
+
+        # Test 3: Screen co-schedules jobs on one simulated 24 GB GPU (mock Boltz)
+        with tempfile.TemporaryDirectory() as tmp:
+            packed = run_benchmark(16, tmp, workers=6, pack_gpus=1, gpu_memory_gb=24,
+                                   time_scale=0.003)
+            optimistic = run_benchmark(16, tmp, workers=6, pack_gpus=1, gpu_memory_gb=24,
+                                       time_scale=0.003, memory_scale=1.6)
+        suite.test(packed['successful'] == 16 and packed['gpu_ooms'] == 0 and
+                   packed['jobs_per_gpu'] > 1,
+                  "Several jobs share a simulated GPU without OOM",
+                  f"Packed: {packed['jobs_per_gpu']} jobs per GPU")
+        suite.test(optimistic['successful'] == 16 and optimistic['gpu_ooms'] >= 1,
+                  "Optimistic estimates recover through OOM backoff",
+                  f"OOMs: {optimistic['gpu_ooms']}")
+
+    except Exception as e:
+        suite.test(False, "", f"GPU packing test failed with error: {e}")
+
+    return suite
+
+
+def test_disk_watchdog():
+    """Test the disk-space guard of the screen runner."""
+    print_test("Disk Watchdog")
+    suite = TestSuite()
+
+    try:
+        from artifact_retention import tree_size
+        from benchmark_screen import build_library, mock_boltz_env
+        from disk_watchdog import DiskWatchdog
+        from results_log import ResultsLog, iter_log, load_results_log
+        from run_specificity_screen import build_jobs, load_manifest, run_tier
+        from runner_threads import ThreadRunner
+
+        # Test 1: Admission pauses below the threshold and resumes with hysteresis
+        free = {"bytes": 5e9}
+        events = []
+        watchdog = DiskWatchdog("/", min_free_gb=2, resume_free_gb=4, poll_interval=0.01,
+                                log=lambda event, **fields: events.append(event),
+                                free_space=lambda: free['bytes'])
+        admitted = [watchdog._admit()]
+        free['bytes'] = 1e9
+        admitted.append(watchdog._admit())
+        free['bytes'] = 3e9
+        admitted.append(watchdog._admit())
+        free['bytes'] = 4.5e9
+        admitted.append(watchdog._admit())
+        suite.test(admitted == [True, False, False, True] and
+                   events == ["disk_paused", "disk_resumed"] and watchdog.summary()['pauses'] == 1,
+                  "Admission pauses at min free space, resumes at resume threshold",
+                  f"Admitted: {admitted}, events: {events}")
+
+        # Test 2: Screen on a nearly full (simulated) volume completes by trimming outputs
+        with mock_boltz_env():
+            with tempfile.TemporaryDirectory() as tmp:
+                tmp = Path(tmp)
+                build_library(tmp / "library", 12)
+                results = tmp / "results"
+                jobs = build_jobs(tmp / "library", results, load_manifest(tmp / "library")['configs'])
+                log = ResultsLog(results / "screening_results.jsonl")
+                capacity = 1.2e6
+                watchdog = DiskWatchdog(results, min_free_gb=0.0003, poll_interval=0.05,
+                                        log=log.append_event,
+                                        free_space=lambda: capacity - tree_size(results))
+                _, success_count, fail_count = run_tier(jobs, log, ThreadRunner(results, workers=2),
+                                                        quick_mode=True, watchdog=watchdog)
+                log.close()
+                logged = [e['event'] for e in iter_log(log.path) if e['type'] == "event"]
+                summary = watchdog.summary()
+                compacted = load_results_log(log.path)
+        suite.test(success_count == 12 and fail_count == 0 and
+                   "disk_paused" in logged and "disk_cleanup" in logged and "disk_resumed" in logged and
+                   summary['cleaned_mb'] > 0 and summary['jobs_measured'] == 12 and
+                   compacted['successful'] == 12,
+                  "Screen pauses, cleans up and finishes on a full volume",
+                  f"Summary: {summary}, events: {len(logged)}")
+
+    except Exception as e:
+        suite.test(False, "", f"Disk watchdog test failed with error: {e}")
+
+    return suite
+
+
+def test_fair_share():
+    """Test weighted fair sharing of a worker spool between libraries."""
+    print_test("Fair Share")
+    suite = TestSuite()
+
+    try:
+        from boltz_worker import BoltzWorker, submit_job, poll_results
+        from fair_share import library_stats, register_library
+
+        class FakeBackend:
+            name = "fake"
+
+            def predict(self, job):
+                stem = Path(job['config_file']).stem
+                pred = Path(job['output_dir']) / f"boltz_results_{stem}" / "predictions" / stem
+                pred.mkdir(parents=True, exist_ok=True)
+                with open(pred / f"confidence_{stem}_model_0.json", 'w') as f:
+                    json.dump({'confidence_score': 0.5}, f)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            spool = tmpdir / "spool"
+            config = tmpdir / "var_vs_dATP.yaml"
+            config.write_text("version: 1\n")
+            sampling = {'diffusion_samples': 1, 'sampling_steps': 50, 'recycling_steps': 1}
+
+            def submit(library, count, cost=100.0):
+                for i in range(count):
+                    submit_job(spool, config, tmpdir / library / str(i), sampling,
+                               job_id=f"{library}.{i}", library=library, cost=cost)
+
+            def claim(worker, count):
+                libraries = []
+                for _ in range(count):
+                    with open(worker.claim_next(), 'r') as f:
+                        libraries.append(json.load(f)['library'])
+                return libraries
+
+            register_library(spool, "cdr", weight=3)
+            register_library(spool, "chimera", weight=1)
+            submit("cdr", 10)
+            submit("chimera", 10)
+            worker = BoltzWorker(spool, FakeBackend(), device_id=0, worker_id="w0")
+
+            # Test 1: Claims split by weight (charged at predicted cost)
+            claimed = claim(worker, 8)
+            suite.test(claimed.count("cdr") == 6 and claimed.count("chimera") == 2,
+                      "Weight 3:1 libraries served 6:2",
+                      f"Claimed {claimed}")
+
+            # Test 2: A higher-priority library is served first
+            register_library(spool, "denovo", priority=1)
+            submit("denovo", 2)
+            claimed = claim(worker, 3)
+            suite.test(claimed[:2] == ["denovo", "denovo"] and claimed[2] != "denovo",
+                      "Priority library claimed before the others",
+                      f"Claimed {claimed}")
+
+            # Test 3: A late library starts at the others' virtual time
+            # instead of claiming everything until it has caught up
+            submit("late", 6)
+            claimed = claim(worker, 4)
+            suite.test(0 < claimed.count("late") < 4,
+                      "Late library shares the pool instead of monopolizing it",
+                      f"Claimed {claimed}")
+
+            # Test 4: Finished jobs report per-library throughput and queue waits
+            for job_file in sorted(worker.running_dir.glob("*.json")):
+                worker.run_job(job_file)
+            results = poll_results(spool, [f"cdr.{i}" for i in range(10)])
+            stats = library_stats(spool)
+            suite.test(sum(s['jobs'] for s in stats.values()) == 15 and
+                       stats['denovo']['jobs'] == 2 and stats['cdr']['weight_share'] == 0.5 and
+                       stats['cdr']['mean_wait_s'] >= 0 and
+                       all(r['queue_wait'] >= 0 for r in results.values()),
+                      "Per-library jobs, weight shares and queue waits reported",
+                      f"Stats: {stats}")
+
+    except Exception as e:
+        suite.test(False, "", f"Fair share test failed with error: {e}")
+
+    return suite
+
+
+def test_affinity_tier():
+    """Test affinity re-runs of the shortlisted variants."""
+    print_test("Affinity Tier")
+    suite = TestSuite()
+
+    try:
+        from analyze_specificity import calculate_specificity_scores
+        from benchmark_screen import build_library, mock_boltz_env
+        from run_specificity_screen import run_batch_predictions
+
+        with mock_boltz_env():
+            with tempfile.TemporaryDirectory() as tmp:
+                tmp = Path(tmp)
+                build_library(tmp / "library", 24)
+                final = run_batch_predictions(tmp / "library", tmp / "results", quick_mode=True,
+                                              workers=2, affinity_top_n=1)
+                affinity_configs = sorted((tmp / "results" / "affinity" / "configs").glob("*.yaml"))
+                with open(affinity_configs[0], 'r') as f:
+                    properties = yaml.safe_load(f).get('properties')
+
+        records = final['results']
+        structure = [r for r in records if r.get('tier') != 'affinity']
+        affinity = [r for r in records if r.get('tier') == 'affinity']
+        targets = {r['target_nucleotide'] for r in structure}
+
+        # Test 1: Structure-only screen, then one shortlisted variant per nucleotide re-run
+        suite.test(len(structure) == 24 and not any('affinity' in r for r in structure) and
+                   len(affinity) == 4 * len(targets) and all(r.get('affinity') for r in affinity) and
+                   properties == [{'affinity': {'binder': 'B'}}],
+                  "Affinity requested only for the shortlisted variants' panels",
+                  f"{len(structure)} structure / {len(affinity)} affinity records, properties {properties}")
+
+        # Test 2: Affinity re-runs leave the structure ranking unchanged
+        scored = calculate_specificity_scores(final)
+        baseline = calculate_specificity_scores({'results': structure})
+        suite.test(list(scored['combined_score']) == list(baseline['combined_score']),
+                  "Structure metrics come from the structure screen only",
+                  "Affinity records changed the structure metrics")
+
+        # Test 3: Fold-selectivity = min IC50(off-target) / IC50(target)
+        shortlisted = scored[scored['affinity_fold_selectivity'].notna()]
+        variant = shortlisted.iloc[0]
+        panel = {r['test_nucleotide']: r['affinity']['affinity_pred_value']
+                 for r in affinity if r['variant_id'] == variant['variant_id']}
+        target = variant['target_nucleotide']
+        expected = min(10 ** (value - panel[target]) for nuc, value in panel.items() if nuc != target)
+        suite.test(len(shortlisted) == len(targets) and
+                   abs(variant['affinity_fold_selectivity'] - expected) < 1e-9 * expected and
+                   variant['affinity_selective'] == (expected > 10),
+                  "Fold-selectivity computed from predicted IC50s",
+                  f"Got {variant['affinity_fold_selectivity']}, expected {expected}")
+
+        # Test 4: Warm persistent workers cannot produce affinity outputs
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                run_batch_predictions(tmp, Path(tmp) / "results", backend="spool",
+                                      backend_options={"spool_dir": Path(tmp) / "spool"},
+                                      affinity_top_n=1)
+                rejected = False
+            except ValueError as e:
+                rejected = "worker-spool" in str(e)
+        suite.test(rejected,
+                  "Affinity re-runs rejected with persistent workers",
+                  "--affinity-top-n accepted with --worker-spool")
+
+    except Exception as e:
+        suite.test(False, "", f"Affinity tier test failed with error: {e}")
+
+    return suite
+
+
+def test_specificity_tensor():
+    """Test the dense specificity tensor against hand-computed metrics."""
+    print_test("Specificity Tensor")
+    suite = TestSuite()
+
+    try:
+        import numpy as np
+        from analyze_specificity import rank_candidates
+        from specificity_tensor import NUCLEOTIDES, SpecificityTensor, specificity_frame
+
+        def record(variant, target, test, conf, iptm, **extra):
+            return {'variant_id': variant, 'target_nucleotide': target, 'test_nucleotide': test,
+                    'mutations': f"{variant}_mut", 'is_target': test == target,
+                    'confidence': {'confidence_score': conf, 'ligand_iptm': iptm, 'complex_plddt': 0.8},
+                    **extra}
+
+        scores = {'dATP': (0.9, 0.8), 'dGTP': (0.3, 0.2), 'dCTP': (0.5, 0.4), 'dTTP': (0.1, 0.2)}
+        results = [record('v1', 'dATP', nuc, *scores[nuc]) for nuc in NUCLEOTIDES]
+        # v2: one off-target pruned, one failed, and a retried target record
+        results += [record('v2', 'dGTP', 'dGTP', 0.2, 0.2), record('v2', 'dGTP', 'dATP', 0.4, 0.4),
+                    {**record('v2', 'dGTP', 'dCTP', 0, 0), 'status': 'pruned', 'confidence': None},
+                    {**record('v2', 'dGTP', 'dTTP', 0, 0), 'confidence': None},
+                    record('v2', 'dGTP', 'dGTP', 0.6, 0.5)]
+        # v3: quick and production tiers; v4: no target prediction
+        results += [record('v3', 'dCTP', nuc, 0.9, 0.9, tier='quick') for nuc in NUCLEOTIDES]
+        results += [record('v3', 'dCTP', nuc, 0.7 if nuc == 'dCTP' else 0.35, 0.5, tier='production')
+                    for nuc in NUCLEOTIDES]
+        results += [record('v4', 'dTTP', 'dATP', 0.5, 0.5),
+                    record('v3', 'dCTP', 'dATP', 0.9, 0.9, tier='affinity')]
+
+        tensor = SpecificityTensor.from_results(results)
+        df = specificity_frame(tensor).set_index('variant_id')
+
+        # Test 1: Variants, tiers and set-aside affinity records
+        suite.test(list(tensor.variant_ids) == ['v1', 'v2', 'v3'] and tensor.values.shape == (3, 4, 3) and
+                   list(tensor.mask.sum(axis=1)) == [4, 2, 4] and len(tensor.affinity_records) == 1 and
+                   df.loc['v3', 'tier'] == 'production',
+                  "One row per variant with a target prediction, production tier preferred",
+                  f"Variants {list(tensor.variant_ids)}, mask {tensor.mask.tolist()}")
+
+        # Test 2: Metrics match the per-variant formulas
+        v1 = df.loc['v1']
+        mean_off = (0.3 + 0.5 + 0.1) / 3
+        suite.test(abs(v1['specificity_ratio_conf'] - 0.9 / mean_off) < 1e-12 and
+                   abs(v1['selectivity_conf'] - 0.4) < 1e-12 and
+                   abs(v1['selectivity_iptm'] - 0.4) < 1e-12 and
+                   abs(v1['combined_score'] - 0.9 * 0.9 / mean_off) < 1e-12 and v1['panel_complete'],
+                  "Ratios, selectivities and combined score",
+                  f"Got {v1[['specificity_ratio_conf', 'selectivity_conf', 'combined_score']].tolist()}")
+
+        # Test 3: Later records replace earlier ones; pruned and failed cells stay empty
+        v2 = df.loc['v2']
+        suite.test(v2['target_confidence'] == 0.6 and v2['n_off_targets'] == 1 and
+                   v2['status'] == 'pruned' and np.isnan(v2['dCTP_confidence']) and
+                   abs(v2['combined_score'] - 0.6 * 1.5) < 1e-12,
+                  "Retried, pruned and failed records",
+                  f"Got {v2.to_dict()}")
+
+        # Test 4: Ranking over the frame
+        ranked = rank_candidates(specificity_frame(tensor))
+        suite.test(list(ranked['variant_id']) == ['v1', 'v3', 'v2'],
+                  "Variants ranked by combined score",
+                  f"Got {list(ranked['variant_id'])}")
+
+    except Exception as e:
+        suite.test(False, "", f"Specificity tensor test failed with error: {e}")
+
+    return suite
+
+
+def test_streaming_analysis():
+    """Test the bounded-memory streaming analysis against the full analysis."""
+    print_test("Streaming Analysis")
+    suite = TestSuite()
+
+    try:
+        import random
+        import analyze_specificity
+        from streaming_analysis import StreamingAnalysis, analyze_stream, iter_results_json
+
+        rng = random.Random(7)
+        nucleotides = ['dATP', 'dGTP', 'dCTP', 'dTTP']
+
+        def record(variant, target, test, tier, **extra):
+            return {'variant_id': variant, 'target_nucleotide': target, 'test_nucleotide': test,
+                    'mutations': f"{variant}_mut", 'is_target': test == target, 'tier': tier,
+                    'status': 'success',
+                    'confidence': {'confidence_score': round(rng.random(), 4),
+                                   'ligand_iptm': round(rng.random(), 4), 'complex_plddt': 0.8},
+                    **extra}
+
+        # Tiered screen: quick tier for all, production re-run of every third variant,
+        # one pruned off-target per fifth variant
+        variants = [(f"v{i:03d}", nucleotides[i % 4]) for i in range(60)]
+        results = []
+        for i, (variant, target) in enumerate(variants):
+            for nuc in nucleotides:
+                extra = {'status': 'pruned', 'confidence': None} if i % 5 == 0 and nuc != target else {}
+                results.append(record(variant, target, nuc, 'quick', **extra))
+        results += [record(variant, target, nuc, 'production')
+                    for variant, target in variants[::3] for nuc in nucleotides]
+        data = {'timestamp': 'now', 'total_predictions': len(results), 'successful': len(results),
+                'failed': 0, 'mode': 'tiered', 'results': results}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            results_file = tmp / "screening_results.json"
+            with open(results_file, 'w') as f:
+                json.dump(data, f, indent=2)
+
+            # Test 1: Incremental JSON parsing across small chunks
+            header = {}
+            streamed = list(iter_results_json(results_file, header, chunk_size=7))
+            suite.test(streamed == results and header['mode'] == 'tiered' and 'results' not in header,
+                      "Records streamed from screening_results.json",
+                      f"{len(streamed)}/{len(results)} records, header {sorted(header)}")
+
+            # Test 2: Same report and top binders as the full analysis
+            df = analyze_specificity.rank_candidates(analyze_specificity.calculate_specificity_scores(data))
+            analyze_specificity.save_analysis_results(df, tmp / "full")
+            analysis = analyze_stream(results_file, buffer_variants=4)
+            analysis.save(tmp / "streaming")
+            outputs = ["specificity_report.txt"] + [f"top_binders_{nuc}.csv" for nuc in nucleotides]
+            differing = [name for name in outputs
+                         if (tmp / "full" / name).read_text() != (tmp / "streaming" / name).read_text()]
+            suite.test(not differing and analysis.n_variants == len(df) and
+                       not (tmp / "streaming" / "specificity_analysis.csv").exists(),
+                      "Streaming report matches the full analysis",
+                      f"Differing outputs: {differing}")
+
+            # Test 3: Running per-nucleotide summary
+            full_summary = analyze_specificity.summarize_by_nucleotide(df)
+            summary = analysis.nucleotide_summary()
+            suite.test(all(summary[nuc]['n_variants'] == full_summary[nuc]['n_variants'] and
+                           abs(summary[nuc]['mean_ratio'] - full_summary[nuc]['mean_ratio']) < 1e-9 and
+                           summary[nuc]['best_ratio'] == full_summary[nuc]['best_ratio'] and
+                           summary[nuc]['best']['variant_id'] == full_summary[nuc]['best']['variant_id']
+                           for nuc in nucleotides),
+                      "Running summary statistics match",
+                      f"Got {summary}")
+
+        # Test 4: Interleaved panels within the buffer; incomplete panels evicted when it fills
+        untiered = [r for r in results if r['tier'] == 'quick']
+        interleaved = sorted(untiered, key=lambda r: (int(r['variant_id'][1:]) // 3, r['test_nucleotide']))
+        in_window = StreamingAnalysis(buffer_variants=4).add_all(interleaved)
+        too_small = StreamingAnalysis(buffer_variants=2).add_all(interleaved)
+        expected = StreamingAnalysis().add_all(untiered).top_candidates()
+        suite.test(in_window.n_evicted == 0 and
+                   list(in_window.top_candidates()['variant_id']) == list(expected['variant_id']) and
+                   too_small.n_evicted > 0,
+                  "Panels grouped across interleaved records",
+                  f"Evicted {in_window.n_evicted} (buffer 4), {too_small.n_evicted} (buffer 2)")
+
+        # Test 5: Log with an earlier run and retried records -> one row per variant,
+        # same ranking as the compacted log
+        from results_log import ResultsLog, compact_results_log
+        with tempfile.TemporaryDirectory() as tmp:
+            log_file = Path(tmp) / "screening_results.jsonl"
+            with ResultsLog(log_file) as log:
+                log.start_run("quick", len(untiered))
+                for i, r in enumerate(untiered[:40]):
+                    log.append_result(i, dict(r, confidence={'confidence_score': 0.99, 'ligand_iptm': 0.99}))
+            with ResultsLog(log_file) as log:
+                log.start_run("quick", len(untiered), resume=True)
+                for i, r in enumerate(untiered):
+                    if r['test_nucleotide'] == 'dGTP':
+                        # Retried job: the failed attempt's record is replaced
+                        log.append_result(i, dict(r, confidence={'confidence_score': 0.0, 'ligand_iptm': 0.0}))
+                    log.append_result(i, r)
+            analysis = analyze_stream(log_file, buffer_variants=4)
+            compacted = compact_results_log(log_file, Path(tmp) / "screening_results.json")
+            full = analyze_specificity.rank_candidates(analyze_specificity.calculate_specificity_scores(compacted))
+            top = analysis.top_candidates()
+        suite.test(analysis.skipped_runs == 1 and analysis.n_duplicates == len(untiered) // 4 and
+                   top['variant_id'].is_unique and
+                   list(top['variant_id'][:10]) == list(full['variant_id'][:10]),
+                  "Earlier runs skipped and retried records deduplicated",
+                  f"Skipped {analysis.skipped_runs} runs, {analysis.n_duplicates} duplicates, "
+                  f"top {list(top['variant_id'][:10])} vs {list(full['variant_id'][:10])}")
+
+        # Test 6: Target-first order -> off-targets of evicted variants detected, not scored twice
+        target_first = ([r for r in untiered if r['is_target']] +
+                        [r for r in untiered if not r['is_target']])
+        late = StreamingAnalysis(buffer_variants=4).add_all(target_first)
+        suite.test(late.n_late > 0 and late.top_candidates()['variant_id'].is_unique and
+                   late.n_variants == len(variants),
+                  "Records arriving after their variant was scored are detected",
+                  f"{late.n_late} late records, {late.n_variants} variants scored")
+
+    except Exception as e:
+        suite.test(False, "", f"Streaming analysis test failed with error: {e}")
+
+    return suite
+
+
 def run_all_tests():
     """Run all test suites."""
     print("="*80)
@@ -535,6 +2224,29 @@ def run_all_tests():
     all_suites.append(test_optogenetic_insertion())
     all_suites.append(test_data_consistency())
     all_suites.append(test_error_handling())
+    all_suites.append(test_msa_profile())
+    all_suites.append(test_boltz_worker_queue())
+    all_suites.append(test_screen_resume())
+    all_suites.append(test_results_log())
+    all_suites.append(test_prediction_cache())
+    all_suites.append(test_tiered_screening())
+    all_suites.append(test_target_first_pruning())
+    all_suites.append(test_cost_model())
+    all_suites.append(test_lpt_scheduler())
+    all_suites.append(test_failure_policy())
+    all_suites.append(test_async_orchestrator())
+    all_suites.append(test_shared_queue())
+    all_suites.append(test_mock_boltz_benchmark())
+    all_suites.append(test_cpu_profile())
+    all_suites.append(test_artifact_retention())
+    all_suites.append(test_prediction_index())
+    all_suites.append(test_sampling_profiles())
+    all_suites.append(test_gpu_packer())
+    all_suites.append(test_disk_watchdog())
+    all_suites.append(test_fair_share())
+    all_suites.append(test_affinity_tier())
+    all_suites.append(test_specificity_tensor())
+    all_suites.append(test_streaming_analysis())
 
     # Summary
     total_passed = sum(s.passed for s in all_suites)
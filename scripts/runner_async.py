@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Asyncio execution backend (--orchestrator async).
+
+Single jobs run on one asyncio event loop in a background thread
+(async_orchestrator.py) instead of a thread each: Boltz stdout/stderr
+are streamed into <output_dir>/boltz.log while it runs, and every
+queued/started/retrying/finished/failed job is reported as a progress
+event to <results>/screen_events.jsonl.
+"""
+
+import asyncio
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from async_orchestrator import AsyncOrchestrator, ProgressEvents, EVENTS_LOG_NAME, stream_subprocess
+from failure_policy import classify_failure, error_summary, plan_retry
+from job_scheduler import JobQueue
+from prediction_index import prediction_dir_for, write_index
+from screen_jobs import build_boltz_command, device_env, get_sampling_params, job_outcome
+from screen_runners import Runner
+
+
+async def run_boltz_prediction_async(config_file, output_dir, quick_mode=False, device_id=None,
+                                     timeout=600, params=None, accelerator="gpu"):
+    """
+    Asyncio version of screen_jobs.run_boltz_prediction_detailed (no cache
+    lookup).
+
+    Boltz stdout/stderr are streamed into <output_dir>/boltz.log while it
+    runs; the failure class is taken from the stderr tail.
+    """
+    params = params or get_sampling_params(quick_mode, accelerator)
+    start_time = time.time()
+
+    def failed(failure_class, returncode=None, error=""):
+        return {"success": False, "prediction_dir": None, "elapsed": time.time() - start_time,
+                "failure_class": failure_class, "returncode": returncode, "error": error}
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    cmd = build_boltz_command(config_file, output_dir, 1, quick_mode, params, accelerator)
+
+    try:
+        result = await stream_subprocess(cmd, env=device_env(device_id, accelerator), timeout=timeout,
+                                         log_file=output_path / "boltz.log")
+    except OSError as e:
+        print(f"  EXCEPTION: {str(e)[:200]}")
+        return failed(classify_failure(stderr=f"{type(e).__name__}: {e}"), error=str(e)[:300])
+
+    if result['timed_out']:
+        print(f"  TIMEOUT after {timeout / 60:.1f} minutes")
+        return failed("timeout", error=f"Timed out after {timeout:.0f}s")
+
+    if result['returncode'] == 0:
+        pred_dir = prediction_dir_for(output_dir, config_file)
+        if write_index(pred_dir) is not None:
+            return {"success": True, "prediction_dir": pred_dir, "elapsed": result['elapsed']}
+        return failed("unknown", result['returncode'], "No prediction outputs written")
+
+    failure_class = classify_failure(result['returncode'], result['stderr'])
+    error = error_summary(result['stderr'])
+    print(f"  ERROR [{failure_class}]: {error[:200]}")
+    return failed(failure_class, result['returncode'], error)
+
+
+async def execute_job_async(job, orchestrator, quick_mode=False, accelerator="gpu"):
+    """
+    Asyncio version of screen_jobs.execute_job: same retry policy, with a
+    device from the orchestrator held per attempt and progress events
+    emitted for every start, retry and final outcome.
+
+    Returns:
+        [(job, result record or None, elapsed_time, device_id, failure or None)]
+    """
+    events = orchestrator.events
+    name = job['config_file'].stem
+    base_sampling = job.get('sampling') or get_sampling_params(quick_mode, accelerator)
+    sampling = dict(base_sampling)
+    timeout = job.get('timeout') or 600
+    failure_history = []
+
+    while True:
+        async with orchestrator.device() as device_id:
+            events.emit("started", job=name, index=job['index'], tier=job.get('tier'),
+                        device=device_id, attempt=len(failure_history) + 1, timeout=timeout)
+            outcome = await run_boltz_prediction_async(
+                job['config_file'], job['output_dir'], quick_mode=quick_mode,
+                device_id=device_id, timeout=timeout, params=sampling, accelerator=accelerator
+            )
+
+        if outcome['success']:
+            break
+        failure_history.append(outcome['failure_class'])
+        retry = plan_retry(outcome['failure_class'], len(failure_history), sampling, timeout)
+        if retry is None:
+            break
+
+        events.emit("retrying", job=name, index=job['index'], tier=job.get('tier'),
+                    failure_class=outcome['failure_class'], attempt=len(failure_history) + 1,
+                    delay=retry['delay'])
+        print(f"  RETRY {name} [{outcome['failure_class']}] "
+              f"attempt {len(failure_history) + 1} in {retry['delay']:.0f}s")
+        # Partial outputs would make boltz skip the input
+        shutil.rmtree(job['output_dir'], ignore_errors=True)
+        await asyncio.sleep(retry['delay'])
+        sampling, timeout = retry['sampling'], retry['timeout']
+
+    result = job_outcome(job, outcome, device_id, failure_history, sampling, base_sampling)
+    if outcome['success']:
+        events.emit("finished", job=name, index=job['index'], tier=job.get('tier'),
+                    device=device_id, elapsed=outcome['elapsed'], attempts=len(failure_history) + 1)
+    else:
+        failure = result[4]
+        events.emit("failed", job=name, index=job['index'], tier=job.get('tier'),
+                    device=device_id, failure_class=failure['failure_class'],
+                    attempts=failure['attempts'], error=failure['error'])
+    return [result]
+
+
+def run_jobs_async(job_queue, quick_mode=False, workers=1, device_pool=None, events=None,
+                   accelerator="gpu", watchdog=None):
+    """
+    Run queued jobs on one asyncio event loop (in a background thread) and
+    yield outcomes as they finish.
+
+    Up to `workers` Boltz subprocesses run concurrently without a thread per
+    job; the next item is popped from job_queue only when a slot frees up,
+    so re-prioritizing the queue between outcomes takes effect. A
+    watchdog (DiskWatchdog) can hold a job back until there is disk space.
+
+    Yields:
+        [(job, result record or None, elapsed_time, device_id, failure or None)]
+    """
+    orchestrator = AsyncOrchestrator(
+        workers, device_ids=list(device_pool.queue) if device_pool is not None else None,
+        events=events)
+    for item in job_queue.items():
+        for job in item:
+            orchestrator.events.emit("queued", job=job['config_file'].stem, index=job['index'],
+                                     tier=job.get('tier'))
+
+    outcomes = queue.Queue()
+    finished = object()
+
+    async def execute(item):
+        if watchdog is not None:
+            await watchdog.wait_for_space_async()
+        return await execute_job_async(item[0], orchestrator, quick_mode, accelerator)
+
+    def run_loop():
+        try:
+            asyncio.run(orchestrator.run(job_queue.pop, execute, outcomes.put))
+        except BaseException as e:
+            outcomes.put(e)
+        outcomes.put(finished)
+
+    thread = threading.Thread(target=run_loop, name="screen-orchestrator", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = outcomes.get()
+            if item is finished:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Interrupted: cancel in-flight jobs (kills their process groups)
+        orchestrator.stop()
+        thread.join()
+
+
+class AsyncRunner(Runner):
+    """Runs single jobs on one event loop, logging progress events to <results>/screen_events.jsonl."""
+
+    name = "async"
+    label = "The async orchestrator (--orchestrator async)"
+    unsupported = {
+        "--pack-gpus": "the event loop hands out fixed device slots",
+    }
+
+    def __init__(self, results_path, workers=1, device_pool=None, accelerator="gpu", resume=False):
+        super().__init__(results_path, workers, device_pool, accelerator, resume)
+        self.events_file = self.results_path / EVENTS_LOG_NAME
+        self.events = None
+        self.job_queue = None
+
+    def describe(self):
+        return f"Orchestrator: asyncio, {self.workers} concurrent jobs (events: {self.events_file})"
+
+    def start(self):
+        self.events = ProgressEvents(self.events_file)
+
+    def run(self, jobs, quick_mode=False, cost_fn=None, watchdog=None):
+        self.job_queue = JobQueue([[job] for job in jobs], cost_fn)
+        return run_jobs_async(self.job_queue, quick_mode, self.workers, self.device_pool, self.events,
+                              self.accelerator, watchdog)
+
+    def reprioritize(self, remaining, cost_fn):
+        if self.job_queue is not None:
+            self.job_queue.reprioritize()
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Sharded execution backend: several configs per `boltz predict` call.
+
+The configs of a shard are staged into one input directory so the model
+is loaded once per shard (--shard-size), then the outputs are fanned back
+out into each job's own directory. Shards run on the thread pool of
+runner_threads.py; members that fail in a shard are re-run individually
+under the per-job retry policy.
+"""
+
+import json
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from failure_policy import classify_failure, error_summary
+from prediction_index import write_index
+from runner_threads import ThreadRunner
+from screen_jobs import (acquire_device, build_boltz_command, device_env, execute_job,
+                         get_sampling_params, job_outcome, release_device)
+
+
+def fan_out_shard_outputs(shard_results_dir, jobs):
+    """
+    Move per-config outputs of a sharded run into each job's own
+    `<output_dir>/boltz_results_<config stem>/` tree, mirroring the layout
+    of a single-config invocation.
+
+    Returns:
+        Dict of config stem -> prediction directory (None if no outputs)
+    """
+    shard_results_dir = Path(shard_results_dir)
+    shard_processed = shard_results_dir / "processed"
+    shard_manifest = {}
+    manifest_file = shard_processed / "manifest.json"
+    if manifest_file.exists():
+        with open(manifest_file, 'r') as f:
+            shard_manifest = {r['id']: r for r in json.load(f).get('records', [])}
+
+    prediction_dirs = {}
+    for job in jobs:
+        stem = job['config_file'].stem
+        pred_dir = Path(job['output_dir']) / f"boltz_results_{stem}"
+
+        source = shard_results_dir / "predictions" / stem
+        if not source.exists():
+            prediction_dirs[stem] = None
+            continue
+
+        (pred_dir / "predictions").mkdir(parents=True, exist_ok=True)
+        shutil.move(str(source), str(pred_dir / "predictions" / stem))
+
+        # Per-record preprocessing artifacts (structures, msa, mols, records, ...)
+        if shard_processed.exists():
+            for sub in shard_processed.iterdir():
+                if not sub.is_dir():
+                    continue
+                for item in sub.iterdir():
+                    if item.stem == stem or item.name.startswith(stem + "_"):
+                        (pred_dir / "processed" / sub.name).mkdir(parents=True, exist_ok=True)
+                        shutil.move(str(item), str(pred_dir / "processed" / sub.name / item.name))
+            if stem in shard_manifest:
+                with open(pred_dir / "processed" / "manifest.json", 'w') as f:
+                    json.dump({"records": [shard_manifest[stem]]}, f)
+
+        prediction_dirs[stem] = pred_dir
+
+    return prediction_dirs
+
+
+def run_boltz_shard(jobs, staging_dir, devices=1, quick_mode=False, device_id=None,
+                    accelerator="gpu", params=None):
+    """
+    Run several configs in one `boltz predict` invocation.
+
+    The configs are staged into a single input directory so the model is
+    loaded once per shard, then outputs are fanned back out per config.
+
+    Returns:
+        List of (success, prediction_dir, elapsed_time), one per job. The
+        elapsed time is the shard wall time divided evenly across its jobs.
+    """
+    staging_dir = Path(staging_dir)
+    if staging_dir.exists():
+        shutil.rmtree(staging_dir)
+    inputs_dir = staging_dir / "inputs"
+    inputs_dir.mkdir(parents=True)
+    for job in jobs:
+        shutil.copy2(job['config_file'], inputs_dir / job['config_file'].name)
+
+    start_time = time.time()
+    cmd = build_boltz_command(inputs_dir, staging_dir / "out", devices, quick_mode, params=params,
+                              accelerator=accelerator)
+    timeout = sum(job.get('timeout') or 600 for job in jobs)
+
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=timeout,  # sum of per-job timeouts
+            env=device_env(device_id, accelerator)
+        )
+        if result.returncode != 0:
+            print(f"  ERROR (shard {staging_dir.name}) [{classify_failure(result.returncode, result.stderr)}]: "
+                  f"{error_summary(result.stderr)[:200]}")
+    except subprocess.TimeoutExpired:
+        print(f"  TIMEOUT (shard {staging_dir.name}) after {timeout / 60:.1f} minutes")
+    except Exception as e:
+        print(f"  EXCEPTION (shard {staging_dir.name}): {str(e)[:200]}")
+
+    elapsed = (time.time() - start_time) / len(jobs)
+
+    # Fan out whatever completed, even if the process failed partway
+    prediction_dirs = fan_out_shard_outputs(staging_dir / "out" / f"boltz_results_{inputs_dir.name}", jobs)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    outcomes = []
+    for job in jobs:
+        pred_dir = prediction_dirs.get(job['config_file'].stem)
+        success = pred_dir is not None and write_index(pred_dir) is not None
+        outcomes.append((success, pred_dir if success else None, elapsed))
+    return outcomes
+
+
+def execute_shard(jobs, staging_dir, quick_mode=False, device_pool=None, accelerator="gpu"):
+    """
+    Run a shard of jobs in one Boltz invocation, holding one device.
+
+    Members that fail in the shard are re-run individually under the
+    per-job retry policy, so one bad input cannot sink its shard.
+
+    Returns:
+        List of (job, result record or None, elapsed_time, device_id, failure or None)
+    """
+    # make_shards keeps jobs with different sampling profiles apart
+    sampling = jobs[0].get('sampling') or get_sampling_params(quick_mode, accelerator)
+    device_id = acquire_device(device_pool, jobs, sampling)
+    try:
+        outcomes = run_boltz_shard(jobs, staging_dir, devices=1, quick_mode=quick_mode,
+                                   device_id=device_id, accelerator=accelerator, params=sampling)
+    finally:
+        release_device(device_pool, device_id, jobs, sampling)
+
+    results = []
+    for job, (success, pred_dir, elapsed) in zip(jobs, outcomes):
+        if success:
+            outcome = {"success": True, "prediction_dir": pred_dir, "elapsed": elapsed}
+            results.append(job_outcome(job, outcome, device_id, [], sampling, sampling))
+            continue
+        print(f"  Shard member {job['config_file'].stem} failed; re-running individually")
+        shutil.rmtree(job['output_dir'], ignore_errors=True)
+        results.extend(execute_job(job, quick_mode, device_pool, accelerator))
+    return results
+
+
+def make_shards(jobs, shard_size):
+    """
+    Group jobs into consecutive shards of at most shard_size; a shard is
+    one Boltz invocation, so a change of sampling profile starts a new one.
+    """
+    shards = []
+    for job in jobs:
+        if (not shards or len(shards[-1]) >= shard_size
+                or job.get('sampling') != shards[-1][0].get('sampling')):
+            shards.append([])
+        shards[-1].append(job)
+    return shards
+
+
+class ShardRunner(ThreadRunner):
+    """Runs shards of shard_size jobs, staged under <results>/_shards, on the thread pool."""
+
+    name = "shards"
+    label = "Sharding (--shard-size)"
+
+    def __init__(self, results_path, workers=1, device_pool=None, accelerator="gpu", resume=False,
+                 shard_size=2):
+        super().__init__(results_path, workers, device_pool, accelerator, resume)
+        self.shard_size = shard_size
+        self.staging_root = self.results_path / "_shards"
+
+    def describe(self):
+        return f"Shard size: {self.shard_size} configs per Boltz invocation"
+
+    def items(self, jobs):
+        return make_shards(jobs, self.shard_size)
+
+    def execute(self, item, quick_mode):
+        return execute_shard(item, self.staging_root / f"shard_{item[0]['index']:06d}",
+                             quick_mode, self.device_pool, self.accelerator)
+
+    def close(self):
+        shutil.rmtree(self.staging_root, ignore_errors=True)
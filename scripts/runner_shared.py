@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Multi-node execution backend (--shared-queue).
+
+Every node runs the same screen command on a shared filesystem and claims
+jobs through leases in <results>/queue (shared_queue.py), running them on
+a local thread pool. Each node logs to screening_results.<node_id>.jsonl;
+results of jobs finished by other nodes are read from their logs once all
+jobs are done, and every node compacts the merge of all nodes' logs.
+"""
+
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from results_log import merge_results_logs, node_log_path, node_log_paths, record_key
+from runner_spool import worker_job_id
+from screen_jobs import execute_job
+from screen_runners import Runner, admitted
+from shared_queue import SharedWorkQueue
+
+
+def run_jobs_shared(jobs, work_queue, run_item, slots, poll_interval=5.0):
+    """
+    Run jobs claimed from a multi-node SharedWorkQueue, `slots` at a time,
+    and yield outcomes as they finish.
+
+    A job is marked done only after its outcome was consumed (logged), so a
+    node dying in between leaves a stale lease and the job is re-run. When
+    every remaining job is leased by other nodes, this waits for them to
+    finish (or for their leases to go stale) before returning.
+
+    Yields:
+        Outcome lists from run_item, in completion order
+    """
+    by_id = {worker_job_id(job): job for job in jobs}
+    pending = list(by_id)
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=slots)
+    try:
+        while True:
+            while len(in_flight) < slots:
+                job_id = work_queue.claim_next(j for j in pending if j not in in_flight.values())
+                if job_id is None:
+                    break
+                in_flight[executor.submit(run_item, by_id[job_id])] = job_id
+            if not in_flight:
+                pending = work_queue.pending(pending)
+                if not pending:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = in_flight.pop(future)
+                outcomes = future.result()
+                yield outcomes
+                work_queue.complete(job_id, success=all(o[1] is not None for o in outcomes))
+                pending.remove(job_id)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        # Interrupted: outcomes of these were not logged, let other nodes re-run them
+        for job_id in in_flight.values():
+            work_queue.release(job_id)
+
+
+class SharedQueueRunner(Runner):
+    """
+    Runs the jobs this node claims from the queue in <results>/queue,
+    joining the current screen there (or, with resume, the one in progress).
+    """
+
+    name = "shared"
+    label = "The shared queue (--shared-queue)"
+    # A job's directory may belong to another node until it is claimed
+    exclusive_outputs = False
+
+    def __init__(self, results_path, workers=1, device_pool=None, accelerator="gpu", resume=False,
+                 node_id=None):
+        super().__init__(results_path, workers, device_pool, accelerator, resume)
+        self.work_queue = SharedWorkQueue(self.results_path / "queue", node_id)
+        self.work_queue.join_screen(resume)
+        self.node_id = self.work_queue.node_id
+        self.screen_id = self.work_queue.screen_id
+
+    def describe(self):
+        return (f"Shared queue: node {self.node_id} on {self.work_queue.root} "
+                f"(screen {self.screen_id})")
+
+    def results_log_path(self):
+        return node_log_path(self.results_path, self.node_id)
+
+    def log_files(self, results_log):
+        # All nodes' logs; each node writes the same merge once every job is done
+        return node_log_paths(self.results_path)
+
+    def start(self):
+        self.work_queue.start()
+
+    def run(self, jobs, quick_mode=False, cost_fn=None, watchdog=None):
+        def run_claimed(job):
+            # A reclaimed job may have partial outputs from a dead node
+            shutil.rmtree(job['output_dir'], ignore_errors=True)
+            return execute_job(job, quick_mode, self.device_pool, self.accelerator)
+
+        return run_jobs_shared(jobs, self.work_queue, admitted(run_claimed, watchdog), self.workers)
+
+    def collect(self, jobs, results):
+        # Jobs finished by other nodes (promotion and target-first need the full set)
+        merged = {record_key(record): record for record in
+                  merge_results_logs(node_log_paths(self.results_path), self.screen_id)['results']}
+        for job in jobs:
+            key = record_key(dict(job['config_info'], tier=job.get('tier')))
+            if job['index'] not in results and key in merged:
+                results[job['index']] = merged[key]
+
+    def close(self):
+        self.work_queue.stop()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Persistent-worker execution backend (--worker-spool).
+
+Jobs are submitted to warm boltz_worker.py daemons through a spool
+directory instead of spawning a `boltz predict` per job. Under a library
+name the spool is shared with other screens and the workers split device
+time between libraries (fair_share.py). Failed jobs are classified from
+the worker's error and resubmitted per their retry policy.
+"""
+
+import shutil
+import time
+
+import boltz_worker
+import fair_share
+from failure_policy import classify_failure, error_summary, plan_retry
+from job_scheduler import lpt_order
+from screen_jobs import get_sampling_params, job_outcome
+from screen_runners import Runner
+
+
+def worker_job_id(job, library=None):
+    """Spool job ID of a screen job (unique per tier, and per library on a shared spool)."""
+    job_id = f"{job['index']:06d}_{job['config_file'].stem}"
+    if job.get('tier'):
+        job_id += f"_{job['tier']}"
+    if library:
+        job_id = f"{library}.{job_id}"
+    return job_id
+
+
+def run_jobs_on_workers(jobs, spool_dir, quick_mode=False, poll_interval=2.0, library=None):
+    """
+    Submit jobs to persistent boltz_worker daemons and yield outcomes as
+    they finish. Workers claim jobs in submission order, and with a library
+    name share the spool with other libraries' screens (fair_share.py);
+    each job is charged to the library at its predicted runtime. Failed
+    jobs are classified from the worker's error and resubmitted per their
+    retry policy (after the backoff delay).
+
+    Yields:
+        [(job, result record or None, elapsed_time, device_id, failure or None)]
+    """
+    default_sampling = get_sampling_params(quick_mode)
+    pending = {}
+    attempts = {}
+    delayed = []
+    for job in jobs:
+        job_id = worker_job_id(job, library)
+        base_sampling = job.get('sampling') or default_sampling
+        boltz_worker.submit_job(spool_dir, job['config_file'], job['output_dir'],
+                                base_sampling, job_id=job_id, timeout=job.get('timeout'),
+                                library=library, cost=job.get('predicted'))
+        pending[job_id] = job
+        attempts[job_id] = {"sampling": dict(base_sampling),
+                            "timeout": job.get('timeout') or 600, "failures": []}
+
+    while pending:
+        # Resubmit retries whose backoff has elapsed
+        now = time.time()
+        for ready_at, job_id in [d for d in delayed if d[0] <= now]:
+            delayed.remove((ready_at, job_id))
+            job, state = pending[job_id], attempts[job_id]
+            boltz_worker.submit_job(spool_dir, job['config_file'], job['output_dir'],
+                                    state['sampling'], job_id=job_id, timeout=state['timeout'],
+                                    library=library, cost=job.get('predicted'))
+
+        finished = boltz_worker.poll_results(spool_dir, list(pending))
+        if not finished:
+            if not any(hb['healthy'] for hb in boltz_worker.check_health(spool_dir)):
+                print(f"  WARNING: no healthy workers on {spool_dir}; "
+                      f"{len(pending)} jobs waiting")
+            time.sleep(poll_interval)
+            continue
+
+        for job_id, result in finished.items():
+            job, state = pending[job_id], attempts[job_id]
+            outcome = {"success": result['success'], "prediction_dir": result['prediction_dir'],
+                       "elapsed": result['elapsed']}
+            if not result['success']:
+                error = result['error'] or ""
+                outcome.update(failure_class=classify_failure(stderr=error),
+                               error=error_summary(error))
+                print(f"  ERROR ({job_id}) [{outcome['failure_class']}]: {outcome['error'][:200]}")
+                state['failures'].append(outcome['failure_class'])
+                retry = plan_retry(outcome['failure_class'], len(state['failures']),
+                                   state['sampling'], state['timeout'])
+                if retry is not None:
+                    print(f"  RETRY {job_id} attempt {len(state['failures']) + 1} "
+                          f"in {retry['delay']:.0f}s")
+                    shutil.rmtree(job['output_dir'], ignore_errors=True)
+                    state['sampling'], state['timeout'] = retry['sampling'], retry['timeout']
+                    delayed.append((time.time() + retry['delay'], job_id))
+                    continue
+
+            pending.pop(job_id)
+            yield [job_outcome(job, outcome, result['device'], state['failures'],
+                               state['sampling'], job.get('sampling') or default_sampling)]
+
+
+class SpoolRunner(Runner):
+    """
+    Submits jobs to the workers serving spool_dir, under library_name
+    (None = the spool's default library) registered with
+    share_weight/share_priority (fair_share.py). One slot per healthy worker.
+    """
+
+    name = "spool"
+    label = "Persistent workers (--worker-spool)"
+    unsupported = {
+        "--accelerator cpu": "each worker runs on the device it was started on",
+        "--pack-gpus": "each worker holds its own GPU",
+        "--min-free-gb": "workers claim jobs themselves, admission cannot be paused",
+        "--affinity-top-n": "warm workers load only the Boltz-2 structure checkpoint",
+    }
+    local_devices = False
+
+    def __init__(self, results_path, workers=1, device_pool=None, accelerator="gpu", resume=False,
+                 spool_dir=None, library_name=None, share_weight=None, share_priority=None):
+        super().__init__(results_path, workers, device_pool, accelerator, resume)
+        self.spool_dir = spool_dir
+        self.healthy = [hb for hb in boltz_worker.check_health(spool_dir) if hb['healthy']]
+        self.workers = max(1, len(self.healthy))
+        self.library = fair_share.library_name(library_name)
+        self.share = fair_share.register_library(spool_dir, self.library, share_weight, share_priority)
+        self.started = None
+        self.shares = None
+
+    def describe(self):
+        lines = [f"Persistent workers: {len(self.healthy)} healthy on {self.spool_dir}"]
+        if not self.healthy:
+            lines.append("  WARNING: no healthy workers - start them with boltz_worker.py serve")
+        lines.append(f"Fair share: library '{self.library}' (weight {self.share['weight']:g}, "
+                     f"priority {self.share['priority']})")
+        return "\n".join(lines)
+
+    def start(self):
+        self.started = time.time()
+
+    def run(self, jobs, quick_mode=False, cost_fn=None, watchdog=None):
+        return run_jobs_on_workers(jobs, self.spool_dir, quick_mode, library=self.library)
+
+    def reprioritize(self, remaining, cost_fn):
+        boltz_worker.reorder_pending(self.spool_dir, [
+            worker_job_id(job, self.library) for job in lpt_order(remaining, lambda job: cost_fn([job]))],
+            self.library)
+
+    def report(self):
+        self.shares = fair_share.library_stats(self.spool_dir, since=self.started)
+        if self.shares:
+            print(f"Spool libraries since this run started ({self.spool_dir}):")
+            print("\n".join(fair_share.format_stats(self.shares)))
+
+    def summary(self):
+        if self.shares is None:
+            return {}
+        return {"fair_share": {"library": self.library, "libraries": self.shares}}
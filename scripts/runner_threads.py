@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Thread-pool execution backend: one thread per running `boltz predict`.
+
+Jobs wait in a JobQueue (job_scheduler.py) and the next one is popped
+only when a slot frees up, so re-prioritizing the queue after a
+cost-model refit takes effect immediately. The default backend of
+run_specificity_screen.py.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from job_scheduler import JobQueue
+from screen_jobs import execute_job
+from screen_runners import Runner, admitted
+
+
+def run_queue(executor, job_queue, run_item, slots):
+    """
+    Dispatch items from job_queue with at most `slots` in flight, popping
+    the next item only when a slot frees up (so re-prioritizing the queue
+    between outcomes takes effect immediately).
+
+    Yields:
+        Outcome lists from run_item, in completion order
+    """
+    in_flight = set()
+    while job_queue or in_flight:
+        while job_queue and len(in_flight) < slots:
+            in_flight.add(executor.submit(run_item, job_queue.pop()))
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+class ThreadRunner(Runner):
+    """Runs single jobs on a thread pool of `workers` threads."""
+
+    name = "threads"
+    label = "The thread pool"
+
+    def __init__(self, results_path, workers=1, device_pool=None, accelerator="gpu", resume=False):
+        super().__init__(results_path, workers, device_pool, accelerator, resume)
+        self.job_queue = None
+
+    def items(self, jobs):
+        """Work items (lists of jobs run together) of a tier."""
+        return [[job] for job in jobs]
+
+    def execute(self, item, quick_mode):
+        """Outcomes of one work item."""
+        return execute_job(item[0], quick_mode, self.device_pool, self.accelerator)
+
+    def run(self, jobs, quick_mode=False, cost_fn=None, watchdog=None):
+        self.job_queue = JobQueue(self.items(jobs), cost_fn)
+        run_item = admitted(lambda item: self.execute(item, quick_mode), watchdog)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from run_queue(executor, self.job_queue, run_item, self.workers)
+
+    def reprioritize(self, remaining, cost_fn):
+        if self.job_queue is not None:
+            self.job_queue.reprioritize()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Per-job Boltz sampling profiles chosen from job size and GPU memory.
+
+A fixed quick/production setting either wastes steps on nanobody-sized jobs
+(118 aa + dNTP, ~150 tokens) or under-samples chimeras (~400 aa Dronpa/LOV
+fusions), and batching all diffusion samples at once can OOM the largest
+jobs on a 24 GB card. With adaptive sampling each variant gets the profile
+of its token band:
+
+    band     tokens   quick (samples/steps/recycling)   production
+    small    <= 200   1 / 50 / 1                         3 / 100 / 2
+    medium   <= 500   2 / 50 / 1                         4 / 150 / 3
+    large    > 500    2 / 50 / 2                         5 / 200 / 3
+
+and runs as many of its samples in parallel (--max_parallel_samples) as fit
+the memory budget according to estimate_peak_gb. Profiles are chosen per
+variant (its largest job) so the target and off-target predictions of a
+variant use the same settings and stay comparable.
+
+Usage:
+    python sampling_profiles.py ../specificity_library --gpu-memory 24
+"""
+
+import argparse
+import subprocess
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from cost_model import config_size
+
+
+@dataclass(frozen=True)
+class SamplingProfile:
+    """Sampling settings for jobs of up to max_tokens tokens (None = no limit)."""
+    name: str
+    max_tokens: Optional[int]
+    diffusion_samples: int
+    sampling_steps: int
+    recycling_steps: int
+
+
+QUICK_PROFILES = (
+    SamplingProfile("small", 200, diffusion_samples=1, sampling_steps=50, recycling_steps=1),
+    SamplingProfile("medium", 500, diffusion_samples=2, sampling_steps=50, recycling_steps=1),
+    SamplingProfile("large", None, diffusion_samples=2, sampling_steps=50, recycling_steps=2),
+)
+PRODUCTION_PROFILES = (
+    SamplingProfile("small", 200, diffusion_samples=3, sampling_steps=100, recycling_steps=2),
+    SamplingProfile("medium", 500, diffusion_samples=4, sampling_steps=150, recycling_steps=3),
+    SamplingProfile("large", None, diffusion_samples=5, sampling_steps=200, recycling_steps=3),
+)
+
+# Peak GPU memory model (GB): weights and CUDA context, the trunk's pair
+# representation and triangle updates (quadratic in tokens, once per job),
+# and the diffusion module's activations (per sample run in parallel).
+# Deliberately conservative: a 420-aa chimera + dNTP (450 tokens) with four
+# samples in parallel is estimated at ~22 GB, so it batches three on 24 GB.
+BASE_MEMORY_GB = 3.0
+TRUNK_GB_PER_TOKEN2 = 3.5e-5
+SAMPLE_GB_PER_TOKEN2 = 1.0e-5
+SAMPLE_GB_PER_TOKEN = 2.0e-3
+
+DEFAULT_GPU_MEMORY_GB = 24.0
+# Fraction of the card a job may plan to use (allocator fragmentation)
+MEMORY_HEADROOM = 0.9
+
+
+def estimate_peak_gb(tokens: int, parallel_samples: int = 1) -> float:
+    """Estimated peak GPU memory of a job with parallel_samples batched diffusion samples."""
+    per_sample = SAMPLE_GB_PER_TOKEN2 * tokens ** 2 + SAMPLE_GB_PER_TOKEN * tokens
+    return BASE_MEMORY_GB + TRUNK_GB_PER_TOKEN2 * tokens ** 2 + per_sample * parallel_samples
+
+
+def detect_gpu_memory_gb(gpu_ids=None) -> Optional[float]:
+    """Total memory (GB) of the smallest visible GPU via nvidia-smi, or None."""
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=index,memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    totals = {}
+    for line in result.stdout.splitlines():
+        index, _, total = line.partition(",")
+        try:
+            totals[index.strip()] = float(total) / 1024
+        except ValueError:
+            continue
+    if gpu_ids is not None:
+        totals = {i: m for i, m in totals.items() if i in {str(g) for g in gpu_ids}}
+    return min(totals.values()) if totals else None
+
+
+class AdaptiveSampling:
+    """Chooses a SamplingProfile and batch size per job for a GPU memory budget."""
+
+    def __init__(self, memory_gb: float = DEFAULT_GPU_MEMORY_GB, headroom: float = MEMORY_HEADROOM):
+        self.memory_gb = memory_gb
+        self.budget_gb = memory_gb * headroom
+
+    def profile(self, tokens: int, quick_mode: bool = False) -> SamplingProfile:
+        for profile in QUICK_PROFILES if quick_mode else PRODUCTION_PROFILES:
+            if profile.max_tokens is None or tokens <= profile.max_tokens:
+                return profile
+        raise ValueError("profile table has no catch-all band")
+
+    def select(self, tokens: int, quick_mode: bool = False) -> Dict:
+        """
+        Profile of a job of `tokens` tokens.
+
+        Returns:
+            {'profile': name, 'sampling': boltz sampling parameters,
+             'parallel_samples': samples batched at once, 'peak_gb': estimate}
+            sampling has max_parallel_samples only when not all samples fit
+            at once; if even one does not fit, the job runs one at a time
+            (and relies on the OOM retry policy)
+        """
+        profile = self.profile(tokens, quick_mode)
+        parallel = profile.diffusion_samples
+        while parallel > 1 and estimate_peak_gb(tokens, parallel) > self.budget_gb:
+            parallel -= 1
+        sampling = {"diffusion_samples": profile.diffusion_samples,
+                    "sampling_steps": profile.sampling_steps,
+                    "recycling_steps": profile.recycling_steps}
+        if parallel < profile.diffusion_samples:
+            sampling["max_parallel_samples"] = parallel
+        return {"profile": profile.name, "sampling": sampling, "parallel_samples": parallel,
+                "peak_gb": round(estimate_peak_gb(tokens, parallel), 2)}
+
+    def assign(self, jobs: List[Dict], quick_mode: bool = False) -> Counter:
+        """
+        Set job['sampling'] and job['sampling_profile'] for each job, using
+        the largest job of each variant so a variant's panel shares settings.
+
+        Returns:
+            Counter of jobs per profile name
+        """
+        variant_tokens = {}
+        for job in jobs:
+            if job['config_file'].exists():
+                tokens, _ = config_size(str(job['config_file']))
+                variant = job['config_info']['variant_id']
+                variant_tokens[variant] = max(variant_tokens.get(variant, 0), tokens)
+
+        counts = Counter()
+        for job in jobs:
+            tokens = variant_tokens.get(job['config_info']['variant_id'])
+            if tokens is None:
+                continue
+            choice = self.select(tokens, quick_mode)
+            job['sampling'] = choice.pop('sampling')
+            job['sampling_profile'] = dict(choice, tokens=tokens)
+            counts[choice['profile']] += 1
+        return counts
+
+
+def profile_note(job) -> str:
+    """One-line description of a job's sampling profile for the run log."""
+    choice = job['sampling_profile']
+    sampling = job['sampling']
+    return (f"{choice['profile']} ({choice['tokens']} tokens: {sampling['diffusion_samples']} samples "
+            f"x {sampling['sampling_steps']} steps, {sampling['recycling_steps']} recycling, "
+            f"{choice['parallel_samples']} in parallel, ~{choice['peak_gb']:.1f} GB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show the sampling profiles adaptive sampling would choose for a library"
+    )
+    parser.add_argument("library_dir", help="Library with library_manifest.yaml and configs_with_msas/")
+    parser.add_argument("--gpu-memory", type=float,
+                        help=f"GPU memory in GB (default: detected, else {DEFAULT_GPU_MEMORY_GB:.0f})")
+    parser.add_argument("--quick", action="store_true", help="Quick-mode profiles")
+
+    args = parser.parse_args()
+
+    library_dir = Path(args.library_dir)
+    with open(library_dir / "library_manifest.yaml", 'r') as f:
+        configs = yaml.safe_load(f)['configs']
+    jobs = [{"config_info": c,
+             "config_file": library_dir / "configs_with_msas" / Path(c['config_file']).name}
+            for c in configs]
+
+    memory_gb = args.gpu_memory or detect_gpu_memory_gb() or DEFAULT_GPU_MEMORY_GB
+    adaptive = AdaptiveSampling(memory_gb)
+    counts = adaptive.assign(jobs, args.quick)
+    print(f"GPU memory: {memory_gb:.0f} GB (planning budget {adaptive.budget_gb:.1f} GB)")
+    for name, count in sorted(counts.items()):
+        example = next(j for j in jobs if j.get('sampling_profile', {}).get('profile') == name)
+        print(f"  {count:>6} jobs  {profile_note(example)}")
+
+
+if __name__ == "__main__":
+    main()
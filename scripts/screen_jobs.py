@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Single screen jobs: Boltz invocation, retries and result records.
+
+The building blocks every execution backend (screen_runners.py) shares:
+sampling settings, the `boltz predict` command line and its device
+environment, one prediction attempt with its failure classified
+(failure_policy.py), the per-job retry loop (execute_job) and the outcome
+tuple run_specificity_screen.run_tier ingests:
+
+    (job, result record or None, elapsed_time, device_id, failure or None)
+
+A job is a dict built by run_specificity_screen.build_jobs (index,
+config_info, config_file, output_dir, tier), extended by the screen with
+its sampling profile, predicted runtime and timeout.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from failure_policy import classify_failure, error_summary, plan_retry
+from gpu_packer import GpuMemoryPacker, job_memory_gb
+from prediction_index import affinity_path, artifact_path, prediction_dir_for, write_index
+
+
+# Tier label of the affinity re-runs of shortlisted variants
+AFFINITY_TIER = "affinity"
+
+# Thread-pool sizes of the math libraries under torch; torch takes its
+# intra-op thread count from OMP_NUM_THREADS
+CPU_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                       "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+
+class ScreenProfile:
+    """Seconds spent per runner phase (thread-safe), reported by run_batch_predictions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, phase, seconds, count=1):
+        with self._lock:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + count
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def summary(self):
+        return {phase: {"seconds": self.seconds[phase], "count": self.counts[phase]}
+                for phase in self.seconds}
+
+
+PROFILE = ScreenProfile()
+
+
+def get_sampling_params(quick_mode=False, accelerator="gpu"):
+    """
+    Boltz sampling parameters for quick or production mode.
+
+    On CPU, quick mode keeps the GPU settings (quick-tier results and cache
+    entries stay interchangeable between node types); production uses fewer
+    samples and steps, since CPU time grows linearly with both, and runs the
+    samples one at a time (batching them buys no throughput on CPU).
+    """
+    if quick_mode:
+        return {"diffusion_samples": 1, "sampling_steps": 50, "recycling_steps": 1}
+    if accelerator == "cpu":
+        return {"diffusion_samples": 2, "sampling_steps": 100, "recycling_steps": 2,
+                "max_parallel_samples": 1}
+    return {"diffusion_samples": 3, "sampling_steps": 150, "recycling_steps": 2}
+
+
+def build_boltz_command(input_path, output_dir, devices=1, quick_mode=False, params=None,
+                        accelerator="gpu"):
+    """
+    Build the `boltz predict` command line for a config file or directory.
+
+    The executable is $BOLTZ_BIN if set (e.g. mock_boltz.py for benchmarks),
+    otherwise `boltz` from PATH.
+
+    Args:
+        params: Explicit sampling parameters
+            (default: get_sampling_params(quick_mode, accelerator))
+        accelerator: "gpu" or "cpu"; CPU runs load data in the main process
+            (--num_workers 0) so DataLoader workers do not compete for the
+            job's cores
+    """
+    params = params or get_sampling_params(quick_mode, accelerator)
+
+    cmd = [
+        os.environ.get("BOLTZ_BIN", "boltz"), "predict", str(input_path),
+        "--out_dir", str(output_dir),
+        "--devices", str(devices),
+        "--accelerator", accelerator,
+        "--diffusion_samples", str(params["diffusion_samples"]),
+        "--sampling_steps", str(params["sampling_steps"]),
+        "--recycling_steps", str(params["recycling_steps"]),
+        "--write_full_pae"
+    ]
+    if params.get("max_parallel_samples"):
+        cmd += ["--max_parallel_samples", str(params["max_parallel_samples"])]
+    if accelerator == "cpu":
+        cmd += ["--num_workers", "0"]
+    return cmd
+
+
+def cpu_slot_threads(device_id):
+    """Thread count of a CPU slot ID ("cpu<slot>:<threads>", see make_cpu_pool)."""
+    return int(str(device_id).rsplit(":", 1)[1])
+
+
+def device_env(device_id=None, accelerator="gpu"):
+    """
+    Subprocess environment pinned to one GPU, or limited to the thread
+    count of one CPU slot (None = inherit).
+    """
+    if device_id is None:
+        return None
+    env = os.environ.copy()
+    if accelerator == "cpu":
+        threads = str(cpu_slot_threads(device_id))
+        for var in CPU_THREAD_ENV_VARS:
+            env[var] = threads
+        env["CUDA_VISIBLE_DEVICES"] = ""
+    else:
+        env["CUDA_VISIBLE_DEVICES"] = str(device_id)
+    return env
+
+
+def run_boltz_prediction_detailed(config_file, output_dir, devices=1, quick_mode=False,
+                                  device_id=None, cache=None, timeout=600, params=None,
+                                  accelerator="gpu"):
+    """
+    Run a single Boltz prediction attempt and classify any failure.
+
+    Args:
+        device_id: GPU to pin the subprocess to via CUDA_VISIBLE_DEVICES, or
+            CPU slot whose thread count it gets (default: inherit the parent
+            environment)
+        cache: Optional PredictionCache; a hit is materialized into
+            output_dir instead of invoking Boltz, a miss is stored on success
+        timeout: Seconds before the prediction is killed (see cost_model.py)
+        params: Explicit sampling parameters
+            (default: get_sampling_params(quick_mode, accelerator))
+        accelerator: "gpu" or "cpu"
+
+    Returns:
+        Dict with success, prediction_dir, elapsed, and on failure
+        failure_class (see failure_policy.py), returncode and error
+    """
+    params = params or get_sampling_params(quick_mode, accelerator)
+    start_time = time.time()
+
+    def failed(failure_class, returncode=None, error=""):
+        return {"success": False, "prediction_dir": None, "elapsed": time.time() - start_time,
+                "failure_class": failure_class, "returncode": returncode, "error": error}
+
+    if cache is not None:
+        hit = cache.fetch(config_file, output_dir, params)
+        if hit is not None:
+            return {"success": True, "prediction_dir": hit['prediction_dir'],
+                    "elapsed": time.time() - start_time}
+
+    cmd = build_boltz_command(config_file, output_dir, devices, quick_mode, params, accelerator)
+
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            env=device_env(device_id, accelerator)
+        )
+    except subprocess.TimeoutExpired:
+        print(f"  TIMEOUT after {timeout / 60:.1f} minutes")
+        return failed("timeout", error=f"Timed out after {timeout:.0f}s")
+    except Exception as e:
+        print(f"  EXCEPTION: {str(e)[:200]}")
+        return failed(classify_failure(stderr=f"{type(e).__name__}: {e}"), error=str(e)[:300])
+
+    elapsed = time.time() - start_time
+
+    if result.returncode == 0:
+        # Boltz names the directory after the input file; index its artifacts
+        pred_dir = prediction_dir_for(output_dir, config_file)
+        if write_index(pred_dir) is not None:
+            if cache is not None:
+                cache.put(config_file, params, pred_dir, elapsed)
+            return {"success": True, "prediction_dir": pred_dir, "elapsed": elapsed}
+        return failed("unknown", result.returncode, "No prediction outputs written")
+
+    failure_class = classify_failure(result.returncode, result.stderr)
+    error = error_summary(result.stderr)
+    print(f"  ERROR [{failure_class}]: {error[:200]}")
+    return failed(failure_class, result.returncode, error)
+
+
+def run_boltz_prediction(config_file, output_dir, devices=1, quick_mode=False, device_id=None,
+                         cache=None, timeout=600):
+    """
+    Run a single Boltz prediction.
+
+    Returns:
+        (success, prediction_dir, elapsed_time)
+    """
+    outcome = run_boltz_prediction_detailed(config_file, output_dir, devices, quick_mode,
+                                            device_id, cache, timeout)
+    return outcome['success'], outcome['prediction_dir'], outcome['elapsed']
+
+
+def extract_confidence(prediction_dir):
+    """Confidence metrics of the best model of a prediction (via its prediction_index.json)."""
+    best_conf_file = artifact_path(prediction_dir, "confidence")
+    if best_conf_file is None:
+        return None
+
+    with open(best_conf_file, 'r') as f:
+        return json.load(f)
+
+
+def extract_affinity(prediction_dir):
+    """Boltz-2 affinity predictions (affinity_<stem>.json) of a prediction, or None."""
+    affinity_file = affinity_path(prediction_dir)
+    if affinity_file is None:
+        return None
+
+    with open(affinity_file, 'r') as f:
+        return json.load(f)
+
+
+def build_result_record(config_info, pred_dir, confidence, elapsed, tier=None, affinity=None):
+    """Result record for one successful prediction (screening_results.json schema)."""
+    record = {
+        "variant_id": config_info['variant_id'],
+        "target_nucleotide": config_info['target_nucleotide'],
+        "test_nucleotide": config_info['test_nucleotide'],
+        "is_target": config_info['is_target'],
+        "mutations": config_info['mutations'],
+        "prediction_dir": str(pred_dir),
+        "confidence": confidence,
+        "elapsed_time": elapsed
+    }
+    if tier is not None:
+        record["tier"] = tier
+    if affinity is not None:
+        record["affinity"] = affinity
+    return record
+
+
+def job_affinity(job, prediction_dir):
+    """Affinity of an affinity-tier job's prediction (other tiers do not request it)."""
+    return extract_affinity(prediction_dir) if job.get('tier') == AFFINITY_TIER else None
+
+
+def job_outcome(job, outcome, device_id, failure_history, sampling, base_sampling):
+    """
+    Outcome tuple of a job after its last attempt.
+
+    Returns:
+        (job, result record or None, elapsed_time, device_id, failure or None)
+        where failure = {failure_class, attempts, error[, failure_history]}
+    """
+    attempts = len(failure_history) + (1 if outcome['success'] else 0)
+    if outcome['success']:
+        with PROFILE.phase("confidence_parsing"):
+            confidence = extract_confidence(outcome['prediction_dir'])
+            affinity = job_affinity(job, outcome['prediction_dir'])
+        record = build_result_record(job['config_info'], outcome['prediction_dir'], confidence,
+                                     outcome['elapsed'], tier=job.get('tier'), affinity=affinity)
+        if attempts > 1:
+            record['attempts'] = attempts
+            record['failure_history'] = failure_history
+        if job.get('sampling_profile'):
+            record['sampling_profile'] = job['sampling_profile']['profile']
+        if sampling != base_sampling:
+            # Retried with reduced settings (e.g. after CUDA OOM)
+            record['sampling'] = sampling
+        return (job, record, outcome['elapsed'], device_id, None)
+
+    failure = {
+        "failure_class": outcome['failure_class'],
+        "attempts": attempts,
+        "error": outcome.get('error') or "",
+    }
+    if attempts > 1:
+        failure['failure_history'] = failure_history
+    return (job, None, outcome['elapsed'], device_id, failure)
+
+
+def acquire_device(device_pool, jobs, sampling):
+    """
+    A device (or CPU slot) from device_pool for running jobs with sampling
+    (None = no pinning). A GpuMemoryPacker picks a GPU with room for the
+    largest job's estimated peak memory.
+    """
+    if device_pool is None:
+        return None
+    if isinstance(device_pool, GpuMemoryPacker):
+        return device_pool.acquire(max(job_memory_gb(job['config_file'], sampling) for job in jobs))
+    return device_pool.get()
+
+
+def release_device(device_pool, device_id, jobs, sampling, oom=False):
+    """Return a device taken with acquire_device; oom=True makes a packer back off."""
+    if device_pool is None:
+        return
+    if isinstance(device_pool, GpuMemoryPacker):
+        device_pool.release(device_id, max(job_memory_gb(job['config_file'], sampling) for job in jobs),
+                            oom=oom)
+    else:
+        device_pool.put(device_id)
+
+
+def execute_job(job, quick_mode=False, device_pool=None, accelerator="gpu"):
+    """
+    Run one job, retrying failures per their class (failure_policy.py).
+
+    A device from device_pool is held for each attempt and released during
+    retry backoff, so a retry can land on a different device (with a
+    GpuMemoryPacker, sized for the retry's reduced sampling).
+
+    Returns:
+        [(job, result record or None, elapsed_time, device_id, failure or None)]
+    """
+    base_sampling = job.get('sampling') or get_sampling_params(quick_mode, accelerator)
+    sampling = dict(base_sampling)
+    timeout = job.get('timeout') or 600
+    failure_history = []
+
+    while True:
+        device_id = acquire_device(device_pool, [job], sampling)
+        outcome = None
+        try:
+            outcome = run_boltz_prediction_detailed(
+                job['config_file'], job['output_dir'], devices=1, quick_mode=quick_mode,
+                device_id=device_id, timeout=timeout, params=sampling, accelerator=accelerator
+            )
+        finally:
+            release_device(device_pool, device_id, [job], sampling,
+                           oom=outcome is not None and outcome.get('failure_class') == "cuda_oom")
+
+        if outcome['success']:
+            break
+        failure_history.append(outcome['failure_class'])
+        retry = plan_retry(outcome['failure_class'], len(failure_history), sampling, timeout)
+        if retry is None:
+            break
+
+        print(f"  RETRY {job['config_file'].stem} [{outcome['failure_class']}] "
+              f"attempt {len(failure_history) + 1} in {retry['delay']:.0f}s")
+        # Partial outputs would make boltz skip the input
+        shutil.rmtree(job['output_dir'], ignore_errors=True)
+        time.sleep(retry['delay'])
+        sampling, timeout = retry['sampling'], retry['timeout']
+
+    return [job_outcome(job, outcome, device_id, failure_history, sampling, base_sampling)]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Execution backends of the specificity screen, behind one interface.
+
+run_specificity_screen.run_tier decides what to run (resume, cache, cost
+model, LPT order) and ingests outcomes; a Runner decides how the jobs
+are executed and yields their outcome lists in completion order:
+
+    threads  ThreadRunner       a thread per running `boltz predict` (runner_threads.py)
+    shards   ShardRunner        several configs per invocation (runner_shards.py)
+    async    AsyncRunner        one asyncio event loop with progress events (runner_async.py)
+    spool    SpoolRunner        persistent boltz_worker daemons (runner_spool.py)
+    shared   SharedQueueRunner  job leases shared with other nodes (runner_shared.py)
+
+Each outcome is (job, result record or None, elapsed_time, device_id,
+failure or None), see screen_jobs.job_outcome. A runner lists the screen
+options it cannot honour in `unsupported`; check_options turns them into
+one error instead of a chain of pairwise checks.
+"""
+
+import importlib
+import inspect
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from results_log import RESULTS_LOG_NAME
+
+
+# Backend name -> (module, class); imported on first use
+RUNNERS = {
+    "threads": ("runner_threads", "ThreadRunner"),
+    "shards": ("runner_shards", "ShardRunner"),
+    "async": ("runner_async", "AsyncRunner"),
+    "spool": ("runner_spool", "SpoolRunner"),
+    "shared": ("runner_shared", "SharedQueueRunner"),
+}
+
+
+class Runner:
+    """
+    Base class of the execution backends.
+
+    A runner is created once per screen and runs each of its tiers:
+    start() once the results log is open, run() per tier, close() at the
+    end. Jobs are run on `workers` slots; device_pool (a queue of GPU IDs
+    or CPU slots, or a GpuMemoryPacker) pins them to local devices. resume
+    is set when the screen continues an earlier run.
+    """
+
+    name = None
+    # Human-readable name (with its CLI option) for messages
+    label = None
+    # Screen option -> why this backend cannot honour it (see check_options)
+    unsupported: Dict[str, str] = {}
+    # Whether jobs run on this host's device_pool (printed in the screen header)
+    local_devices = True
+    # False when other nodes may be writing this screen's job directories
+    exclusive_outputs = True
+
+    def __init__(self, results_path, workers=1, device_pool=None, accelerator="gpu", resume=False):
+        self.results_path = Path(results_path)
+        self.workers = workers
+        self.device_pool = device_pool
+        self.accelerator = accelerator
+        self.resume = resume
+        # Set by runners sharing one screen between nodes
+        self.node_id = None
+        self.screen_id = None
+
+    def describe(self) -> Optional[str]:
+        """Line for the screen header, or None."""
+        return None
+
+    def results_log_path(self) -> Path:
+        """Results log this process appends to."""
+        return self.results_path / RESULTS_LOG_NAME
+
+    def log_files(self, results_log):
+        """What is compacted into screening_results.json: the results log, or a list of logs to merge."""
+        return results_log.path
+
+    def start(self):
+        """Called once before the first tier, with the results log open."""
+
+    def run(self, jobs: List[Dict], quick_mode: bool = False, cost_fn: Optional[Callable] = None,
+            watchdog=None) -> Iterator[List[tuple]]:
+        """
+        Execute jobs and yield outcome lists in completion order. With a
+        cost_fn (predicted seconds of a list of jobs) pending work is
+        dispatched longest-predicted-first; with a watchdog
+        (disk_watchdog.DiskWatchdog) a job waits for disk space before it
+        is launched. Closing the iterator stops dispatching.
+        """
+        raise NotImplementedError
+
+    def reprioritize(self, remaining: Iterable[Dict], cost_fn: Callable):
+        """Re-sort work not dispatched yet after cost_fn's predictions changed."""
+
+    def collect(self, jobs: List[Dict], results: Dict):
+        """Add results of jobs finished outside this process to results (by job index)."""
+
+    def report(self):
+        """Print backend statistics at the end of the screen."""
+
+    def summary(self) -> Dict:
+        """Backend statistics added to the run's final results."""
+        return {}
+
+    def close(self):
+        """Release what start() acquired and clean up after the last tier."""
+
+
+def admitted(run_item: Callable, watchdog=None) -> Callable:
+    """run_item, launched only once the watchdog sees enough disk space."""
+    if watchdog is None:
+        return run_item
+
+    def run(item):
+        watchdog.wait_for_space()
+        return run_item(item)
+    return run
+
+
+def runner_class(backend: str):
+    """Runner class of a backend name (see RUNNERS)."""
+    if backend not in RUNNERS:
+        raise ValueError(f"Unknown execution backend '{backend}' (choose from {', '.join(RUNNERS)})")
+    module, name = RUNNERS[backend]
+    return getattr(importlib.import_module(module), name)
+
+
+def check_options(backend: str, requested: Dict[str, bool], options: Optional[Dict] = None):
+    """
+    Reject screen options the backend cannot honour, and backend options
+    (see make_runner) it does not take.
+
+    Args:
+        requested: Screen option (as named in Runner.unsupported, e.g.
+            "--pack-gpus") -> whether it is in use
+    """
+    cls = runner_class(backend)
+    conflicts = [f"{option} ({reason})" for option, reason in cls.unsupported.items()
+                 if requested.get(option)]
+    if conflicts:
+        raise ValueError(f"{cls.label} cannot be combined with " + "; ".join(conflicts))
+    common = inspect.signature(Runner.__init__).parameters
+    accepted = set(inspect.signature(cls.__init__).parameters) - set(common)
+    unknown = sorted(set(options or {}) - accepted)
+    if unknown:
+        raise ValueError(f"{cls.label} does not take {', '.join(unknown)}")
+
+
+def make_runner(backend: str, results_path, workers: int = 1, device_pool=None,
+                accelerator: str = "gpu", resume: bool = False, **options) -> Runner:
+    """
+    Runner of a backend; options are its own settings (e.g. shard_size for
+    "shards", spool_dir for "spool").
+    """
+    check_options(backend, {}, options)
+    return runner_class(backend)(results_path, workers=workers, device_pool=device_pool,
+                                 accelerator=accelerator, resume=resume, **options)
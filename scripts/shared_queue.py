@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Lease-based work queue on a shared filesystem (NFS) for multi-node screens.
+
+Every node runs run_specificity_screen.py --shared-queue on the same library
+and results directory. Nodes build the same job list from the manifest and
+claim jobs through lease files; no scheduler or server is involved:
+
+    <queue_dir>/
+        screen.json                current screen ({"screen_id": ...})
+        leases/<job_id>.lease      claim, created with an atomic hard link
+        done/<job_id>.json         terminal state (success or final failure)
+        nodes/<node_id>.json       node heartbeats (status, jobs done)
+        retired/<screen_id>/       leases, done and nodes of earlier screens
+
+A node holding a lease touches it every heartbeat_interval. A lease whose
+mtime is older than lease_timeout (by the file server's clock, so node
+clock skew does not matter) belongs to a dead node: it is renamed away
+atomically by one reclaiming node and the job is claimed again. Results go
+to a per-node JSONL log (results_log.node_log_path) that is merged into
+screening_results.json once every job is done.
+
+A node starting while another node of the current screen is alive joins
+that screen. Otherwise it starts a new screen (the old done markers are
+retired, so every job runs again) unless it was started with --resume. The
+screen_id goes into the run headers of the per-node logs, so the merge
+reads only this screen's runs.
+
+Usage:
+    python shared_queue.py status ../specificity_library/screening_results/queue
+    python shared_queue.py reclaim ../specificity_library/screening_results/queue
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+HEARTBEAT_INTERVAL = 30.0  # seconds
+LEASE_TIMEOUT = 300.0      # seconds without heartbeat before a lease is reclaimed
+LOCK_POLL_INTERVAL = 0.1   # seconds between attempts to take the screen lock
+
+
+def _atomic_write_json(path, data):
+    """Write JSON via a temporary file and rename so readers never see partial files."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path) -> Optional[Dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class SharedWorkQueue:
+    """One node's view of a shared lease queue."""
+
+    def __init__(self, queue_dir, node_id: Optional[str] = None,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                 lease_timeout: float = LEASE_TIMEOUT):
+        self.root = Path(queue_dir)
+        self.leases = self.root / "leases"
+        self.done = self.root / "done"
+        self.nodes = self.root / "nodes"
+        for sub in (self.leases, self.done, self.nodes):
+            sub.mkdir(parents=True, exist_ok=True)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.screen_id = (_read_json(self.root / "screen.json") or {}).get('screen_id')
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_timeout = lease_timeout
+        self.jobs_done = 0
+        self.reclaimed = 0
+        self.status = "running"
+        self._held = {}  # job_id -> lease token
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._clock = (0.0, 0.0)  # (local time, server time) of the last probe
+
+    # -- clock -------------------------------------------------------------
+
+    def server_now(self) -> float:
+        """
+        Current time according to the file server (mtime of a freshly touched
+        file), re-read at most once a second.
+        """
+        local = time.time()
+        if local - self._clock[0] > 1.0:
+            probe = self.nodes / f".{self.node_id}.clock"
+            probe.touch()
+            self._clock = (local, probe.stat().st_mtime)
+        return self._clock[1] + (local - self._clock[0])
+
+    # -- screens -----------------------------------------------------------
+
+    def live_nodes(self):
+        """Other nodes of the current screen that are running and heartbeating."""
+        now = self.server_now()
+        live = []
+        for path in self.nodes.glob("*.json"):
+            node = _read_json(path)
+            if not node or node.get('node') == self.node_id or node.get('status') == "stopped":
+                continue
+            try:
+                if now - path.stat().st_mtime < self.lease_timeout:
+                    live.append(node['node'])
+            except FileNotFoundError:
+                continue
+        return sorted(live)
+
+    def _lock_screen(self) -> Path:
+        """Take the lock guarding screen changes (stale locks of dead nodes are broken)."""
+        lock = self.root / "screen.lock"
+        tmp = self.root / f".screen.{self.node_id}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp.write_text(self.node_id)
+        try:
+            while True:
+                try:
+                    os.link(tmp, lock)
+                    return lock
+                except FileExistsError:
+                    pass
+                try:
+                    if self.server_now() - lock.stat().st_mtime > self.lease_timeout:
+                        lock.unlink(missing_ok=True)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(LOCK_POLL_INTERVAL)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def join_screen(self, resume: bool = False) -> str:
+        """
+        Join the current screen, or start a new one when no other node of it
+        is alive and resume is False. Registers this node as alive.
+
+        Returns:
+            The screen_id
+        """
+        lock = self._lock_screen()
+        try:
+            current = _read_json(self.root / "screen.json")
+            if current is None or (not resume and not self.live_nodes()):
+                if current is not None:
+                    retired = self.root / "retired" / current['screen_id']
+                    retired.mkdir(parents=True, exist_ok=True)
+                    for sub in (self.leases, self.done, self.nodes):
+                        os.rename(sub, retired / sub.name)
+                        sub.mkdir()
+                current = {"screen_id": uuid.uuid4().hex, "started": time.time(), "node": self.node_id}
+                _atomic_write_json(self.root / "screen.json", current)
+                print(f"  Started screen {current['screen_id']} on {self.root}")
+            self.screen_id = current['screen_id']
+            self.status = "starting"
+            self.heartbeat()
+        finally:
+            lock.unlink(missing_ok=True)
+        return self.screen_id
+
+    # -- leases ------------------------------------------------------------
+
+    def _lease_path(self, job_id: str) -> Path:
+        return self.leases / f"{job_id}.lease"
+
+    def is_done(self, job_id: str) -> bool:
+        return (self.done / f"{job_id}.json").exists()
+
+    def try_claim(self, job_id: str) -> bool:
+        """Take the lease of a job if it is free (or stale) and not done."""
+        if self.is_done(job_id):
+            return False
+        lease = self._lease_path(job_id)
+        if lease.exists() and not self._reclaim_if_stale(job_id):
+            return False
+
+        token = uuid.uuid4().hex
+        tmp = self.leases / f".{job_id}.{token}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"job_id": job_id, "node": self.node_id, "host": socket.gethostname(),
+                       "pid": os.getpid(), "token": token, "acquired": time.time()}, f)
+        try:
+            # link() fails if the lease exists, atomically, also over NFS
+            os.link(tmp, lease)
+        except FileExistsError:
+            return False
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        if self.is_done(job_id):
+            # Finished by another node between our check and the claim
+            lease.unlink(missing_ok=True)
+            return False
+        with self._lock:
+            self._held[job_id] = token
+        return True
+
+    def _reclaim_if_stale(self, job_id: str) -> bool:
+        """Remove a lease whose holder stopped heartbeating; True if it is gone."""
+        lease = self._lease_path(job_id)
+        try:
+            # Opening refreshes NFS attribute caches (close-to-open consistency)
+            with open(lease, 'r') as f:
+                held = json.load(f)
+                mtime = os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            return True
+        except json.JSONDecodeError:
+            return False  # being written
+        if self.server_now() - mtime < self.lease_timeout:
+            return False
+
+        # Only one node wins the rename; check we moved the lease we judged stale
+        graveyard = self.leases / f".{job_id}.reclaimed.{self.node_id}.{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(lease, graveyard)
+        except FileNotFoundError:
+            return not lease.exists()
+        moved = _read_json(graveyard) or {}
+        if moved.get('token') != held.get('token'):
+            # A fresh lease replaced the stale one in between: put it back
+            try:
+                os.link(graveyard, lease)
+            except FileExistsError:
+                pass
+            graveyard.unlink(missing_ok=True)
+            return False
+        graveyard.unlink(missing_ok=True)
+        self.reclaimed += 1
+        print(f"  Reclaimed stale lease of {job_id} from node {held.get('node')}")
+        return True
+
+    def claim_next(self, job_ids: Iterable[str]) -> Optional[str]:
+        """Claim the first claimable job of job_ids (in order), or None."""
+        for job_id in job_ids:
+            if self.try_claim(job_id):
+                return job_id
+        return None
+
+    def release(self, job_id: str):
+        """Give a lease back without completing the job (e.g. on interrupt)."""
+        with self._lock:
+            token = self._held.pop(job_id, None)
+        if token is None:
+            return
+        lease = self._lease_path(job_id)
+        if (_read_json(lease) or {}).get('token') == token:
+            lease.unlink(missing_ok=True)
+
+    def complete(self, job_id: str, success: bool = True):
+        """Mark a job finished (after its result was logged) and drop the lease."""
+        _atomic_write_json(self.done / f"{job_id}.json", {
+            "job_id": job_id, "node": self.node_id, "success": success, "finished": time.time(),
+        })
+        self.jobs_done += 1
+        self.release(job_id)
+
+    def pending(self, job_ids: Iterable[str]):
+        """Job IDs that are not done yet (leased or free)."""
+        return [job_id for job_id in job_ids if not self.is_done(job_id)]
+
+    # -- heartbeats --------------------------------------------------------
+
+    def heartbeat(self):
+        """Touch held leases and write the node heartbeat."""
+        with self._lock:
+            held = dict(self._held)
+        for job_id, token in held.items():
+            lease = self._lease_path(job_id)
+            try:
+                os.utime(lease)
+            except FileNotFoundError:
+                print(f"  WARNING: lease of {job_id} was reclaimed from this node")
+                with self._lock:
+                    self._held.pop(job_id, None)
+        _atomic_write_json(self.nodes / f"{self.node_id}.json", {
+            "node": self.node_id,
+            "screen_id": self.screen_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "status": self.status,
+            "leases": sorted(held),
+            "jobs_done": self.jobs_done,
+            "heartbeat": time.time(),
+        })
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self.heartbeat()
+
+    def start(self):
+        self.status = "running"
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="queue-heartbeat",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop heartbeating and release leases still held."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for job_id in list(self._held):
+            self.release(job_id)
+        self.status = "stopped"
+        self.heartbeat()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def queue_status(queue_dir, lease_timeout: float = LEASE_TIMEOUT) -> Dict:
+    """Counts of done/leased/stale jobs and node heartbeats of a queue."""
+    queue = SharedWorkQueue(queue_dir, node_id="status")
+    now = queue.server_now()
+    leased = stale = 0
+    for lease in queue.leases.glob("*.lease"):
+        try:
+            age = now - lease.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if age < lease_timeout:
+            leased += 1
+        else:
+            stale += 1
+    done = [_read_json(path) or {} for path in queue.done.glob("*.json")]
+    nodes = [_read_json(path) for path in sorted(queue.nodes.glob("*.json"))]
+    (queue.nodes / ".status.clock").unlink(missing_ok=True)
+    return {
+        "screen_id": queue.screen_id,
+        "done": len(done),
+        "failed": sum(1 for d in done if not d.get('success', True)),
+        "leased": leased,
+        "stale": stale,
+        "nodes": [n for n in nodes if n and n.get('node') != "status"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect a shared-filesystem screening work queue"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    status = subparsers.add_parser("status", help="Show job and node status")
+    status.add_argument("queue_dir", help="Queue directory")
+    status.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT)
+
+    reclaim = subparsers.add_parser("reclaim", help="Remove stale leases now")
+    reclaim.add_argument("queue_dir", help="Queue directory")
+    reclaim.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT)
+
+    args = parser.parse_args()
+
+    if args.command == "status":
+        info = queue_status(args.queue_dir, args.lease_timeout)
+        print(f"Screen: {info['screen_id']}")
+        print(f"Done: {info['done']} ({info['failed']} failed)")
+        print(f"Leased: {info['leased']} (stale: {info['stale']})")
+        now = time.time()
+        for node in info['nodes']:
+            print(f"  {node['node']:<30} {node['status']:<8} {node['jobs_done']:>5} done, "
+                  f"{len(node['leases'])} leased, heartbeat {now - node['heartbeat']:.0f}s ago")
+    elif args.command == "reclaim":
+        queue = SharedWorkQueue(args.queue_dir, node_id=f"reclaim-{os.getpid()}",
+                                lease_timeout=args.lease_timeout)
+        job_ids = [lease.name[:-len(".lease")] for lease in queue.leases.glob("*.lease")]
+        reclaimed = sum(1 for job_id in job_ids if queue._reclaim_if_stale(job_id))
+        (queue.nodes / f".{queue.node_id}.clock").unlink(missing_ok=True)
+        print(f"Reclaimed {reclaimed} stale leases")
+
+
+if __name__ == "__main__":
+    main()
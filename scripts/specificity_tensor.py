@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Dense specificity tensor for analyze_specificity.py.
+
+Screening results are loaded into a (variants x 4 nucleotides x metrics)
+float array with a (variants x 4) mask of the predictions present, and every
+specificity metric is computed with array operations over all variants at
+once:
+
+    values[v, n, m]   metric m (confidence_score, ligand_iptm, complex_plddt)
+                      of variant v tested against nucleotide n (NaN if absent)
+    mask[v, n]        variant v has a prediction for nucleotide n
+    target[v]         index of variant v's target nucleotide
+
+Variants keep the order of their first result record and the off-target
+means add the nucleotides in manifest order, so the metrics (and therefore
+rankings) are the same as per-variant scoring of the same records.
+
+Usage:
+    python specificity_tensor.py ../specificity_library/screening_results/screening_results.json
+"""
+
+import argparse
+import time
+from dataclasses import dataclass, field
+from itertools import repeat
+from operator import itemgetter
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+NUCLEOTIDES = ("dATP", "dGTP", "dCTP", "dTTP")
+METRICS = ("confidence_score", "ligand_iptm", "complex_plddt")
+CONF, IPTM, PLDDT = range(len(METRICS))
+AFFINITY_TIER = "affinity"
+
+
+@dataclass
+class SpecificityTensor:
+    """Per-variant screening metrics as dense arrays (see module docstring)."""
+    variant_ids: np.ndarray   # (V,) object
+    target: np.ndarray        # (V,) int8 index into NUCLEOTIDES
+    mutations: np.ndarray     # (V,) object
+    tier: np.ndarray          # (V,) object (None for untiered screens)
+    pruned: np.ndarray        # (V,) bool: some off-target job was pruned
+    values: np.ndarray        # (V, 4, len(METRICS)) float64
+    mask: np.ndarray          # (V, 4) bool
+    affinity_records: List[Dict] = field(default_factory=list)   # affinity-tier records
+
+    def __len__(self):
+        return len(self.variant_ids)
+
+    @classmethod
+    def from_results(cls, results: List[Dict]) -> "SpecificityTensor":
+        """
+        Build the tensor from the result records of a screen.
+
+        Tiers are selected as in analyze_specificity.select_preferred_tier:
+        a variant with production-tier records is scored from those only,
+        and affinity re-runs are set aside in affinity_records. Variant
+        attributes come from a variant's first selected record; pruned and
+        failed records (no confidence) leave their cell masked, and a later
+        record for the same cell replaces an earlier one. Variants without
+        a target prediction are dropped.
+        """
+        nucleotides = pd.Index(NUCLEOTIDES)
+        n_records = len(results)
+
+        def field_of(records, key):
+            # map(dict.get, ...) keeps the per-record work in C for 10^6-variant screens
+            return np.fromiter(map(dict.get, records, repeat(key)), dtype=object, count=len(records))
+
+        all_codes, _ = pd.factorize(field_of(results, 'variant_id'))
+        tiers = field_of(results, 'tier')
+        is_production = tiers == 'production'
+        is_affinity = tiers == AFFINITY_TIER
+        production_variants = np.zeros(all_codes.max() + 1 if n_records else 0, bool)
+        production_variants[all_codes[is_production]] = True
+        selected = (is_production == production_variants[all_codes]) & ~is_affinity
+        rows = np.flatnonzero(selected)
+        records = [results[i] for i in rows] if len(rows) < n_records else results
+
+        # Variants in order of their first selected record
+        codes, _ = pd.factorize(all_codes[rows])
+        _, first = np.unique(codes, return_index=True)
+        first_records = [records[i] for i in first]
+        n_variants = len(first_records)
+
+        pruned_rows = field_of(records, 'status') == 'pruned'
+        pruned = np.zeros(n_variants, bool)
+        pruned[codes[pruned_rows]] = True
+
+        confidences = field_of(records, 'confidence')
+        scored = ~pruned_rows & np.fromiter(map(bool, confidences), bool, len(records))
+        scored_codes = codes[scored]
+        scored_confidences = confidences[scored]
+        nucs = nucleotides.get_indexer(field_of([records[i] for i in np.flatnonzero(scored)],
+                                                'test_nucleotide'))
+        # Duplicate cells: the later record wins, as in sequential assignment
+        values = np.full((n_variants, len(NUCLEOTIDES), len(METRICS)), np.nan)
+        values[scored_codes, nucs] = np.column_stack([
+            np.fromiter(map(itemgetter(metric), scored_confidences), float, len(scored_confidences))
+            for metric in METRICS
+        ]) if len(scored_confidences) else np.empty((0, len(METRICS)))
+        mask = np.zeros((n_variants, len(NUCLEOTIDES)), bool)
+        mask[scored_codes, nucs] = True
+
+        target = nucleotides.get_indexer(field_of(first_records, 'target_nucleotide')).astype(np.int8)
+        if (nucs < 0).any() or (target < 0).any():
+            raise ValueError(f"results name a nucleotide outside {NUCLEOTIDES}")
+        keep = mask[np.arange(n_variants), target]
+
+        return cls(
+            variant_ids=field_of(first_records, 'variant_id')[keep],
+            target=target[keep],
+            mutations=field_of(first_records, 'mutations')[keep],
+            tier=field_of(first_records, 'tier')[keep],
+            pruned=pruned[keep],
+            values=values[keep],
+            mask=mask[keep],
+            affinity_records=[results[i] for i in np.flatnonzero(is_affinity)],
+        )
+
+
+def specificity_metrics(tensor: SpecificityTensor) -> Dict[str, np.ndarray]:
+    """
+    Specificity metrics of every variant (arrays of length V).
+
+    Ratios use the mean off-target value (0 when that mean is not
+    positive), selectivities the best off-target value; variants with no
+    off-target prediction get NaN for all of them.
+    """
+    rows = np.arange(len(tensor))
+    conf = tensor.values[:, :, CONF]
+    iptm = tensor.values[:, :, IPTM]
+    target_conf = conf[rows, tensor.target]
+    target_iptm = iptm[rows, tensor.target]
+
+    off = tensor.mask.copy()
+    off[rows, tensor.target] = False
+    n_off = off.sum(axis=1)
+    has_off = n_off > 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_off_conf = np.where(off, conf, 0.0).sum(axis=1) / n_off
+        mean_off_iptm = np.where(off, iptm, 0.0).sum(axis=1) / n_off
+        max_off_conf = np.where(off, conf, -np.inf).max(axis=1)
+        max_off_iptm = np.where(off, iptm, -np.inf).max(axis=1)
+        ratio_conf = np.where(mean_off_conf > 0, target_conf / mean_off_conf, 0.0)
+        ratio_iptm = np.where(mean_off_iptm > 0, target_iptm / mean_off_iptm, 0.0)
+
+    def known(metric):
+        return np.where(has_off, metric, np.nan)
+
+    return {
+        "target_confidence": target_conf,
+        "target_iptm": target_iptm,
+        "mean_off_target_conf": known(mean_off_conf),
+        "mean_off_target_iptm": known(mean_off_iptm),
+        "max_off_target_conf": known(max_off_conf),
+        "specificity_ratio_conf": known(ratio_conf),
+        "specificity_ratio_iptm": known(ratio_iptm),
+        "selectivity_conf": known(target_conf - max_off_conf),
+        "selectivity_iptm": known(target_iptm - max_off_iptm),
+        "combined_score": known(target_conf * ratio_conf),
+        "n_off_targets": n_off,
+    }
+
+
+def specificity_frame(tensor: SpecificityTensor) -> pd.DataFrame:
+    """
+    One row per variant (first-record order) with the specificity metrics,
+    panel status and per-nucleotide confidence/iPTM columns
+    (<nucleotide>_confidence, <nucleotide>_iptm; NaN if not predicted).
+    """
+    metrics = specificity_metrics(tensor)
+    panel_complete = metrics['n_off_targets'] == len(NUCLEOTIDES) - 1
+    status = np.where(panel_complete, 'complete', np.where(tensor.pruned, 'pruned', 'incomplete'))
+
+    columns = {
+        "variant_id": tensor.variant_ids,
+        "target_nucleotide": np.array(NUCLEOTIDES, dtype=object)[tensor.target],
+        "mutations": tensor.mutations,
+        **metrics,
+        "panel_complete": panel_complete,
+        "status": status.astype(object),
+    }
+    for n, nuc in enumerate(NUCLEOTIDES):
+        columns[f"{nuc}_confidence"] = tensor.values[:, n, CONF]
+        columns[f"{nuc}_iptm"] = tensor.values[:, n, IPTM]
+    if any(t is not None for t in tensor.tier):
+        columns["tier"] = np.where(pd.isna(tensor.tier), np.nan, tensor.tier)
+    return pd.DataFrame(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the specificity tensor on a screening results file"
+    )
+    parser.add_argument("results_file", help="screening_results.json or .jsonl log")
+
+    args = parser.parse_args()
+
+    from analyze_specificity import load_screening_results
+
+    start = time.perf_counter()
+    results = load_screening_results(args.results_file)['results']
+    loaded = time.perf_counter()
+    tensor = SpecificityTensor.from_results(results)
+    built = time.perf_counter()
+    df = specificity_frame(tensor)
+    done = time.perf_counter()
+    print(f"{len(results)} records, {len(tensor)} variants "
+          f"({int(tensor.mask.sum())} predictions, {int((df['panel_complete']).sum())} complete panels)")
+    print(f"  load {loaded - start:.2f}s, tensor {built - loaded:.2f}s, metrics {done - built:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Streaming specificity analysis in bounded memory.
+
+analyze_specificity.py loads every result into one DataFrame, which is
+wasteful for very large screens when only the top candidates are wanted.
+StreamingAnalysis reads the records one at a time (screening_results.json
+is parsed incrementally, the .jsonl results log line by line):
+
+    - records are grouped per variant; a variant is ready once it has a
+      record for every nucleotide (pruned records included), and ready
+      variants are scored in batches with the specificity tensor
+      (specificity_tensor.py). A job's record repeated within its variant's
+      group (a retry) replaces the earlier one, as in compaction.
+    - at most buffer_variants incomplete variants are held open (failed
+      jobs leave a panel incomplete); beyond that the oldest half is scored
+      as it is
+    - the scored rows go through a top-k heap overall and one per target
+      nucleotide, and into running per-nucleotide statistics
+    - affinity re-runs (tier "affinity", a shortlist) are kept aside and
+      joined onto the top candidates at the end
+
+The output is the same as analyze_specificity.py: the top candidates,
+the per-nucleotide summary, top_binders_<nucleotide>.csv and
+specificity_report.txt. The exception is specificity_analysis.csv, the
+full ranked table, which is not written. Ties in combined score are ranked
+in order of first record.
+
+Memory is bounded by the buffer, the heaps and the affinity shortlist, plus
+the IDs of the variants scored so far, with one exception. A tiered screen
+first needs the IDs of its production-tier variants (read in an extra
+pass), because their quick-tier records come much earlier in the file.
+
+A variant's records must arrive before it is complete or evicted. This
+holds for screening_results.json (manifest order) and for the log of a
+single run, where jobs finish in a different order. It does not hold for
+the log of a target-first screen, which holds every target prediction
+before the off-targets: records arriving for a variant already scored are
+ignored and counted (n_late), and report_warnings says to analyze the
+compacted screening_results.json of such screens (results_log.py). Of a
+log with several runs only the last run is read; a resumed run logs again
+every job it carries forward.
+
+Usage:
+    python streaming_analysis.py ../specificity_library/screening_results/screening_results.json
+    python analyze_specificity.py --streaming --buffer-variants 4096
+"""
+
+import argparse
+import heapq
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from analyze_specificity import (affinity_selectivity, print_nucleotide_summary, print_top_candidates,
+                                 save_top_binders, write_report)
+from results_log import iter_log, record_key, run_offsets
+from specificity_tensor import AFFINITY_TIER, NUCLEOTIDES, SpecificityTensor, specificity_frame
+
+
+DEFAULT_BUFFER_VARIANTS = 4096
+REPORT_TOP_N = 10           # write_report lists the top 10 overall
+TOP_BINDERS_PER_NUCLEOTIDE = 5   # save_top_binders writes the top 5 per nucleotide
+CHUNK_SIZE = 1 << 20
+
+
+class _JsonStream:
+    """Incremental reader of one JSON document, decoding a value at a time."""
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._read():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"malformed results file: expected {chars!r}, found {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode the next value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._read():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and self._read():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_results_json(results_file, header: Optional[Dict] = None,
+                      chunk_size: int = CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Yield the records of screening_results.json without loading the file.
+
+    Args:
+        header: Filled with the top-level fields read so far (all fields
+            before 'results' once the first record is yielded)
+    """
+    header = {} if header is None else header
+    with open(results_file, 'r') as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == 'results':
+                stream.expect('[')
+                if stream.peek() == ']':
+                    stream.expect(']')
+                else:
+                    while True:
+                        yield stream.value()
+                        if stream.expect(',]') == ']':
+                            break
+            else:
+                header[key] = stream.value()
+            if stream.expect(',}') == '}':
+                return
+
+
+def iter_results(results_file, header: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Yield the result records of screening_results.json or a .jsonl results log.
+
+    Of a log, only the last run is read (header['skipped_runs'] counts the
+    runs before it), failures are skipped, and the fields of the run header
+    are merged into header. Log records are not compacted: a record repeated
+    by a later retry stays a separate record (StreamingAnalysis keeps the
+    latest).
+    """
+    if Path(results_file).suffix != ".jsonl":
+        yield from iter_results_json(results_file, header)
+        return
+    offsets = run_offsets(results_file) or [0]
+    if header is not None:
+        header['skipped_runs'] = len(offsets) - 1
+    for entry in iter_log(results_file, offsets[-1]):
+        if entry.get('type') == 'run' and header is not None:
+            header.update({k: v for k, v in entry.items() if k != 'type'})
+        elif entry.get('type') == 'result':
+            yield entry['record']
+
+
+def read_header(results_file) -> Dict:
+    """Top-level fields of a results file (run headers of a log) before its first record."""
+    header = {}
+    records = iter_results(results_file, header)
+    next(records, None)
+    records.close()
+    return header
+
+
+def production_variants(results_file) -> set:
+    """IDs of the variants with production-tier records (one pass over the file)."""
+    return {r['variant_id'] for r in iter_results(results_file) if r.get('tier') == 'production'}
+
+
+class _NucleotideStats:
+    """Running summarize_by_nucleotide statistics of one target nucleotide."""
+
+    def __init__(self):
+        self.n_variants = 0
+        self.best_ratio = np.nan
+        self.best_confidence = np.nan
+        self.ratio_sum = 0.0
+        self.ratio_count = 0
+
+    def update(self, ratios: np.ndarray, confidences: np.ndarray):
+        self.n_variants += len(ratios)
+        known = ratios[~np.isnan(ratios)]
+        self.ratio_sum += known.sum()
+        self.ratio_count += len(known)
+        if len(known):
+            self.best_ratio = np.fmax(self.best_ratio, known.max())
+        if len(confidences):
+            self.best_confidence = np.fmax(self.best_confidence, np.nanmax(confidences))
+
+    @property
+    def mean_ratio(self) -> float:
+        return self.ratio_sum / self.ratio_count if self.ratio_count else np.nan
+
+
+class StreamingAnalysis:
+    """Top-k specificity analysis over a stream of result records (see module docstring)."""
+
+    def __init__(self, top_n: int = REPORT_TOP_N, per_nucleotide: int = TOP_BINDERS_PER_NUCLEOTIDE,
+                 buffer_variants: int = DEFAULT_BUFFER_VARIANTS, production: Optional[set] = None):
+        """
+        Args:
+            top_n: Candidates kept overall (at least the report's top 10)
+            per_nucleotide: Candidates kept per target nucleotide
+            production: Variants re-run at production settings in a tiered
+                screen; their quick-tier records are skipped
+        """
+        self.top_n = max(top_n, REPORT_TOP_N)
+        self.per_nucleotide = max(per_nucleotide, TOP_BINDERS_PER_NUCLEOTIDE)
+        self.buffer_variants = max(buffer_variants, 2)
+        self.production = production or set()
+        self.buffer = OrderedDict()
+        self._ready = []
+        self.affinity_records = []
+        self.n_records = 0
+        self.n_variants = 0
+        self.n_complete = 0
+        self.n_pruned = 0
+        self.n_evicted = 0
+        self.n_duplicates = 0
+        self.n_late = 0
+        self.skipped_runs = 0
+        self._scored = set()
+        self._seq = 0
+        # Heaps of (complete, scored, combined_score, -seq, seq, row): the root is the weakest candidate
+        self._top = []
+        self._top_by_nucleotide = {nuc: [] for nuc in NUCLEOTIDES}
+        self._stats = {nuc: _NucleotideStats() for nuc in NUCLEOTIDES}
+
+    def add(self, record: Dict):
+        """Add one result record."""
+        self.n_records += 1
+        tier = record.get('tier')
+        if tier == AFFINITY_TIER:
+            self.affinity_records.append(record)
+            return
+        variant_id = record['variant_id']
+        if self.production and (tier == 'production') != (variant_id in self.production):
+            return
+        if variant_id in self._scored:
+            # Complete or evicted already (e.g. off-targets of a target-first log)
+            self.n_late += 1
+            return
+        if variant_id not in self.buffer:
+            if len(self.buffer) >= self.buffer_variants:
+                # Evict the oldest incomplete variants (e.g. with failed jobs)
+                for _ in range(len(self.buffer) - self.buffer_variants // 2):
+                    self._release(next(iter(self.buffer)))
+                    self.n_evicted += 1
+                self._score()
+            self.buffer[variant_id] = (self._seq, {}, set())
+            self._seq += 1
+        _, records, nucleotides = self.buffer[variant_id]
+        key = record_key(record)
+        if key in records:
+            self.n_duplicates += 1
+        records[key] = record
+        nucleotides.add(record['test_nucleotide'])
+        if len(nucleotides) == len(NUCLEOTIDES):
+            self._release(variant_id)
+            if len(self._ready) >= self.buffer_variants // 2:
+                self._score()
+
+    def _release(self, variant_id: str):
+        """Move a variant from the buffer to the next scoring batch."""
+        self._ready.append(self.buffer.pop(variant_id))
+        self._scored.add(variant_id)
+
+    def add_all(self, records) -> "StreamingAnalysis":
+        """Add records and score everything still buffered."""
+        for record in records:
+            self.add(record)
+        for variant_id in list(self.buffer):
+            self._release(variant_id)
+        self._score()
+        return self
+
+    def _score(self):
+        """Score the ready variants as one batch."""
+        batch, self._ready = self._ready, []
+        if not batch:
+            return
+        batch.sort(key=lambda variant: variant[0])
+        seq_of = {next(iter(records.values()))['variant_id']: seq for seq, records, _ in batch}
+        df = specificity_frame(SpecificityTensor.from_results(
+            [r for _, records, _ in batch for r in records.values()]))
+        if len(df) == 0:
+            return
+
+        self.n_variants += len(df)
+        self.n_complete += int(df['panel_complete'].sum())
+        self.n_pruned += int((df['status'] == 'pruned').sum())
+
+        seq = df['variant_id'].map(seq_of).to_numpy()
+        scores = df['combined_score'].to_numpy()
+        scored = ~np.isnan(scores)
+        complete = df['panel_complete'].to_numpy()
+        # Best first (as rank_candidates): complete panels, scored rows by
+        # descending score, then in order of first record
+        order = np.lexsort((seq, -np.where(scored, scores, 0.0), ~scored, ~complete))
+        target = df['target_nucleotide'].to_numpy()
+
+        candidates = list(order[:self.top_n])
+        for nuc in NUCLEOTIDES:
+            of_nuc = order[target[order] == nuc]
+            self._stats[nuc].update(df['specificity_ratio_conf'].to_numpy()[of_nuc],
+                                    df['target_confidence'].to_numpy()[of_nuc])
+            candidates.extend(of_nuc[:self.per_nucleotide])
+
+        rows = df.iloc[sorted(set(candidates))]
+        for i, row in zip(rows.index, rows.to_dict('records')):
+            entry = (bool(complete[i]), bool(scored[i]), scores[i] if scored[i] else 0.0, -seq[i], seq[i], row)
+            self._push(self._top, entry, self.top_n)
+            self._push(self._top_by_nucleotide[row['target_nucleotide']], entry, self.per_nucleotide)
+
+    @staticmethod
+    def _push(heap: List, entry, k: int):
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:4] > heap[0][:4]:
+            heapq.heapreplace(heap, entry)
+
+    def top_candidates(self) -> pd.DataFrame:
+        """
+        Ranked DataFrame of the candidates kept: the top top_n overall and the
+        top per_nucleotide per target nucleotide, with the affinity columns.
+        """
+        entries = {entry[4]: entry for heap in [self._top, *self._top_by_nucleotide.values()]
+                   for entry in heap}
+        ranked = sorted(entries.values(), key=lambda e: e[:4], reverse=True)
+        df = pd.DataFrame([entry[5] for entry in ranked])
+        affinity = affinity_selectivity(self.affinity_records)
+        if affinity and len(df):
+            metrics = pd.DataFrame.from_dict(affinity, orient='index')
+            df = df.join(metrics, on='variant_id')
+        return df.reset_index(drop=True)
+
+    def affinity_table(self) -> Optional[pd.DataFrame]:
+        """Shortlisted variants with affinity fold-selectivity, most selective first."""
+        affinity = affinity_selectivity(self.affinity_records)
+        if not affinity:
+            return None
+        targets = {r['variant_id']: r['target_nucleotide'] for r in self.affinity_records}
+        df = pd.DataFrame.from_dict(affinity, orient='index')
+        df.insert(0, 'target_nucleotide', df.index.map(targets))
+        df.insert(0, 'variant_id', df.index)
+        return df.sort_values('affinity_fold_selectivity', ascending=False)
+
+    def nucleotide_summary(self) -> Dict:
+        """Summary in the form of analyze_specificity.summarize_by_nucleotide."""
+        summary = {}
+        for nuc in NUCLEOTIDES:
+            stats = self._stats[nuc]
+            if not stats.n_variants:
+                continue
+            heap = self._top_by_nucleotide[nuc]
+            scored = [e for e in heap if e[1]]
+            best = max(scored, key=lambda e: e[:4]) if scored else None
+            summary[nuc] = {
+                'n_variants': stats.n_variants,
+                'best_ratio': stats.best_ratio,
+                'best_confidence': stats.best_confidence,
+                'mean_ratio': stats.mean_ratio,
+                'best': best[5] if best is not None else None,
+            }
+        return summary
+
+    def save(self, output_dir):
+        """Write top_binders_<nucleotide>.csv and specificity_report.txt."""
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        df = self.top_candidates()
+        save_top_binders(df, output_path)
+        write_report(df, output_path / "specificity_report.txt", self.n_variants, self.affinity_table())
+
+
+def analyze_stream(results_file, top_n: int = REPORT_TOP_N,
+                   buffer_variants: int = DEFAULT_BUFFER_VARIANTS) -> StreamingAnalysis:
+    """Stream a results file through a StreamingAnalysis."""
+    production = None
+    if read_header(results_file).get('mode') == 'tiered':
+        production = production_variants(results_file)
+    analysis = StreamingAnalysis(top_n=top_n, buffer_variants=buffer_variants, production=production)
+    header = {}
+    analysis.add_all(iter_results(results_file, header))
+    analysis.skipped_runs = header.get('skipped_runs', 0)
+    return analysis
+
+
+def report_warnings(analysis: StreamingAnalysis):
+    """
+    Warn about records the stream could not group as compaction would:
+    earlier runs of a log, variants scored with an incomplete panel (failed
+    jobs, or too small a buffer) and records arriving after their variant
+    was scored.
+    """
+    if analysis.skipped_runs:
+        print(f"  WARNING: the log holds {analysis.skipped_runs + 1} runs; only the last one was read")
+    if analysis.n_evicted:
+        print(f"  WARNING: {analysis.n_evicted} variants were scored with an incomplete panel when the "
+              f"buffer filled up; if their jobs did not fail, raise --buffer-variants")
+    if analysis.n_late:
+        print(f"  WARNING: {analysis.n_late} records arrived after their variant was scored and were "
+              f"ignored (target-first log, or too small a buffer); analyze the compacted "
+              f"screening_results.json instead")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyze specificity screening results in bounded memory"
+    )
+    parser.add_argument("results_file", help="screening_results.json or .jsonl results log")
+    parser.add_argument("--output-dir", default="../specificity_library/analysis",
+                        help="Output directory for the report and top binders")
+    parser.add_argument("--top-n", type=int, default=10,
+                        help="Number of top candidates to display (default: 10)")
+    parser.add_argument("--buffer-variants", type=int, default=DEFAULT_BUFFER_VARIANTS,
+                        help=f"Variants held open while their records arrive (default: {DEFAULT_BUFFER_VARIANTS})")
+
+    args = parser.parse_args()
+
+    analysis = analyze_stream(args.results_file, args.top_n, args.buffer_variants)
+    print(f"{analysis.n_records} records, {analysis.n_variants} variants "
+          f"({analysis.n_complete} complete panels)")
+    report_warnings(analysis)
+    print_top_candidates(analysis.top_candidates(), n=args.top_n)
+    print_nucleotide_summary(analysis.nucleotide_summary())
+    analysis.save(args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
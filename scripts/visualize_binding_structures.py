@@ -5,11 +5,15 @@ Visualize and analyze binding structures from Boltz predictions.
 This script creates PyMOL visualization scripts and analyzes binding interfaces.
 """
 
+import os
 import sys
 import json
 from pathlib import Path
 import numpy as np
 
+sys.path.insert(0, os.path.dirname(__file__))
+from prediction_index import artifact_path
+
 def create_pymol_visualization_script(variant_id, target_nucleotide, cif_file, output_dir):
     """Create a PyMOL script to visualize the binding interface."""
 
@@ -141,10 +145,11 @@ def create_all_visualizations(library_dir):
 
         # Find CIF file
         pred_name = f"{variant_id}_vs_{target_nucleotide}"
-        cif_pattern = results_dir / pred_name / f"boltz_results_{pred_name}" / "predictions" / pred_name / f"{pred_name}_model_0.cif"
+        prediction_dir = results_dir / pred_name / f"boltz_results_{pred_name}"
+        cif_pattern = artifact_path(prediction_dir, "structure")
 
-        if not cif_pattern.exists():
-            print(f"  ⚠ Structure file not found: {cif_pattern}")
+        if cif_pattern is None:
+            print(f"  ⚠ Structure file not found in {prediction_dir}")
             continue
 
         # Create PyMOL script